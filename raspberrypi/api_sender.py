@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+API Sender for WaterLogged Gateway
+
+Forwards raw payload lines to the API server without blocking the code that
+reads them. Lines are handed over through a bounded in-memory queue to a
+background thread, which:
+- Appends them to an on-disk SQLite spool so they survive API or gateway restarts
+- Sends spooled lines to POST /measurements/batch over one keep-alive session
+- Deletes lines from the spool only after the API has accepted them
+- Backs off exponentially while the API is unreachable
+
+Besides HTTP over TCP, lines can be delivered over the API server's Unix domain
+socket, or decoded and written straight to the database in-process
+(DirectIngestSender) when the reader runs on the same Pi as the database.
+
+Dependencies:
+- requests: For the pooled HTTP session
+- sqlite3: For the durable spool
+"""
+
+import http.client
+import json
+import logging
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from database_handler import DatabaseHandler
+from metrics import Counter, Gauge, Histogram
+from payload_decoder import PayloadDecoder, is_legacy, tag_legacy
+
+logger = logging.getLogger('WaterLogged_Sender')
+
+QUEUE_DEPTH = Gauge('waterlogged_sender_queue_depth', "Line batches waiting for the sender thread")
+SPOOLED = Gauge('waterlogged_sender_spooled_lines', "Lines in the on-disk spool not yet accepted by the API")
+SEND_SECONDS = Histogram('waterlogged_sender_send_seconds', "Time to deliver one spooled batch", ['transport'])
+SEND_FAILURES = Counter('waterlogged_sender_send_failures_total', "Batches that failed to deliver", ['transport'])
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket (e.g. uvicorn started with --uds)"""
+    
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class ApiSender:
+    def __init__(self, api_url: str = 'http://localhost:8000/measurements/batch',
+                 spool_path: str = 'serial_spool.db', batch_size: int = 500,
+                 queue_size: int = 1000, max_backoff: float = 60.0,
+                 unix_socket: Optional[str] = None, legacy_node_id: int = 1):
+        self.api_url = api_url
+        # Node ID given to legacy lines still untagged when they leave the spool
+        self.legacy_node_id = legacy_node_id
+        self.unix_socket = unix_socket
+        self._unix_conn: Optional[UnixHTTPConnection] = None
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.session = requests.Session()
+        self._thread: Optional[threading.Thread] = None
+        QUEUE_DEPTH.set_function(self.queue.qsize)
+    
+    def start(self):
+        """Start the background sender thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='api-sender', daemon=True)
+        self._thread.start()
+    
+    def submit(self, lines: List[str]):
+        """Hand lines to the sender thread; only blocks if the queue is full"""
+        if not lines:
+            return
+        try:
+            self.queue.put_nowait(list(lines))
+        except queue.Full:
+            logger.warning("Sender queue full, waiting for the spool to catch up")
+            self.queue.put(list(lines))
+    
+    def stop(self, timeout: float = 10.0):
+        """Spool anything still queued, try a final flush and stop the thread"""
+        if self._thread and self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout)
+        self.session.close()
+        if self._unix_conn:
+            self._unix_conn.close()
+    
+    def _open_spool(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.spool_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS spool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                received_at REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+        return conn
+    
+    def _run(self):
+        """Sender thread: spool incoming lines and flush them while the API is reachable"""
+        conn = self._open_spool()
+        pending = conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+        SPOOLED.set(pending)
+        if pending:
+            logger.info(f"Found {pending} spooled line(s) from a previous run")
+        
+        backoff = 1.0
+        retry_at = 0.0
+        stopping = False
+        while not stopping:
+            # Sleep until new lines arrive, or until the next retry if lines are waiting
+            wait = max(0.0, retry_at - time.monotonic()) if pending else None
+            lines = []
+            try:
+                item = self.queue.get(timeout=wait)
+                while True:
+                    if item is None:
+                        stopping = True
+                    else:
+                        lines.extend(item)
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            
+            if lines:
+                now = time.time()
+                conn.executemany("INSERT INTO spool (payload, received_at) VALUES (?, ?)",
+                                 [(line, now) for line in lines])
+                conn.commit()
+                pending += len(lines)
+                SPOOLED.set(pending)
+            
+            if pending and (stopping or time.monotonic() >= retry_at):
+                sent = self._flush(conn)
+                pending -= sent
+                SPOOLED.set(pending)
+                if pending:
+                    retry_at = time.monotonic() + backoff
+                    logger.warning(f"{pending} line(s) spooled, retrying in {backoff:.0f}s")
+                    backoff = min(backoff * 2, self.max_backoff)
+                else:
+                    backoff = 1.0
+        
+        conn.close()
+    
+    def _flush(self, conn: sqlite3.Connection) -> int:
+        """Send spooled lines oldest first until the spool is empty or a send fails"""
+        sent = 0
+        while True:
+            rows = conn.execute("SELECT id, payload, received_at FROM spool ORDER BY id LIMIT ?",
+                                (self.batch_size,)).fetchall()
+            if not rows:
+                return sent
+            started = time.perf_counter()
+            # The receive times go along so a replayed backlog keeps its original spacing
+            if not self._post([self._keyed(*row) for row in rows], [row[2] for row in rows]):
+                SEND_FAILURES.inc(labels=(self.transport,))
+                return sent
+            SEND_SECONDS.observe(time.perf_counter() - started, (self.transport,))
+            conn.execute("DELETE FROM spool WHERE id <= ?", (rows[-1][0],))
+            conn.commit()
+            sent += len(rows)
+    
+    def _keyed(self, spool_id: int, line: str, received_at: float) -> str:
+        """
+        Give an untagged legacy line the spool row ID as its sequence number.
+        
+        A batch is resent whenever the API's answer is lost, even if it was stored.
+        The resent lines are identical, so the API drops them as duplicates of
+        (node_id, seq, timestamp) instead of counting their rainfall twice.
+        """
+        if not is_legacy(line):
+            return line
+        return tag_legacy(line, self.legacy_node_id, spool_id, int(received_at))
+    
+    @property
+    def transport(self) -> str:
+        """Metrics label for how batches are delivered"""
+        return 'unix' if self.unix_socket else 'http'
+    
+    def _post(self, lines: List[str], received_at: List[float]) -> bool:
+        """POST one batch; True once the API has stored it (or rejected it as undecodable)"""
+        batch = {'payloads': lines, 'received_at': received_at}
+        try:
+            if self.unix_socket:
+                status, body = self._post_unix(batch)
+            else:
+                response = self.session.post(self.api_url, json=batch, timeout=(3, 10))
+                status, body = response.status_code, response.text
+            if status == 200 and json.loads(body).get('status') == 'success':
+                logger.info(f"Batch of {len(lines)} line(s) successfully sent to API")
+                return True
+            logger.error(f"API error: {status} - {body}")
+        except (requests.exceptions.RequestException, OSError, http.client.HTTPException, ValueError) as e:
+            logger.error(f"Failed to send data to API: {e}")
+        return False
+    
+    def _post_unix(self, payload: dict) -> tuple:
+        """POST JSON over the persistent Unix socket connection, reconnecting on failure"""
+        if self._unix_conn is None:
+            self._unix_conn = UnixHTTPConnection(self.unix_socket)
+        try:
+            self._unix_conn.request('POST', urlsplit(self.api_url).path, body=json.dumps(payload),
+                                    headers={'Content-Type': 'application/json'})
+            response = self._unix_conn.getresponse()
+            return response.status, response.read().decode()
+        except Exception:
+            self._unix_conn.close()
+            self._unix_conn = None
+            raise
+
+
+class DirectIngestSender(ApiSender):
+    """
+    Decodes spooled lines and writes them to the local database in-process.
+    
+    Skips the HTTP hop entirely. Readings stored this way do not pass through the
+    API process: its /data/current cache picks them up when its entries expire,
+    but /stream never carries them; use the HTTP or Unix socket modes when the
+    stream needs to be live.
+    """
+    
+    def __init__(self, db_path: str = 'waterlogged.db', **kwargs):
+        super().__init__(**kwargs)
+        self.decoder = PayloadDecoder()
+        self.db = DatabaseHandler(db_path)
+    
+    @property
+    def transport(self) -> str:
+        return 'direct'
+    
+    def stop(self, timeout: float = 10.0):
+        super().stop(timeout)
+        self.db.close()
+    
+    def _post(self, lines: List[str], received_at: List[float]) -> bool:
+        decoded = self.decoder.decode_many(lines, received_at).rows()
+        return self.db.insert_measurements(decoded) is not None
@@ -1,15 +1,82 @@
 #!/usr/bin/env python3
 
-from fastapi import FastAPI, HTTPException
+import time
+
+# Taken before the framework imports so the startup report includes them
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
-import uvicorn
-from typing import Optional, List, Dict
-from database_handler import DatabaseHandler
-from payload_decoder import PayloadDecoder
+from fastapi.responses import StreamingResponse
+from datetime import date, datetime, timedelta
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, List, Dict, Tuple
+from archive import ParquetArchive
+from database_handler import EPOCH, AsyncDatabaseHandler, DatabaseHandler
+from downsample import RESOLUTIONS, bucket_offset, choose_resolution, lttb
+from metrics import CONTENT_TYPE, REGISTRY, Counter, Gauge, Histogram
+from payload_decoder import DecodedBatch, PayloadDecoder
 from pydantic import BaseModel
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the platform
+    orjson = None
+
 app = FastAPI(title="WaterLogged API")
+logger = logging.getLogger('WaterLogged_API')
+
+REQUEST_SECONDS = Histogram('waterlogged_http_request_seconds',
+                            "Time from request to response headers, per route", ['method', 'route'])
+RESPONSES = Counter('waterlogged_http_responses_total', "Responses sent, per route and status",
+                    ['method', 'route', 'status'])
+STARTUP_SECONDS = Gauge('waterlogged_startup_seconds',
+                        "Time spent in each startup phase: imports, database, and ready (import to end of startup)",
+                        ['phase'])
+
+class RequestTimingMiddleware:
+    """
+    Times each request up to its response headers, labelled with the route template.
+    
+    Plain ASGI rather than BaseHTTPMiddleware, so streaming responses (/stream,
+    /data/export) pass through untouched and are timed to their first byte.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict = {}
+    
+    def route_of(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if not self._routes:
+            self._routes = {route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")}
+        return self._routes.get(endpoint, "unmatched")
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                # The router has filled in scope["endpoint"] by now
+                labels = (scope["method"], self.route_of(scope))
+                REQUEST_SECONDS.observe(time.perf_counter() - started, labels)
+                RESPONSES.inc(labels=labels + (message["status"],))
+            await send(message)
+        
+        await self.app(scope, receive, timed_send)
 
 # Configure CORS
 app.add_middleware(
@@ -19,10 +86,243 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestTimingMiddleware)
 
-# Initialize database and decoder
-db = DatabaseHandler()
+# The database is opened by the startup handler, so importing this module never touches the
+# file; queries run on worker threads, not the event loop. The decoder and archive are cheap
+# to build, and the archive only imports pyarrow when it is first used.
+db: Optional[AsyncDatabaseHandler] = None
 decoder = PayloadDecoder()
+archive = ParquetArchive()
+
+def dumps(value) -> bytes:
+    """Serialize to JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+# Retention runs this often; the first pass waits one interval so startup stays quick
+MAINTENANCE_INTERVAL = timedelta(hours=24)
+maintenance_state: Dict = {"task": None, "last_report": None, "day_close_task": None, "startup_task": None}
+
+# Rainfall stats close each day this long after midnight, leaving time for stragglers
+DAY_CLOSE_DELAY = timedelta(minutes=5)
+
+async def run_maintenance() -> Dict:
+    """Archive closed days, then prune old rows on the maintenance thread and remember the report"""
+    archived = None
+    if archive.available:
+        # Archive first so pruned days are already in Parquet
+        archived = await asyncio.get_running_loop().run_in_executor(None, archive.export, db.db)
+    report = await db.run_maintenance()
+    maintenance_state["last_report"] = {"finished": datetime.now().isoformat(), "archived": archived, **report}
+    if report["hourly_rows_deleted"]:
+        response_cache.clear()
+    return maintenance_state["last_report"]
+
+async def maintenance_loop():
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL.total_seconds())
+        try:
+            await run_maintenance()
+        except Exception as e:
+            logger.error(f"Scheduled maintenance failed: {e}")
+
+async def day_close_loop():
+    """Catch up on closed days now, then fold each day into the rainfall stats once it ends"""
+    while True:
+        try:
+            await db.close_days()
+        except Exception as e:
+            logger.error(f"Closing days into rainfall stats failed: {e}")
+        tomorrow = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+        await asyncio.sleep((tomorrow + DAY_CLOSE_DELAY - datetime.now()).total_seconds())
+
+async def after_startup():
+    """Work that does not have to happen before the first request"""
+    # Log query plans so a missing index shows up in the startup log
+    await db.check_query_plans()
+    # Import pyarrow now rather than during the first archive request
+    await asyncio.get_running_loop().run_in_executor(None, lambda: archive.available)
+    maintenance_state["task"] = asyncio.create_task(maintenance_loop())
+    maintenance_state["day_close_task"] = asyncio.create_task(day_close_loop())
+
+@app.on_event("startup")
+async def open_database():
+    """Open the database, bringing the schema up to date; everything else waits until we are serving"""
+    global db
+    imports = time.perf_counter() - IMPORT_STARTED
+    started = time.perf_counter()
+    db = AsyncDatabaseHandler(DatabaseHandler())
+    database = time.perf_counter() - started
+    
+    # Uvicorn starts listening as soon as the startup handlers return
+    ready = time.perf_counter() - IMPORT_STARTED
+    for phase, seconds in (("imports", imports), ("database", database), ("ready", ready)):
+        STARTUP_SECONDS.set(seconds, (phase,))
+    logger.info(f"Started in {ready * 1000:.0f} ms (imports {imports * 1000:.0f} ms, "
+                f"database {database * 1000:.0f} ms)")
+    maintenance_state["startup_task"] = asyncio.create_task(after_startup())
+
+@app.on_event("shutdown")
+async def close_database():
+    """Finish pending writes and close database connections"""
+    for key in ("startup_task", "task", "day_close_task"):
+        if maintenance_state[key]:
+            maintenance_state[key].cancel()
+    db.close()
+
+class LatestReadingCache:
+    """
+    Latest decoded measurement per node, kept in memory by the ingest endpoints.
+    
+    Each entry holds the response body already serialized plus its ETag, so
+    /data/current can answer from memory and skip serialization entirely on a 304.
+    Entries expire after ttl seconds and are then read again from the database, so
+    readings written by another process (direct ingest) show up within the TTL.
+    """
+    
+    def __init__(self, ttl: float = 5.0):
+        self.ttl = ttl
+        self._entries: Dict[int, Tuple[str, bytes, str, float]] = {}
+    
+    def get(self, node_id: int) -> Optional[Tuple[bytes, str]]:
+        """Return (body, etag) for a node, or None if nothing fresh is cached"""
+        entry = self._entries.get(node_id)
+        if entry is None or entry[3] < time.monotonic():
+            return None
+        return entry[1], entry[2]
+    
+    def update(self, measurement: Dict):
+        """Store a measurement unless a newer one is already cached for its node"""
+        node_id = measurement['node_id']
+        current = self._entries.get(node_id)
+        if current and current[0] > measurement['timestamp']:
+            return
+        
+        body = json.dumps({"status": "success", "data": measurement}).encode()
+        etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        self._entries[node_id] = (measurement['timestamp'], body, etag, time.monotonic() + self.ttl)
+
+latest_readings = LatestReadingCache()
+
+class MeasurementBroadcaster:
+    """
+    Fans out newly ingested measurements to /stream subscribers.
+    
+    Each measurement is serialized once and pushed to every subscriber's bounded
+    queue without waiting. When a slow client's queue is full its oldest event is
+    dropped, so ingest never blocks on a consumer.
+    """
+    
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[asyncio.Queue, Optional[int]] = {}
+        self.dropped = 0
+    
+    def subscribe(self, node_id: Optional[int] = None) -> asyncio.Queue:
+        """Register a subscriber, optionally only for one node"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[queue] = node_id
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.pop(queue, None)
+    
+    def publish(self, measurements: List[Dict]):
+        """Queue measurements for every interested subscriber"""
+        if not self._subscribers:
+            return
+        
+        for measurement in measurements:
+            event = f"event: measurement\ndata: {json.dumps(measurement)}\n\n"
+            for queue, node_id in self._subscribers.items():
+                if node_id is not None and node_id != measurement['node_id']:
+                    continue
+                if queue.full():
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(event)
+
+broadcaster = MeasurementBroadcaster()
+Gauge('waterlogged_stream_subscribers', "Connected /stream clients").set_function(
+    lambda: len(broadcaster._subscribers))
+
+class ResponseCache:
+    """
+    LRU cache of serialized aggregate query results.
+    
+    Entries are keyed on (endpoint, node_id, first bucket, end bucket), with the
+    bounds compared exactly like the SQL range filter, so any request resolving to
+    the same buckets shares an entry. Ranges made only of closed buckets never change
+    and live for closed_ttl. A range that reaches the still-open bucket gets open_ttl
+    and is dropped as soon as a reading for one of its buckets is ingested; readings
+    the API does not see (direct ingest) are bounded by the TTL.
+    """
+    
+    def __init__(self, max_entries: int = 256, open_ttl: float = 60.0, closed_ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.open_ttl = open_ttl
+        self.closed_ttl = closed_ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every ingest so a query that raced with one is not cached
+        self.generation = 0
+    
+    def get(self, key: Tuple) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def put(self, key: Tuple, body: bytes, is_open: bool, generation: int):
+        if generation != self.generation:
+            return
+        ttl = self.open_ttl if is_open else self.closed_ttl
+        self._entries[key] = (time.monotonic() + ttl, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, measurements: List[Dict]):
+        """Drop entries whose range contains the hourly or daily bucket of a new reading"""
+        self.generation += 1
+        touched = set()
+        for m in measurements:
+            touched.add(('hourly', m['node_id'], m['timestamp'][:13] + ':00:00'))
+            touched.add(('daily', m['node_id'], m['timestamp'][:10]))
+        
+        stale = [key for key in self._entries
+                 if any(key[0] == endpoint and key[1] == node_id and key[2] <= bucket < key[3]
+                        for endpoint, node_id, bucket in touched)]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+    
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "invalidations": self.invalidations
+        }
+
+response_cache = ResponseCache()
+Gauge('waterlogged_response_cache_entries', "Entries in the aggregate response cache").set_function(
+    lambda: len(response_cache._entries))
 
 class Measurement(BaseModel):
     """Raw measurement data model"""
@@ -34,25 +334,146 @@ class Measurement(BaseModel):
     zero_factor: int
     node_id: int = 1
 
+class PayloadBatch(BaseModel):
+    """Batch of raw payload lines, one reading per line"""
+    payloads: List[str]
+    # When the gateway received each line (epoch seconds); stamps lines without a device clock
+    received_at: Optional[List[float]] = None
+
 @app.post("/measurements")
 async def add_measurement(payload: str):
     """Add a new measurement from the Arduino node"""
     try:
         decoded = decoder.decode(payload)
         if decoded:
-            db.insert_measurement(decoded)
+            if await db.insert_measurement(decoded):
+                latest_readings.update(decoded)
+                response_cache.invalidate([decoded])
+                broadcaster.publish([decoded])
             return {"status": "success", "data": decoded}
         return {"status": "error", "message": "Failed to decode payload"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def store_batch(decoded_batch: DecodedBatch, received: int) -> Dict:
+    """Store a decoded batch and publish the new readings"""
+    stored = await db.insert_measurements(decoded_batch.rows())
+    # Only readings that were actually stored: duplicates must not reach the cache or stream
+    if stored:
+        for measurement in stored:
+            latest_readings.update(measurement)
+        response_cache.invalidate(stored)
+        broadcaster.publish(stored)
+    return {
+        "status": "success" if stored is not None else "error",
+        "received": received,
+        "inserted": len(stored) if stored is not None else None,
+        "rejected": decoded_batch.rejected,
+        "rejects": decoded_batch.reject_report()
+    }
+
+@app.post("/measurements/batch")
+async def add_measurements(batch: PayloadBatch):
+    """Add many buffered payload lines at once (e.g. a gateway replaying after an outage)"""
+    try:
+        decoded = decoder.decode_many(batch.payloads, batch.received_at)
+        return await store_batch(decoded, len(batch.payloads))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/measurements/binary")
+async def add_binary_measurements(request: Request):
+    """Add back-to-back binary frames sent as a raw application/octet-stream body"""
+    try:
+        body = await request.body()
+        decoded_batch = decoder.decode_frames(body)
+        return await store_batch(decoded_batch, len(decoded_batch) + decoded_batch.rejected)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def hour_ceiling(value: datetime) -> datetime:
+    """First hour boundary at or after value"""
+    floor = value.replace(minute=0, second=0, microsecond=0)
+    return floor if floor == value else floor + timedelta(hours=1)
+
+async def cached_range_response(endpoint: str, node_id: int, bounds: Tuple[str, str], open_bound: str,
+                                start_time: datetime, end_time: datetime, query) -> Response:
+    """Serve a range query from the response cache, running query on a miss"""
+    key = (endpoint, node_id) + bounds
+    data = response_cache.get(key)
+    if data is None:
+        generation = response_cache.generation
+        data = dumps(await query(start_time, end_time, node_id))
+        response_cache.put(key, data, bounds[1] > open_bound, generation)
+    
+    # Only the envelope is built per request; the cached rows are spliced in as bytes
+    time_range = dumps({"start": start_time.isoformat(), "end": end_time.isoformat()})
+    return Response(content=b'{"status": "success", "data": ' + data + b', "timeRange": ' + time_range + b'}',
+                    media_type="application/json")
+
+# Streamed export formats -> media type
+EXPORT_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+async def encode_batches(batches: AsyncIterator[Tuple[List[str], List[tuple]]], fmt: str) -> AsyncIterator[bytes]:
+    """Encode row batches as they arrive, one chunk per batch"""
+    first = True
+    async for columns, rows in batches:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if first:
+                writer.writerow(columns)
+            writer.writerows(rows)
+            chunk = buffer.getvalue().encode()
+        else:
+            records = [dumps(dict(zip(columns, row))) for row in rows]
+            if fmt == "ndjson":
+                chunk = b"\n".join(records) + b"\n"
+            else:
+                chunk = (b"" if first else b",") + b",".join(records)
+        first = False
+        yield chunk
+
+def export_response(table: str, start_time: datetime, end_time: datetime, node_id: int,
+                    fmt: str) -> StreamingResponse:
+    """
+    Stream a range straight from the database cursor.
+    
+    Only one batch of rows is held at a time, so memory stays flat and the first
+    bytes go out as soon as the first batch is read, however long the range is.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    
+    async def body():
+        if fmt == "json":
+            yield b'{"status": "success", "data": ['
+        try:
+            async for chunk in encode_batches(db.iter_range(table, start_time, end_time, node_id), fmt):
+                yield chunk
+        except Exception as e:
+            # Headers are already sent; the truncated body is all the client will see
+            logger.error(f"Export of {table} data failed: {e}")
+            raise
+        if fmt == "json":
+            yield b'], "timeRange": ' + dumps({"start": start_time.isoformat(), "end": end_time.isoformat()}) + b'}'
+    
+    filename = f"{table}_node{node_id}_{start_time:%Y%m%d}_{end_time:%Y%m%d}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'} if fmt != "json" else {}
+    return StreamingResponse(body(), media_type=EXPORT_FORMATS[fmt], headers=headers)
+
 @app.get("/data/hourly")
 async def get_hourly_data(
     start: Optional[str] = None,
     end: Optional[str] = None,
-    node_id: int = 1
+    node_id: int = 1,
+    format: str = "json"
 ):
-    """Get hourly aggregated data for the specified time range"""
+    """Get hourly aggregated data for the specified time range (cached JSON, or streamed ndjson/csv)"""
     try:
         # Default to last 24 hours if no range specified
         if not start:
@@ -61,16 +482,15 @@ async def get_hourly_data(
         else:
             start_time = datetime.fromisoformat(start)
             end_time = datetime.fromisoformat(end) if end else datetime.now()
-            
-        data = db.get_hourly_data(start_time, end_time, node_id)
-        return {
-            "status": "success",
-            "data": data,
-            "timeRange": {
-                "start": start_time.isoformat(),
-                "end": end_time.isoformat()
-            }
-        }
+        
+        if format != "json":
+            return export_response("hourly", start_time, end_time, node_id, format)
+        
+        # hour_start >= start AND hour_start < end selects the same rows as these hour bounds
+        bounds = (hour_ceiling(start_time).isoformat(), hour_ceiling(end_time).isoformat())
+        open_hour = datetime.now().replace(minute=0, second=0, microsecond=0).isoformat()
+        return await cached_range_response("hourly", node_id, bounds, open_hour,
+                                           start_time, end_time, db.get_hourly_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -78,9 +498,10 @@ async def get_hourly_data(
 async def get_daily_data(
     start: Optional[str] = None,
     end: Optional[str] = None,
-    node_id: int = 1
+    node_id: int = 1,
+    format: str = "json"
 ):
-    """Get daily aggregated data for the specified date range"""
+    """Get daily aggregated data for the specified date range (cached JSON, or streamed ndjson/csv)"""
     try:
         # Default to last 7 days if no range specified
         if not start:
@@ -89,41 +510,240 @@ async def get_daily_data(
         else:
             start_time = datetime.fromisoformat(start)
             end_time = datetime.fromisoformat(end) if end else datetime.now()
-            
-        data = db.get_daily_data(start_time, end_time, node_id)
-        return {
+        
+        if format != "json":
+            return export_response("daily", start_time, end_time, node_id, format)
+        
+        bounds = (start_time.date().isoformat(), end_time.date().isoformat())
+        return await cached_range_response("daily", node_id, bounds, datetime.now().date().isoformat(),
+                                           start_time, end_time, db.get_daily_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/data/export")
+async def export_data(
+    start: str,
+    end: Optional[str] = None,
+    node_id: int = 1,
+    table: str = "raw",
+    format: str = "ndjson"
+):
+    """Bulk download of raw, hourly or daily rows as streamed ndjson, csv or json"""
+    try:
+        if table not in ("raw", "hourly", "daily"):
+            raise ValueError(f"Unknown table: {table}")
+        start_time = datetime.fromisoformat(start)
+        end_time = datetime.fromisoformat(end) if end else datetime.now()
+        return export_response(table, start_time, end_time, node_id, format)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/metrics")
+async def get_metrics():
+    """Ingest, decode, database and request-latency metrics in the Prometheus text format"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the aggregate response cache"""
+    return {"status": "success", "data": response_cache.stats()}
+
+@app.get("/data/range")
+async def get_range_data(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    node_id: int = 1,
+    resolution: Optional[str] = None,
+    max_points: int = 1000,
+    field: str = "total_rainfall_in"
+):
+    """
+    Get data for any time range at a chosen resolution (5m, 15m, 1h, 6h, 1d, 1w).
+    
+    Without a resolution, the finest one that fits max_points buckets is used. If the
+    requested resolution still yields more than max_points buckets, the series is
+    thinned with LTTB, preserving the shape of `field`.
+    """
+    try:
+        if max_points < 3:
+            raise ValueError("max_points must be at least 3")
+        
+        end_time = datetime.fromisoformat(end) if end else datetime.now()
+        start_time = datetime.fromisoformat(start) if start else end_time - timedelta(hours=24)
+        resolution = choose_resolution(start_time, end_time, max_points, resolution)
+        seconds = RESOLUTIONS[resolution]
+        
+        result = await db.get_range_data(start_time, end_time, node_id, seconds, bucket_offset(seconds))
+        data = result["data"]
+        decimated = len(data) > max_points
+        if decimated:
+            if data and field not in data[0]:
+                raise ValueError(f"Unknown field: {field}")
+            x = [(datetime.fromisoformat(row["bucket_start"]) - EPOCH).total_seconds() for row in data]
+            data = [data[i] for i in lttb(x, [row[field] for row in data], max_points)]
+        
+        # Serialized directly; the default response path would encode the rows twice
+        return Response(content=dumps({
             "status": "success",
             "data": data,
+            "resolution": resolution,
+            "tier": result["tier"],
+            "decimated": decimated,
             "timeRange": {
                 "start": start_time.isoformat(),
                 "end": end_time.isoformat()
             }
-        }
+        }), media_type="application/json")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats/rainfall")
+async def get_rainfall_stats(node_id: int = 1):
+    """
+    Month-to-date, year-to-date and rolling rainfall as of the last closed day, the
+    wettest hours of the month and year, and how the totals compare with normal
+    """
+    try:
+        stats = await db.get_rainfall_stats(node_id)
+        if stats is None:
+            return {"status": "error", "message": "No closed days yet"}
+        return {"status": "success", "data": stats}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats/climatology")
+async def get_climatology(node_id: int = 1, day: Optional[str] = None):
+    """Day-of-year rainfall climatology: one day (MM-DD) or the whole calendar"""
+    try:
+        if day is not None:
+            # Validate MM-DD against a leap year so 02-29 is accepted
+            date.fromisoformat(f"2000-{day}")
+        return {"status": "success", "data": await db.get_climatology(node_id, day)}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/data/current")
-async def get_current_conditions(node_id: int = 1):
-    """Get the most recent measurement"""
+async def get_current_conditions(node_id: int = 1, if_none_match: Optional[str] = Header(None)):
+    """Get the most recent measurement, served from memory once the node has reported"""
+    try:
+        cached = latest_readings.get(node_id)
+        if cached is None:
+            # Cold start or expired entry: read the latest row from the database
+            row = await db.get_latest_measurement(node_id)
+            if not row:
+                return {"status": "error", "message": "No data available"}
+            row.pop('id', None)
+            latest_readings.update(row)
+            cached = latest_readings.get(node_id)
+        
+        body, etag = cached
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(content=body, media_type="application/json",
+                        headers={"ETag": etag, "Cache-Control": "no-cache"})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/maintenance")
+async def trigger_maintenance():
+    """Run retention now; ingest keeps going while old rows are pruned"""
+    try:
+        return {"status": "success", "report": await run_maintenance()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/maintenance")
+async def get_maintenance_report():
+    """Report from the most recent maintenance run"""
+    return {"status": "success", "report": maintenance_state["last_report"]}
+
+@app.get("/archive/aggregates")
+async def get_archived_aggregates(
+    start: str,
+    end: Optional[str] = None,
+    node_id: int = 1,
+    period: str = "month"
+):
+    """Long-range rainfall summaries per day, month or year, read from the Parquet archive"""
+    if not archive.available:
+        raise HTTPException(status_code=503, detail="Archive requires pyarrow")
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM raw_measurements
-            WHERE node_id = ?
-            ORDER BY timestamp DESC
-            LIMIT 1
-        ''', (node_id,))
-        row = cursor.fetchone()
-        if row:
-            return {"status": "success", "data": dict(row)}
-        return {"status": "error", "message": "No data available"}
+        start_date = date.fromisoformat(start[:10])
+        end_date = date.fromisoformat(end[:10]) if end else datetime.now().date()
+        data = await asyncio.get_running_loop().run_in_executor(
+            None, archive.aggregate, node_id, start_date, end_date, period)
+        through = archive.archived_through()
+        return {
+            "status": "success",
+            "data": data,
+            "archivedThrough": through.isoformat() if through else None,
+            "timeRange": {
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat()
+            }
+        }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-def start_server():
-    """Start the FastAPI server"""
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+@app.get("/stream")
+async def stream_measurements(request: Request, node_id: Optional[int] = None):
+    """Server-Sent Events stream of new measurements, optionally for a single node"""
+    async def events():
+        queue = broadcaster.subscribe(node_id)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def start_server(host: str = "0.0.0.0", port: int = 8000, uds: Optional[str] = None):
+    """
+    Start the FastAPI server.
+    
+    With uds set, the same app is also served on a Unix domain socket so a local
+    serial handler can skip the TCP stack; remote gateways keep using host:port.
+    """
+    # Only needed when serving; importing the app for tools or tests skips it
+    import uvicorn
+    
+    if not uds:
+        uvicorn.run(app, host=host, port=port)
+        return
+    
+    tcp_server = uvicorn.Server(uvicorn.Config(app, host=host, port=port))
+    # Startup/shutdown events must only run once for the shared database
+    unix_server = uvicorn.Server(uvicorn.Config(app, uds=uds, lifespan="off"))
+    
+    # Only one set of signal handlers can be installed; have it stop both servers
+    unix_server.install_signal_handlers = lambda: None
+    stop_tcp = tcp_server.handle_exit
+    
+    def handle_exit(sig, frame):
+        stop_tcp(sig, frame)
+        unix_server.handle_exit(sig, frame)
+    
+    tcp_server.handle_exit = handle_exit
+    
+    async def serve_both():
+        await asyncio.gather(tcp_server.serve(), unix_server.serve())
+    
+    asyncio.run(serve_both())
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="WaterLogged API server")
+    parser.add_argument('--host', default="0.0.0.0")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--uds', help="Also listen on this Unix domain socket")
+    args = parser.parse_args()
+    start_server(args.host, args.port, args.uds)
\ No newline at end of file
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Columnar Archive for WaterLogged Rain Gauge System
+
+Copies closed days of raw measurements and the hourly/daily aggregates out of
+SQLite into Parquet files, partitioned per node and per month:
+
+    archive/<tier>/node_id=<N>/month=<YYYY-MM>/data.parquet
+
+Once a day is archived the live database only needs it for the retention
+window, and long-range queries read just the columns and partitions they need
+instead of walking SQLite rows. Exports are incremental: each run appends the
+days closed since the previous run (recorded in archive/_manifest.json) by
+rewriting only the month partitions those days fall in.
+
+Dependencies:
+- pyarrow: For writing and reading Parquet (optional; the archive is disabled without it)
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from database_handler import DatabaseHandler
+
+logger = logging.getLogger('WaterLogged_Archive')
+
+# Tier name -> (source table, bucket column, other columns with their Arrow type names)
+ARCHIVE_TIERS: Dict[str, Tuple[str, str, List[Tuple[str, str]]]] = {
+    'raw': ('raw_measurements', 'timestamp', [
+        ('weight_g', 'float64'),
+        ('rainfall_in', 'float64'),
+        ('temperature_f', 'float64'),
+        ('humidity_pct', 'float64'),
+        ('zero_factor', 'int32'),
+        ('seq', 'int64'),
+    ]),
+    'hourly': ('hourly_aggregates', 'hour_start', [
+        ('total_rainfall_in', 'float64'),
+        ('sum_temperature_f', 'float64'),
+        ('sum_humidity_pct', 'float64'),
+        ('measurement_count', 'int64'),
+    ]),
+    'daily': ('daily_aggregates', 'date', [
+        ('total_rainfall_in', 'float64'),
+        ('sum_temperature_f', 'float64'),
+        ('sum_humidity_pct', 'float64'),
+        ('measurement_count', 'int64'),
+    ]),
+}
+
+# Grouping key length of an ISO date for each aggregation period
+PERIOD_KEY_LENGTH = {'day': 10, 'month': 7, 'year': 4}
+
+# Memory kept for decoded partitions; one node's month of raw readings is well under 1 MB
+PARTITION_CACHE_BYTES = 32 * 1024 * 1024
+
+# Bound by _load_pyarrow(); importing pyarrow takes longer than starting the rest of the API
+pa = pc = pq = None
+
+@functools.lru_cache(maxsize=1)
+def _load_pyarrow() -> bool:
+    """Import pyarrow on first use; returns False if it is not installed"""
+    global pa, pc, pq
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:  # pragma: no cover - depends on the platform
+        return False
+    pa, pc, pq = pyarrow, pyarrow.compute, pyarrow.parquet
+    return True
+
+class PartitionCache:
+    """
+    Decoded partition tables, least recently used first, bounded by their total size.
+    
+    Entries are keyed on the file's mtime, so a month rewritten by an export is read
+    again and its old tables are dropped. A table larger than the whole budget is
+    returned without being cached.
+    """
+    
+    def __init__(self, max_bytes: int = PARTITION_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries: "OrderedDict[Tuple[str, int, Tuple[str, ...]], pa.Table]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def read(self, path: str, mtime_ns: int, columns: Tuple[str, ...]) -> 'pa.Table':
+        key = (path, mtime_ns, columns)
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+                return table
+        
+        table = pq.read_table(path, columns=list(columns))
+        with self._lock:
+            for stale in [other for other in self._entries if other[0] == path and other[1] != mtime_ns]:
+                self.nbytes -= self._entries.pop(stale).nbytes
+            if key not in self._entries:
+                self._entries[key] = table
+                self.nbytes += table.nbytes
+            while self.nbytes > self.max_bytes and self._entries:
+                self.nbytes -= self._entries.popitem(last=False)[1].nbytes
+        return table
+
+_partitions = PartitionCache()
+
+class ParquetArchive:
+    def __init__(self, root: str = 'archive'):
+        self.root = Path(root)
+    
+    @property
+    def available(self) -> bool:
+        """True if pyarrow is installed (imports it on first call)"""
+        return _load_pyarrow()
+    
+    def _require_pyarrow(self):
+        if not _load_pyarrow():
+            raise RuntimeError("The archive needs pyarrow (pip install pyarrow)")
+    
+    @property
+    def manifest_path(self) -> Path:
+        return self.root / '_manifest.json'
+    
+    def archived_through(self) -> Optional[date]:
+        """First day not yet in the archive, or None if nothing was exported"""
+        try:
+            with open(self.manifest_path) as f:
+                return date.fromisoformat(json.load(f)['archived_through'])
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+    
+    def partition_path(self, tier: str, node_id: int, month: str) -> Path:
+        return self.root / tier / f"node_id={node_id}" / f"month={month}" / 'data.parquet'
+    
+    def export(self, db: DatabaseHandler, since: Optional[date] = None) -> Dict[str, int]:
+        """
+        Archive every closed day from the last export (or since) up to yesterday.
+        
+        Args:
+            db: Live database to read from
+            since: Re-export from this day, e.g. after late readings arrived for archived days
+        
+        Returns:
+            Dict mapping tier to the number of rows written
+        """
+        self._require_pyarrow()
+        end = datetime.now().date()
+        start = since or self.archived_through() or self._earliest_day(db)
+        if start is None or start >= end:
+            return {tier: 0 for tier in ARCHIVE_TIERS}
+        
+        written = {tier: self._export_tier(db, tier, start, end) for tier in ARCHIVE_TIERS}
+        
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({'archived_through': end.isoformat()}, f)
+        os.replace(tmp_path, self.manifest_path)
+        
+        logger.info(f"Archived {start} to {end - timedelta(days=1)}: "
+                    + ', '.join(f"{count} {tier}" for tier, count in written.items()))
+        return written
+    
+    def _earliest_day(self, db: DatabaseHandler) -> Optional[date]:
+        # Daily aggregates outlive raw rows, so they reach back furthest
+        row = db.get_read_connection().execute('SELECT MIN(date) FROM daily_aggregates').fetchone()
+        return date.fromisoformat(row[0][:10]) if row[0] else None
+    
+    def _export_tier(self, db: DatabaseHandler, tier: str, start: date, end: date) -> int:
+        """Write [start, end) of one tier, merging into the month partitions it touches"""
+        table, bucket, columns = ARCHIVE_TIERS[tier]
+        names = [bucket, 'node_id'] + [name for name, _ in columns]
+        rows = db.get_read_connection().execute(
+            f"SELECT {', '.join(names)} FROM {table} WHERE {bucket} >= ? AND {bucket} < ?",
+            (start.isoformat(), end.isoformat())
+        ).fetchall()
+        
+        partitions: Dict[Tuple[int, str], List] = {}
+        for row in rows:
+            partitions.setdefault((row[1], row[0][:7]), []).append(row)
+        
+        for (node_id, month), partition_rows in partitions.items():
+            new_rows = self._to_table(tier, partition_rows)
+            path = self.partition_path(tier, node_id, month)
+            if path.exists():
+                # Keep what earlier exports wrote before start; [start, end) is replaced
+                existing = pq.read_table(path)
+                new_rows = pa.concat_tables([
+                    existing.filter(pc.less(existing[bucket], self._bucket_scalar(tier, start))),
+                    new_rows
+                ])
+            new_rows = new_rows.sort_by(bucket)
+            
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix('.tmp')
+            pq.write_table(new_rows, tmp_path, compression='zstd')
+            os.replace(tmp_path, path)
+        return len(rows)
+    
+    def _to_table(self, tier: str, rows: List) -> 'pa.Table':
+        """Build an Arrow table column by column from SQLite rows"""
+        _, bucket, columns = ARCHIVE_TIERS[tier]
+        values = list(zip(*rows))
+        arrays = {bucket: pc.cast(pa.array(values[0], pa.string()), self._bucket_type(tier))}
+        for index, (name, type_name) in enumerate(columns, start=2):
+            arrays[name] = pa.array(values[index], getattr(pa, type_name)())
+        return pa.table(arrays)
+    
+    @staticmethod
+    def _bucket_type(tier: str) -> 'pa.DataType':
+        return pa.date32() if tier == 'daily' else pa.timestamp('us')
+    
+    def _bucket_scalar(self, tier: str, day: date) -> 'pa.Scalar':
+        value = day if tier == 'daily' else datetime.combine(day, datetime.min.time())
+        return pa.scalar(value, self._bucket_type(tier))
+    
+    def read(self, tier: str, node_id: int, start: date, end: date,
+             columns: Optional[List[str]] = None) -> 'pa.Table':
+        """
+        Read one node's archived rows with bucket in [start, end).
+        
+        Only the month partitions overlapping the range are opened, and only the
+        requested columns (plus the bucket column) are decoded.
+        
+        Args:
+            tier: 'raw', 'hourly' or 'daily'
+            node_id: Node to read
+            start: First day to include
+            end: First day to exclude
+            columns: Columns to return (default: all)
+        
+        Returns:
+            pyarrow.Table with the bucket column first
+        """
+        self._require_pyarrow()
+        _, bucket, tier_columns = ARCHIVE_TIERS[tier]
+        wanted = tuple([bucket] + (columns or [name for name, _ in tier_columns]))
+        
+        tables = []
+        for month in self._months(start, end):
+            path = self.partition_path(tier, node_id, month)
+            try:
+                mtime_ns = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            tables.append(_partitions.read(str(path), mtime_ns, wanted))
+        if not tables:
+            types = {bucket: self._bucket_type(tier)}
+            types.update((name, getattr(pa, type_name)()) for name, type_name in tier_columns)
+            return pa.table({name: pa.array([], types[name]) for name in wanted})
+        
+        result = pa.concat_tables(tables)
+        in_range = pc.and_(pc.greater_equal(result[bucket], self._bucket_scalar(tier, start)),
+                           pc.less(result[bucket], self._bucket_scalar(tier, end)))
+        return result.filter(in_range)
+    
+    @staticmethod
+    def _months(start: date, end: date) -> List[str]:
+        """YYYY-MM of every month overlapping [start, end)"""
+        months = []
+        year, month = start.year, start.month
+        while date(year, month, 1) < end:
+            months.append(f"{year:04d}-{month:02d}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return months
+    
+    def aggregate(self, node_id: int, start: date, end: date, period: str = 'month') -> List[Dict]:
+        """
+        Summarize archived daily aggregates per day, month or year.
+        
+        Returns:
+            One dict per period with total rainfall, weighted average temperature and
+            humidity, and the number of readings behind them
+        """
+        if period not in PERIOD_KEY_LENGTH:
+            raise ValueError(f"period must be one of {', '.join(PERIOD_KEY_LENGTH)}")
+        daily = self.read('daily', node_id, start, end)
+        if daily.num_rows == 0:
+            return []
+        
+        keys = pc.utf8_slice_codeunits(pc.cast(daily['date'], pa.string()), 0, PERIOD_KEY_LENGTH[period])
+        grouped = daily.append_column('period', keys).group_by('period').aggregate([
+            ('total_rainfall_in', 'sum'),
+            ('sum_temperature_f', 'sum'),
+            ('sum_humidity_pct', 'sum'),
+            ('measurement_count', 'sum'),
+        ]).sort_by('period')
+        
+        results = []
+        for row in grouped.to_pylist():
+            count = row['measurement_count_sum']
+            results.append({
+                'period': row['period'],
+                'node_id': node_id,
+                'total_rainfall_in': row['total_rainfall_in_sum'],
+                'avg_temperature_f': row['sum_temperature_f_sum'] / count if count else None,
+                'avg_humidity_pct': row['sum_humidity_pct_sum'] / count if count else None,
+                'measurement_count': count,
+            })
+        return results
+
+def main():
+    """Command line entry point for exporting and querying the archive"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="WaterLogged Parquet archive")
+    parser.add_argument('--db', default="waterlogged.db", help="Path to the SQLite database")
+    parser.add_argument('--root', default="archive", help="Archive directory")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    export = subparsers.add_parser('export', help="Archive days closed since the last export")
+    export.add_argument('--since', help="Re-export from this day (ISO format)")
+    
+    query = subparsers.add_parser('query', help="Summarize archived rainfall")
+    query.add_argument('--node', type=int, default=1)
+    query.add_argument('--start', required=True, help="First day (ISO format)")
+    query.add_argument('--end', help="Day after the last one (default: today)")
+    query.add_argument('--period', default='month', choices=sorted(PERIOD_KEY_LENGTH))
+    
+    args = parser.parse_args()
+    archive = ParquetArchive(args.root)
+    if args.command == 'export':
+        db = DatabaseHandler(args.db)
+        try:
+            since = date.fromisoformat(args.since) if args.since else None
+            for tier, count in archive.export(db, since).items():
+                print(f"{tier}: {count} rows")
+        finally:
+            db.close()
+    elif args.command == 'query':
+        end = date.fromisoformat(args.end) if args.end else datetime.now().date()
+        for row in archive.aggregate(args.node, date.fromisoformat(args.start), end, args.period):
+            print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Ingest Benchmark for WaterLogged Gateway
+
+Compares end-to-end ingest of single readings across the delivery modes the
+serial handler supports, using the same senders it builds for --mode:
+- direct: DirectIngestSender decodes and inserts in-process (no API hop)
+- unix: ApiSender posts spooled batches to the API server over its Unix domain socket
+- http: ApiSender posts spooled batches to the API server over TCP with a keep-alive session
+
+Each reading is handed to the sender's submit() one at a time, as the serial
+gateway does, and timed until its row is in the database. The API server is
+started in a subprocess against a temporary database for the unix and http
+modes. Reports readings per second and p50/p99 latency per mode.
+
+Usage:
+    python3 benchmark_ingest.py [--count 2000] [--modes direct,unix,http] [--rate 0]
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import requests
+
+SAMPLE_PAYLOAD = "245.320,0.2843,73.4,65.2,8234"
+API_SERVER = Path(__file__).resolve().parent / 'api_server.py'
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def stored_count(db_path: str) -> int:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM raw_measurements").fetchone()[0]
+    finally:
+        conn.close()
+
+def bench_mode(mode: str, workdir: str, db_path: str, count: int, rate: float,
+               api_url: str = '', uds: str = '') -> Dict[str, float]:
+    """Submit count readings through the mode's sender and time each until it is stored"""
+    # Imported here so the benchmarks package can use this module without pyserial installed
+    from serial_handler import create_sender
+    
+    sender = create_sender(mode, api_url, uds, db_path, spool_path=os.path.join(workdir, f'{mode}_spool.db'))
+    sender.start()
+    # Both API modes write to the server's database, so only rows added from here count
+    before = stored_count(db_path)
+    
+    submitted_at: List[float] = []
+    stored_at: List[float] = []
+    
+    def poll():
+        # Reading i counts as stored at the first poll that sees more than i new rows
+        stored = min(stored_count(db_path) - before, len(submitted_at))
+        now = time.perf_counter()
+        stored_at.extend([now] * (stored - len(stored_at)))
+    
+    try:
+        started = time.perf_counter()
+        for i in range(count):
+            # Pace submits like a serial line, polling for stored rows in the gaps
+            while rate and time.perf_counter() < started + i / rate:
+                poll()
+                time.sleep(0.001)
+            submitted_at.append(time.perf_counter())
+            sender.submit([SAMPLE_PAYLOAD])
+        
+        deadline = time.monotonic() + 60
+        while len(stored_at) < count and time.monotonic() < deadline:
+            poll()
+            time.sleep(0.002)
+    finally:
+        sender.stop()
+    
+    if len(stored_at) < count:
+        raise RuntimeError(f"{mode}: only {len(stored_at)} of {count} readings were stored")
+    latencies = [done - sent for sent, done in zip(submitted_at, stored_at)]
+    return {
+        'readings_per_sec': count / (stored_at[-1] - submitted_at[0]),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+def start_api_server(workdir: str, port: int, uds: str) -> subprocess.Popen:
+    """Start api_server.py in workdir and wait until it answers"""
+    process = subprocess.Popen(
+        [sys.executable, str(API_SERVER), '--host', '127.0.0.1', '--port', str(port), '--uds', uds],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        env={**os.environ, 'PYTHONPATH': str(API_SERVER.parent)}
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/data/current", timeout=1)
+            if os.path.exists(uds):
+                return process
+        except requests.exceptions.ConnectionError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("API server did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WaterLogged ingest modes")
+    parser.add_argument('--count', type=int, default=2000, help="Readings per mode")
+    parser.add_argument('--modes', default='direct,unix,http')
+    parser.add_argument('--rate', type=float, default=0.0,
+                        help="Readings submitted per second (default: as fast as possible)")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    modes = args.modes.split(',')
+    
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'direct' in modes:
+            results['direct'] = bench_mode('direct', workdir, os.path.join(workdir, 'direct.db'),
+                                           args.count, args.rate)
+        
+        if 'unix' in modes or 'http' in modes:
+            uds = os.path.join(workdir, 'api.sock')
+            server = start_api_server(workdir, args.port, uds)
+            api_url = f"http://127.0.0.1:{args.port}/measurements/batch"
+            try:
+                for mode in ('unix', 'http'):
+                    if mode in modes:
+                        results[mode] = bench_mode(mode, workdir, os.path.join(workdir, 'waterlogged.db'),
+                                                   args.count, args.rate, api_url, uds)
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+    
+    print(f"{'mode':<8} {'readings/s':>12} {'p50 ms':>10} {'p99 ms':>10}")
+    for mode, stats in results.items():
+        print(f"{mode:<8} {stats['readings_per_sec']:>12.1f} {stats['p50_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""
+Benchmark Suite for WaterLogged Gateway
+
+Measures how many nodes and readings per second the gateway sustains:
+- generator: Deterministic synthetic readings from many nodes, as CSV lines or binary frames
+- fake_serial: A pty standing in for /dev/waterlogged_arduino
+- micro: Decoder, insert and aggregate query microbenchmarks
+- end_to_end: Throughput and latency through a real api_server process, over HTTP and from the fake serial port,
+  and the time a fresh api_server takes to answer its first request
+- baseline: Saves results as JSON and flags regressions against a stored run
+
+Run from the raspberrypi directory:
+    python3 -m benchmarks [--suites micro,api,serial,startup] [--save baselines/pi4.json] [--compare baselines/pi4.json]
+"""
@@ -0,0 +1,69 @@
+"""Command line entry point: python3 -m benchmarks"""
+
+import argparse
+import logging
+import sys
+import tempfile
+
+from benchmarks import baseline, end_to_end, micro
+
+def print_results(results):
+    print(f"{'benchmark':<26} {'items/s':>12} {'p50 ms':>10} {'p99 ms':>10}")
+    for name, stats in results.items():
+        print(f"{name:<26} {stats['per_sec']:>12.1f} {stats['p50_ms']:>10.3f} {stats['p99_ms']:>10.3f}")
+
+def print_comparison(rows, threshold):
+    print(f"\n{'benchmark':<26} {'metric':<8} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, metric, old, new, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<26} {metric:<8} {old:>12.3f} {new:>12.3f} {change:>+8.1%}{flag}")
+    regressions = sum(row[5] for row in rows)
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="WaterLogged gateway benchmarks")
+    parser.add_argument('--suites', default='micro,api,serial',
+                        help="Comma-separated: micro, api (HTTP ingest through api_server), "
+                             "serial (fake serial port through the whole pipeline), "
+                             "startup (time until a fresh api_server answers)")
+    parser.add_argument('--count', type=int, default=5000, help="Readings per ingest benchmark")
+    parser.add_argument('--nodes', type=int, default=16, help="Synthetic nodes")
+    parser.add_argument('--days', type=int, default=30, help="Days of data behind the query benchmarks")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=100, help="Lines per POST in the api suite")
+    parser.add_argument('--serial-rate', type=float, default=200.0, help="Lines per second into the fake port")
+    parser.add_argument('--startup-runs', type=int, default=10, help="API server starts in the startup suite")
+    parser.add_argument('--port', type=int, default=8766, help="Port for the benchmark API server")
+    parser.add_argument('--save', help="Write results to this JSON file (e.g. baselines/pi4.json)")
+    parser.add_argument('--compare', help="Compare against a saved results file; exit 1 on regressions")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+    suites = args.suites.split(',')
+    
+    # Per-reading log lines would dominate the timings
+    logging.disable(logging.WARNING)
+    
+    settings = {key: value for key, value in vars(args).items() if key not in ('save', 'compare', 'threshold', 'port')}
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if 'micro' in suites:
+            results.update(micro.run(workdir, args.count, args.nodes, args.days, args.seed))
+        e2e = tuple(suite for suite in suites if suite in ('api', 'serial', 'startup'))
+        if e2e:
+            results.update(end_to_end.run(workdir, args.port, args.count, args.nodes, args.seed,
+                                          args.batch_size, args.serial_rate, e2e, args.startup_runs))
+    
+    print_results(results)
+    if args.save:
+        baseline.save(args.save, results, settings)
+        print(f"\nSaved results to {args.save}")
+    if args.compare:
+        stored = baseline.load(args.compare)
+        if stored['settings'] != settings:
+            print(f"\nWarning: baseline was recorded with different settings: {stored['settings']}")
+        if print_comparison(baseline.compare(stored['results'], results, args.threshold), args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
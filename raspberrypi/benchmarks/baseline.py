@@ -0,0 +1,58 @@
+"""
+Stored benchmark results and regression checks.
+
+A result file records the numbers of every benchmark together with the machine
+and settings they came from, so runs on the same Pi can be compared over time.
+Throughput metrics (`per_sec`) are better when higher, latencies (`_ms`) when lower.
+"""
+
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+def environment() -> Dict[str, Optional[str]]:
+    """Where the numbers came from; a comparison across machines means little"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'python': sys.version.split()[0],
+        'commit': commit,
+        'recorded': datetime.now().isoformat(timespec='seconds'),
+    }
+
+def save(path: str, results: Dict[str, Dict[str, float]], settings: Dict):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'settings': settings, 'results': results}, f, indent=2)
+
+def load(path: str) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def compare(baseline: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, float]],
+            threshold: float = 0.1) -> List[Tuple[str, str, float, float, float, bool]]:
+    """
+    Compare each metric present in both runs.
+    
+    Returns:
+        (benchmark, metric, baseline value, current value, relative change, regressed)
+        per metric, where a positive change is always an improvement
+    """
+    rows = []
+    for name, metrics in current.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if not old:
+                continue
+            change = (value - old) / old if metric.endswith('per_sec') else (old - value) / old
+            rows.append((name, metric, old, value, change, change < -threshold))
+    return rows
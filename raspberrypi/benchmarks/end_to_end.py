@@ -0,0 +1,137 @@
+"""
+End-to-end benchmarks through a real api_server process.
+
+- api_single / api_batch: POST generated payloads to the API and time each request
+- serial_pipeline: write lines into a fake serial port at a fixed rate and time
+  each reading from the write until its row is in the database, through
+  SerialGateway, the spooled ApiSender and the API
+- api_startup: launch api_server.py against the database the other suites filled and
+  time each start until its first request is answered
+
+The API server runs in a subprocess against a database in the work directory.
+"""
+
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List
+
+import requests
+
+from benchmark_ingest import API_SERVER, start_api_server, stored_count
+from benchmarks.fake_serial import FakeSerialPort
+from benchmarks.generator import DEFAULT_START, SyntheticNodes
+from benchmarks.micro import batches, summarize, time_calls
+
+def bench_api(port: int, count: int, nodes: int, seed: int, batch_size: int) -> Dict[str, Dict[str, float]]:
+    session = requests.Session()
+    base = f"http://127.0.0.1:{port}"
+    
+    def post_single(line: str):
+        session.post(f"{base}/measurements", params={'payload': line}).raise_for_status()
+    
+    def post_batch(chunk: List[str]):
+        session.post(f"{base}/measurements/batch", json={'payloads': chunk}).raise_for_status()
+    
+    # Separate time ranges so no run's readings are skipped as duplicates of another's
+    single = SyntheticNodes(nodes, seed=seed, start=DEFAULT_START).lines(count // 10)
+    batched = SyntheticNodes(nodes, seed=seed, start=DEFAULT_START + timedelta(days=100)).lines(count)
+    try:
+        return {
+            'api_single': time_calls([lambda line=line: post_single(line) for line in single]),
+            f'api_batch_{batch_size}': time_calls(
+                [lambda chunk=chunk: post_batch(chunk) for chunk in batches(batched, batch_size)], len(batched)),
+        }
+    finally:
+        session.close()
+
+def bench_serial(workdir: str, port: int, count: int, nodes: int, seed: int, rate: float) -> Dict[str, float]:
+    """Readings per second and write-to-stored latency from the fake serial port"""
+    # Imported here so the other suites run without pyserial installed
+    from api_sender import ApiSender
+    from serial_handler import SerialGateway
+    
+    db_path = os.path.join(workdir, 'waterlogged.db')
+    lines = SyntheticNodes(nodes, seed=seed, start=DEFAULT_START + timedelta(days=200)).lines(count)
+    before = stored_count(db_path)
+    
+    with FakeSerialPort() as fake:
+        sender = ApiSender(api_url=f"http://127.0.0.1:{port}/measurements/batch",
+                           spool_path=os.path.join(workdir, 'serial_spool.db'))
+        # No settle time: the pty does not reset on open the way an Arduino does
+        gateway = SerialGateway({fake.path: None}, sender=sender, settle_time=0)
+        # Open before feeding: pyserial discards whatever arrived before the open
+        device = gateway.ports[0]
+        gateway.open_port(device)
+        if device.serial is None:
+            raise RuntimeError(f"Could not open fake serial port {fake.path}")
+        reader = threading.Thread(target=gateway.run, name='serial-gateway', daemon=True)
+        reader.start()
+        
+        # Reading i counts as stored at the first poll that sees more than i new rows
+        stored_at: List[float] = []
+        fake.feed(lines, rate)
+        deadline = time.monotonic() + count / rate + 60
+        while len(stored_at) < count and time.monotonic() < deadline:
+            stored = stored_count(db_path) - before
+            now = time.perf_counter()
+            stored_at.extend([now] * (min(stored, count) - len(stored_at)))
+            time.sleep(0.005)
+        
+        gateway.stop()
+        reader.join(5)
+        gateway.close()
+    
+    if len(stored_at) < count:
+        raise RuntimeError(f"Only {len(stored_at)} of {count} readings were stored")
+    latencies = [done - sent for sent, done in zip(fake.sent_at, stored_at)]
+    return summarize(latencies, count, stored_at[-1] - fake.sent_at[0])
+
+def bench_startup(workdir: str, port: int, runs: int) -> Dict[str, float]:
+    """Time from launching the API server until it answers, polled every few milliseconds"""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(runs):
+        launched = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, str(API_SERVER), '--host', '127.0.0.1', '--port', str(port)],
+            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    requests.get(f"http://127.0.0.1:{port}/data/current", timeout=1)
+                    break
+                except requests.exceptions.ConnectionError:
+                    if process.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("API server did not start")
+                    time.sleep(0.002)
+            latencies.append(time.perf_counter() - launched)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+    return summarize(latencies, runs, time.perf_counter() - started)
+
+def run(workdir: str, port: int = 8766, count: int = 5000, nodes: int = 16, seed: int = 1,
+        batch_size: int = 100, serial_rate: float = 200.0, suites: tuple = ('api', 'serial'),
+        startup_runs: int = 10) -> Dict[str, Dict[str, float]]:
+    """Start an API server in workdir and run the selected end-to-end suites against it"""
+    results = {}
+    if 'api' in suites or 'serial' in suites:
+        server = start_api_server(workdir, port, os.path.join(workdir, 'api.sock'))
+        try:
+            if 'api' in suites:
+                results.update(bench_api(port, count, nodes, seed, batch_size))
+            if 'serial' in suites:
+                results['serial_pipeline'] = bench_serial(workdir, port, count // 5, nodes, seed, serial_rate)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+    if 'startup' in suites:
+        # Runs last so the server opens a database that already holds the other suites' readings
+        results['api_startup'] = bench_startup(workdir, port, startup_runs)
+    return results
@@ -0,0 +1,64 @@
+"""
+Pseudo-terminal stand-in for the Arduino serial port.
+
+SerialGateway opens `port.path` exactly as it would open /dev/waterlogged_arduino,
+while the benchmark writes payload lines into the other end at a chosen rate.
+"""
+
+import os
+import threading
+import time
+import tty
+from typing import List, Optional
+
+class FakeSerialPort:
+    """A pty whose device path can be handed to SerialGateway"""
+    
+    def __init__(self):
+        self._master, self._slave = os.openpty()
+        # Raw mode: no echo back into the reader and no newline translation
+        tty.setraw(self._slave)
+        self.path = os.ttyname(self._slave)
+        self._writer: Optional[threading.Thread] = None
+        self.sent_at: List[float] = []
+    
+    def write_lines(self, lines: List[str]):
+        """Write lines immediately, as one burst"""
+        os.write(self._master, ''.join(line + '\n' for line in lines).encode())
+    
+    def feed(self, lines: List[str], rate: float, burst: int = 1):
+        """
+        Write lines from a background thread at `rate` lines per second.
+        
+        Lines go out `burst` at a time, like a LoRa bridge relaying several nodes
+        at once. The send time of each line is recorded in sent_at.
+        """
+        def run():
+            started = time.perf_counter()
+            for offset in range(0, len(lines), burst):
+                due = started + offset / rate
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                chunk = lines[offset:offset + burst]
+                self.write_lines(chunk)
+                self.sent_at.extend([time.perf_counter()] * len(chunk))
+        
+        self._writer = threading.Thread(target=run, name='fake-serial', daemon=True)
+        self._writer.start()
+    
+    def wait(self, timeout: Optional[float] = None):
+        """Wait for feed() to write its last line"""
+        if self._writer:
+            self._writer.join(timeout)
+    
+    def close(self):
+        self.wait()
+        os.close(self._master)
+        os.close(self._slave)
+    
+    def __enter__(self) -> 'FakeSerialPort':
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
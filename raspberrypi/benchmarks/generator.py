@@ -0,0 +1,73 @@
+"""
+Synthetic multi-node readings for benchmarks.
+
+Each node reports on a fixed interval with a per-node phase. Rain falls in storms,
+so aggregates see the mix of dry and wet buckets a real deployment produces. The
+same seed always yields the same readings, so runs are comparable.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Union
+
+from payload_decoder import PayloadDecoder
+
+# Fixed so device timestamps, and therefore the buckets they land in, repeat across runs
+DEFAULT_START = datetime(2024, 5, 1)
+
+class SyntheticNodes:
+    """Readings from `nodes` gauges reporting every `interval` seconds"""
+    
+    def __init__(self, nodes: int = 16, interval: float = 60.0, seed: int = 1,
+                 start: datetime = DEFAULT_START):
+        self.nodes = nodes
+        self.interval = interval
+        self.start = start
+        self._random = random.Random(seed)
+        self._encoder = PayloadDecoder()
+        self._seq = [0] * (nodes + 1)
+        self._raining = [False] * (nodes + 1)
+        self._zero_factor = [self._random.randint(7500, 9500) for _ in range(nodes + 1)]
+        self._phase = [self._random.uniform(0, interval) for _ in range(nodes + 1)]
+    
+    def readings(self, count: int) -> Iterator[Dict[str, Union[float, int, str]]]:
+        """Yield count measurements, round-robin over the nodes in time order"""
+        rng = self._random
+        for index in range(count):
+            node_id = index % self.nodes + 1
+            seq = self._seq[node_id]
+            self._seq[node_id] += 1
+            
+            # Storms start and stop at random; rain only accumulates while one lasts
+            if rng.random() < (0.2 if self._raining[node_id] else 0.02):
+                self._raining[node_id] = not self._raining[node_id]
+            rainfall = round(rng.expovariate(40), 4) if self._raining[node_id] else 0.0
+            
+            timestamp = self.start + timedelta(seconds=seq * self.interval + self._phase[node_id])
+            yield {
+                'timestamp': timestamp.replace(microsecond=0).isoformat(),
+                'node_id': node_id,
+                'seq': seq,
+                'weight_g': round(rng.uniform(-5, 400), 3),
+                'rainfall_in': min(rainfall, 15.0),
+                'temperature_f': round(rng.gauss(65, 12), 1),
+                'humidity_pct': round(min(100.0, max(0.0, rng.gauss(60, 15))), 1),
+                'zero_factor': self._zero_factor[node_id],
+            }
+    
+    def lines(self, count: int, fmt: str = 'v2') -> List[str]:
+        """Payload lines as a node would send them: 'v2' or 'legacy' CSV, or hex-encoded 'binary' frames"""
+        lines = []
+        for m in self.readings(count):
+            if fmt == 'binary':
+                lines.append(self._encoder.encode(m).hex().upper())
+            elif fmt == 'legacy':
+                lines.append(f"{m['weight_g']},{m['rainfall_in']},{m['temperature_f']},"
+                             f"{m['humidity_pct']},{m['zero_factor']}")
+            elif fmt == 'v2':
+                device_time = int(datetime.fromisoformat(m['timestamp']).timestamp())
+                lines.append(f"v2,{m['node_id']},{m['seq']},{device_time},{m['weight_g']},{m['rainfall_in']},"
+                             f"{m['temperature_f']},{m['humidity_pct']},{m['zero_factor']}")
+            else:
+                raise ValueError(f"Unknown payload format: {fmt}")
+        return lines
@@ -0,0 +1,98 @@
+"""
+Microbenchmarks for the gateway's hot paths.
+
+Each benchmark reports items per second plus p50/p99 latency per call, on a
+temporary database so runs never touch waterlogged.db.
+"""
+
+import os
+import statistics
+import time
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional, Sequence
+
+from benchmark_ingest import percentile
+from benchmarks.generator import DEFAULT_START, SyntheticNodes
+from database_handler import DatabaseHandler
+from payload_decoder import PayloadDecoder
+
+def summarize(latencies: Sequence[float], items: int, elapsed: float) -> Dict[str, float]:
+    """Items per second over the whole run, and per-call latency percentiles"""
+    return {
+        'per_sec': items / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': percentile(list(latencies), 99) * 1000,
+    }
+
+def time_calls(calls: Sequence[Callable[[], object]], items: Optional[int] = None) -> Dict[str, float]:
+    """Run each call once, timing it individually; items defaults to one per call"""
+    latencies = []
+    started = time.perf_counter()
+    for call in calls:
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, items or len(calls), time.perf_counter() - started)
+
+def batches(items: List, size: int) -> List[List]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def bench_decoder(count: int, nodes: int, seed: int) -> Dict[str, Dict[str, float]]:
+    decoder = PayloadDecoder()
+    results = {}
+    for fmt in ('v2', 'binary'):
+        lines = SyntheticNodes(nodes, seed=seed).lines(count, fmt)
+        results[f'decode_{fmt}'] = time_calls([lambda line=line: decoder.decode(line) for line in lines])
+        results[f'decode_many_{fmt}'] = time_calls(
+            [lambda chunk=chunk: decoder.decode_many(chunk) for chunk in batches(lines, 500)], len(lines))
+    return results
+
+def bench_inserts(workdir: str, count: int, nodes: int, seed: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    
+    db = DatabaseHandler(os.path.join(workdir, 'insert_single.db'))
+    try:
+        readings = list(SyntheticNodes(nodes, seed=seed).readings(count))
+        results['insert_measurement'] = time_calls([lambda m=m: db.insert_measurement(m) for m in readings])
+    finally:
+        db.close()
+    
+    db = DatabaseHandler(os.path.join(workdir, 'insert_batch.db'))
+    try:
+        readings = list(SyntheticNodes(nodes, seed=seed).readings(count * 10))
+        results['insert_measurements_500'] = time_calls(
+            [lambda chunk=chunk: db.insert_measurements(chunk) for chunk in batches(readings, 500)], len(readings))
+    finally:
+        db.close()
+    return results
+
+def bench_queries(workdir: str, days: int, nodes: int, seed: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Aggregate queries against `days` of readings from every node at a 5 minute interval"""
+    db = DatabaseHandler(os.path.join(workdir, 'queries.db'))
+    try:
+        generator = SyntheticNodes(nodes, interval=300, seed=seed)
+        for chunk in batches(list(generator.readings(days * 288 * nodes)), 5000):
+            db.insert_measurements(chunk)
+        
+        end = DEFAULT_START + timedelta(days=days)
+        node_ids = [i % nodes + 1 for i in range(repeat)]
+        queries = {
+            'hourly_24h': lambda node: db.get_hourly_data(end - timedelta(days=1), end, node),
+            'hourly_7d': lambda node: db.get_hourly_data(end - timedelta(days=7), end, node),
+            'daily_all': lambda node: db.get_daily_data(DEFAULT_START, end, node),
+            'range_5m_24h': lambda node: db.get_range_data(end - timedelta(days=1), end, node, 300),
+            'range_1h_all': lambda node: db.get_range_data(DEFAULT_START, end, node, 3600),
+            'range_1d_all': lambda node: db.get_range_data(DEFAULT_START, end, node, 86400),
+        }
+        return {name: time_calls([lambda node=node: query(node) for node in node_ids])
+                for name, query in queries.items()}
+    finally:
+        db.close()
+
+def run(workdir: str, count: int = 5000, nodes: int = 16, days: int = 30, seed: int = 1,
+        repeat: int = 200) -> Dict[str, Dict[str, float]]:
+    """All microbenchmarks, keyed by benchmark name"""
+    results = bench_decoder(count, nodes, seed)
+    results.update(bench_inserts(workdir, count, nodes, seed))
+    results.update(bench_queries(workdir, days, nodes, seed, repeat))
+    return results
@@ -4,53 +4,287 @@ Database Handler for WaterLogged Rain Gauge System
 
 This module handles all database operations for the WaterLogged system, including:
 - Storing raw measurement data from rain gauge nodes
-- Creating and maintaining aggregated data tables (hourly, daily)
+- Creating and maintaining aggregated data tables (hourly, daily, monthly)
 - Providing query interfaces for the API server
-- Managing database maintenance tasks
+- Managing database maintenance tasks (retention, vacuum)
 
-The database schema includes four main tables:
+The database schema includes five main tables:
 1. raw_measurements: Individual readings from nodes
 2. hourly_aggregates: Hourly aggregated statistics
 3. daily_aggregates: Daily aggregated statistics
-4. nodes: Information about registered nodes
+4. monthly_aggregates: Monthly aggregated statistics
+5. nodes: Information about registered nodes
 
 Dependencies:
 - sqlite3: For database operations
 - datetime: For time operations and aggregation
 """
 
+import argparse
+import asyncio
+import functools
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 import logging
-from typing import List, Dict, Optional, Union
+from typing import Any, AsyncIterator, Callable, Iterator, List, Dict, Optional, Tuple, Union
 import json
 from pathlib import Path
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from metrics import Counter, Gauge, Histogram
+from rain_processor import DERIVED_COLUMNS, STATE_COLUMNS, NodeState, RainProcessor
+
 logger = logging.getLogger('WaterLogged_DB')
 
+STORED = Counter('waterlogged_measurements_stored_total', "Raw measurements written to the database, per node",
+                 ['node_id'])
+DUPLICATES = Counter('waterlogged_measurements_duplicate_total', "Measurements skipped as already stored")
+INSERT_FAILURES = Counter('waterlogged_insert_failures_total', "Insert batches rolled back")
+INSERT_SECONDS = Histogram('waterlogged_insert_seconds',
+                           "Time to store one batch, including the aggregate update and commit")
+AGGREGATE_SECONDS = Histogram('waterlogged_aggregate_update_seconds',
+                              "Time to fold one batch into the hourly, daily and monthly aggregates")
+RAIN_RATE = Gauge('waterlogged_rain_rate_inches_per_hour', "Latest derived rain rate, per node", ['node_id'])
+RAIN_EVENTS = Counter('waterlogged_rain_events_total', "Derived gauge events (retare, empty, drift), per node",
+                      ['node_id', 'event'])
+
+# Queries on the request path; check_query_plans() verifies they stay index-backed
+HOURLY_RANGE_SQL = '''
+    SELECT * FROM hourly_aggregates
+    WHERE hour_start >= ? AND hour_start < ?
+    AND node_id = ?
+    ORDER BY hour_start
+'''
+
+DAILY_RANGE_SQL = '''
+    SELECT * FROM daily_aggregates
+    WHERE date >= ? AND date < ?
+    AND node_id = ?
+    ORDER BY date
+'''
+
+LATEST_MEASUREMENT_SQL = '''
+    SELECT * FROM raw_measurements
+    WHERE node_id = ?
+    ORDER BY timestamp DESC
+    LIMIT 1
+'''
+
+RAW_RANGE_SQL = '''
+    SELECT timestamp, node_id, rainfall_in, temperature_f, humidity_pct
+    FROM raw_measurements
+    WHERE timestamp >= ? AND timestamp < ?
+'''
+
+RAW_EXPORT_SQL = f'''
+    SELECT timestamp, node_id, seq, weight_g, rainfall_in, temperature_f, humidity_pct, zero_factor,
+        {', '.join(DERIVED_COLUMNS)}
+    FROM raw_measurements
+    WHERE node_id = ? AND timestamp >= ? AND timestamp < ?
+    ORDER BY timestamp
+'''
+
+SEQUENCE_RANGE_SQL = '''
+    SELECT seq, timestamp FROM raw_measurements
+    WHERE node_id = ? AND seq BETWEEN ? AND ?
+'''
+
+RAIN_STREAM_STATE_SQL = '''
+    SELECT * FROM rain_stream_state WHERE node_id = ?
+'''
+
+RAINFALL_STATS_SQL = '''
+    SELECT * FROM rainfall_stats WHERE node_id = ?
+'''
+
+CLIMATOLOGY_DAY_SQL = '''
+    SELECT * FROM rainfall_climatology WHERE node_id = ? AND day_of_year = ?
+'''
+
+# Per year: the day's total, and month- and year-to-date totals through that day of year
+CLIMATOLOGY_YEARS_SQL = '''
+    SELECT substr(date, 1, 4) AS year,
+        SUM(CASE WHEN substr(date, 6, 5) = ?2 THEN total_rainfall_in END) AS day_total,
+        SUM(CASE WHEN substr(date, 6, 2) = substr(?2, 1, 2) THEN total_rainfall_in ELSE 0 END) AS mtd,
+        SUM(total_rainfall_in) AS ytd
+    FROM daily_aggregates
+    WHERE node_id = ?1 AND substr(date, 6, 5) <= ?2 AND date <= ?3
+    GROUP BY year
+'''
+
+# Stored tiers from finest to coarsest: (table, bucket column, granularity in seconds)
+RANGE_TIERS = [
+    ('raw_measurements', 'timestamp', 1),
+    ('hourly_aggregates', 'hour_start', 3600),
+    ('daily_aggregates', 'date', 86400),
+]
+
+# Re-bucket any tier to a coarser resolution; ?1 offset, ?2 resolution (seconds since the epoch)
+RAW_RESAMPLE_SQL = '''
+    SELECT (CAST(strftime('%s', timestamp) AS INTEGER) - ?1) / ?2 AS bucket,
+        SUM(rainfall_in), SUM(temperature_f), SUM(humidity_pct), COUNT(*)
+    FROM raw_measurements
+    WHERE node_id = ?3 AND timestamp >= ?4 AND timestamp < ?5
+    GROUP BY bucket
+    ORDER BY bucket
+'''
+
+AGGREGATE_RESAMPLE_SQL = '''
+    SELECT (CAST(strftime('%s', {bucket_column}) AS INTEGER) - ?1) / ?2 AS bucket,
+        SUM(total_rainfall_in), SUM(sum_temperature_f), SUM(sum_humidity_pct), SUM(measurement_count)
+    FROM {table}
+    WHERE node_id = ?3 AND {bucket_column} >= ?4 AND {bucket_column} < ?5
+    GROUP BY bucket
+    ORDER BY bucket
+'''
+
+# Bucket numbers from the resample queries count from here (timestamps are naive local time)
+EPOCH = datetime(1970, 1, 1)
+
+CLIMATOLOGY_COLUMNS = (
+    'years', 'daily_mean_in', 'daily_p25_in', 'daily_p50_in', 'daily_p75_in', 'daily_p90_in',
+    'daily_max_in', 'mtd_mean_in', 'mtd_p50_in', 'ytd_mean_in', 'ytd_p50_in',
+)
+
+def quantile(ordered: List[float], q: float) -> float:
+    """Linearly interpolated quantile (0-1) of an already sorted, non-empty list"""
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def wetter(a: Tuple[Optional[float], Optional[str]], b: Tuple[Optional[float], Optional[str]]):
+    """The wetter of two (inches, hour_start) peaks; (None, None) means no data"""
+    if b[0] is None or (a[0] is not None and a[0] >= b[0]):
+        return a
+    return b
+
+def climatology_values(daily: List[float], mtd: List[float], ytd: List[float]) -> Tuple:
+    """Summary of one day of year across years, in CLIMATOLOGY_COLUMNS order"""
+    daily, mtd, ytd = sorted(daily), sorted(mtd), sorted(ytd)
+    return (
+        len(daily),
+        sum(daily) / len(daily),
+        quantile(daily, 0.25),
+        quantile(daily, 0.5),
+        quantile(daily, 0.75),
+        quantile(daily, 0.9),
+        daily[-1],
+        sum(mtd) / len(mtd) if mtd else None,
+        quantile(mtd, 0.5) if mtd else None,
+        sum(ytd) / len(ytd) if ytd else None,
+        quantile(ytd, 0.5) if ytd else None,
+    )
+
 class DatabaseHandler:
+    # Page cache size in KiB (negative values are KiB for PRAGMA cache_size)
+    CACHE_SIZE_KIB = 8192
+    # Default retention per tier in days; daily and monthly aggregates are kept forever
+    RAW_RETENTION_DAYS = 90
+    HOURLY_RETENTION_DAYS = 730
+    
     def __init__(self, db_path: str = "waterlogged.db"):
         """Initialize database connection and create tables if they don't exist"""
         self.db_path = db_path
         self.conn = None
+        # Serializes use of the single writer connection across threads
+        self._write_lock = threading.RLock()
+        # Each reader thread gets its own read-only connection
+        self._local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+        self._read_conns_lock = threading.Lock()
+        # Rain rate and drift state per node, advanced by each insert
+        self.rain = RainProcessor()
         self.create_tables()
     
     def get_connection(self) -> sqlite3.Connection:
-        """Get database connection, creating it if necessary"""
+        """Get the writer connection, creating it if necessary"""
         if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
             self.conn.row_factory = sqlite3.Row
+            self._configure_connection(self.conn)
         return self.conn
     
+    def get_read_connection(self) -> sqlite3.Connection:
+        """Get a read-only connection private to the calling thread"""
+        if self.db_path == ':memory:':
+            # An in-memory database is only visible through the writer connection
+            return self.get_connection()
+        
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_read_connection()
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        return conn
+    
+    def _open_read_connection(self) -> sqlite3.Connection:
+        """Open a new read-only connection to the database file"""
+        self.get_connection()  # Make sure the file exists and is in WAL mode
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA cache_size=-{self.CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+    
+    def _configure_connection(self, conn: sqlite3.Connection):
+        """Apply journaling and cache settings to a new connection"""
+        # Only takes effect on a new file (before WAL is set up); older files need a one-time VACUUM
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL lets API reads proceed while ingest is writing; NORMAL is durable in WAL mode
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+    
+    @property
+    def migrations(self) -> List[Callable[[sqlite3.Cursor], None]]:
+        """Schema migrations in order; migration N brings the schema to version N"""
+        return [
+            self._create_base_tables,
+            self._add_running_sum_columns,
+            self._create_indexes,
+            self._add_sequence_column,
+            self._create_monthly_aggregates,
+            self._create_rainfall_stats,
+            self._add_derived_columns,
+        ]
+    
+    def get_schema_version(self) -> int:
+        """Return the schema version recorded in the database file"""
+        return self.get_connection().execute("PRAGMA user_version").fetchone()[0]
+    
     def create_tables(self):
-        """Create necessary database tables if they don't exist"""
+        """Create tables and bring the schema up to the current version"""
+        version = self.get_schema_version()
+        migrations = self.migrations
+        if version >= len(migrations):
+            # The usual case on restart: a single PRAGMA read, no transaction
+            if version > len(migrations):
+                logger.warning(f"Database schema version {version} is newer than this code ({len(migrations)})")
+            return
+        
         conn = self.get_connection()
         cursor = conn.cursor()
-        
+        for target, migration in enumerate(migrations, start=1):
+            if target <= version:
+                continue
+            try:
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+                logger.info(f"Migrated database schema to version {target}")
+            except sqlite3.Error as e:
+                logger.error(f"Schema migration to version {target} failed: {e}")
+                conn.rollback()
+                raise
+    
+    def _create_base_tables(self, cursor: sqlite3.Cursor):
+        """Migration 1: raw measurement and aggregate tables"""
         # Raw measurements table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS raw_measurements (
@@ -65,7 +299,7 @@ class DatabaseHandler:
             )
         ''')
         
-        # Hourly aggregates table
+        # Hourly aggregates table (running sums so averages can be updated by deltas)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS hourly_aggregates (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -75,6 +309,8 @@ class DatabaseHandler:
                 avg_temperature_f REAL NOT NULL,
                 avg_humidity_pct REAL NOT NULL,
                 measurement_count INTEGER NOT NULL,
+                sum_temperature_f REAL NOT NULL DEFAULT 0,
+                sum_humidity_pct REAL NOT NULL DEFAULT 0,
                 UNIQUE(hour_start, node_id)
             )
         ''')
@@ -89,142 +325,1206 @@ class DatabaseHandler:
                 avg_temperature_f REAL NOT NULL,
                 avg_humidity_pct REAL NOT NULL,
                 measurement_count INTEGER NOT NULL,
+                sum_temperature_f REAL NOT NULL DEFAULT 0,
+                sum_humidity_pct REAL NOT NULL DEFAULT 0,
                 UNIQUE(date, node_id)
             )
         ''')
-        
-        conn.commit()
     
-    def insert_measurement(self, measurement: Dict[str, Union[float, int, str]]):
-        """Insert a new raw measurement into the database"""
+    def _add_running_sum_columns(self, cursor: sqlite3.Cursor):
+        """Migration 2: add running-sum columns to aggregate tables from older versions"""
+        for table in ('hourly_aggregates', 'daily_aggregates'):
+            cursor.execute(f"PRAGMA table_info({table})")
+            columns = {row['name'] for row in cursor.fetchall()}
+            if 'sum_temperature_f' in columns:
+                continue
+            
+            logger.info(f"Adding running-sum columns to {table}")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN sum_temperature_f REAL NOT NULL DEFAULT 0")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN sum_humidity_pct REAL NOT NULL DEFAULT 0")
+            # Existing averages were computed over measurement_count rows, so the sums can be recovered
+            cursor.execute(f'''
+                UPDATE {table} SET
+                    sum_temperature_f = avg_temperature_f * measurement_count,
+                    sum_humidity_pct = avg_humidity_pct * measurement_count
+            ''')
+    
+    def _create_indexes(self, cursor: sqlite3.Cursor):
+        """Migration 3: indexes for the per-node and time-range queries"""
+        # Latest reading per node and per-node raw history
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_raw_node_timestamp
+            ON raw_measurements (node_id, timestamp)
+        ''')
+        # Covers aggregate rebuilds over a time range without touching the table
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_raw_timestamp_covering
+            ON raw_measurements (timestamp, node_id, rainfall_in, temperature_f, humidity_pct)
+        ''')
+        # Range queries filter on a single node, so lead with node_id
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_hourly_node_hour
+            ON hourly_aggregates (node_id, hour_start)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_daily_node_date
+            ON daily_aggregates (node_id, date)
+        ''')
+    
+    def _add_sequence_column(self, cursor: sqlite3.Cursor):
+        """Migration 4: per-node sequence numbers from v2 payloads, unique for deduplication"""
+        cursor.execute("PRAGMA table_info(raw_measurements)")
+        if 'seq' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE raw_measurements ADD COLUMN seq INTEGER")
+        # Sequence counters restart when a node reboots, so the device timestamp is part of the key
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_raw_node_seq
+            ON raw_measurements (node_id, seq, timestamp)
+            WHERE seq IS NOT NULL
+        ''')
+    
+    def _create_monthly_aggregates(self, cursor: sqlite3.Cursor):
+        """Migration 5: monthly tier for long-range queries, backfilled from the daily tier"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS monthly_aggregates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                month TEXT NOT NULL,
+                node_id INTEGER NOT NULL,
+                total_rainfall_in REAL NOT NULL,
+                avg_temperature_f REAL NOT NULL,
+                avg_humidity_pct REAL NOT NULL,
+                measurement_count INTEGER NOT NULL,
+                sum_temperature_f REAL NOT NULL DEFAULT 0,
+                sum_humidity_pct REAL NOT NULL DEFAULT 0,
+                UNIQUE(month, node_id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_monthly_node_month
+            ON monthly_aggregates (node_id, month)
+        ''')
+        self._rollup_monthly(cursor, '0000-01', '9999-12')
+    
+    def _create_rainfall_stats(self, cursor: sqlite3.Cursor):
+        """Migration 6: per-node rainfall summary and day-of-year climatology, filled by close_days()"""
+        # One row per node, as of its last closed day; recompute_from marks days changed after closing
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rainfall_stats (
+                node_id INTEGER PRIMARY KEY,
+                as_of DATE NOT NULL,
+                recompute_from DATE,
+                day_in REAL NOT NULL,
+                month_to_date_in REAL NOT NULL,
+                year_to_date_in REAL NOT NULL,
+                rolling_7d_in REAL NOT NULL,
+                rolling_30d_in REAL NOT NULL,
+                max_hourly_mtd_in REAL,
+                max_hourly_mtd_at DATETIME,
+                max_hourly_ytd_in REAL,
+                max_hourly_ytd_at DATETIME,
+                updated_at DATETIME NOT NULL
+            )
+        ''')
+        # Day of year is MM-DD so a date lines up with the same calendar day in leap years
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rainfall_climatology (
+                node_id INTEGER NOT NULL,
+                day_of_year TEXT NOT NULL,
+                years INTEGER NOT NULL,
+                daily_mean_in REAL NOT NULL,
+                daily_p25_in REAL NOT NULL,
+                daily_p50_in REAL NOT NULL,
+                daily_p75_in REAL NOT NULL,
+                daily_p90_in REAL NOT NULL,
+                daily_max_in REAL NOT NULL,
+                mtd_mean_in REAL,
+                mtd_p50_in REAL,
+                ytd_mean_in REAL,
+                ytd_p50_in REAL,
+                PRIMARY KEY (node_id, day_of_year)
+            ) WITHOUT ROWID
+        ''')
+    
+    def _add_derived_columns(self, cursor: sqlite3.Cursor):
+        """Migration 7: rain rate, drift and event columns filled at ingest, and the state behind them"""
+        cursor.execute("PRAGMA table_info(raw_measurements)")
+        existing = {row['name'] for row in cursor.fetchall()}
+        for column, sql_type in zip(DERIVED_COLUMNS, ('REAL', 'REAL', 'REAL', 'TEXT')):
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE raw_measurements ADD COLUMN {column} {sql_type}")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rain_stream_state (
+                node_id INTEGER PRIMARY KEY,
+                last_timestamp DATETIME,
+                last_zero_factor INTEGER,
+                zero_reference REAL,
+                zero_smoothed REAL,
+                weight_offset_g REAL NOT NULL,
+                drifting INTEGER NOT NULL
+            )
+        ''')
+    
+    def _rollup_monthly(self, cursor: sqlite3.Cursor, first_month: str, last_month: str):
+        """Recompute monthly aggregates for a month range (YYYY-MM, inclusive) from daily_aggregates"""
+        cursor.execute('DELETE FROM monthly_aggregates WHERE month >= ? AND month <= ?',
+                       (first_month, last_month))
+        cursor.execute('''
+            INSERT INTO monthly_aggregates (
+                month, node_id, total_rainfall_in,
+                sum_temperature_f, sum_humidity_pct, measurement_count,
+                avg_temperature_f, avg_humidity_pct
+            )
+            SELECT
+                substr(date, 1, 7),
+                node_id,
+                SUM(total_rainfall_in),
+                SUM(sum_temperature_f),
+                SUM(sum_humidity_pct),
+                SUM(measurement_count),
+                SUM(sum_temperature_f) / SUM(measurement_count),
+                SUM(sum_humidity_pct) / SUM(measurement_count)
+            FROM daily_aggregates
+            WHERE substr(date, 1, 7) >= ? AND substr(date, 1, 7) <= ?
+            GROUP BY substr(date, 1, 7), node_id
+        ''', (first_month, last_month))
+    
+    def check_query_plans(self) -> Dict[str, List[str]]:
+        """
+        Report the query plan of each hot query and warn about full table scans.
+        
+        Returns:
+            Dict mapping query name to the lines of its EXPLAIN QUERY PLAN output
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
+        now = datetime.now().isoformat()
+        queries = {
+            'hourly_range': (HOURLY_RANGE_SQL, (now, now, 1)),
+            'daily_range': (DAILY_RANGE_SQL, (now, now, 1)),
+            'latest_measurement': (LATEST_MEASUREMENT_SQL, (1,)),
+            'raw_range': (RAW_RANGE_SQL, (now, now)),
+            'sequence_range': (SEQUENCE_RANGE_SQL, (1, 0, 0)),
+            'raw_export': (RAW_EXPORT_SQL, (1, now, now)),
+            'raw_resample': (RAW_RESAMPLE_SQL, (0, 300, 1, now, now)),
+            'rainfall_stats': (RAINFALL_STATS_SQL, (1,)),
+            'rain_stream_state': (RAIN_STREAM_STATE_SQL, (1,)),
+            'climatology_day': (CLIMATOLOGY_DAY_SQL, (1, now[5:10])),
+        }
+        for table, bucket_column, _ in RANGE_TIERS[1:]:
+            queries[f'{table}_resample'] = (
+                AGGREGATE_RESAMPLE_SQL.format(table=table, bucket_column=bucket_column), (0, 86400, 1, now, now))
         
-        try:
-            cursor.execute('''
-                INSERT INTO raw_measurements (
-                    timestamp, node_id, weight_g, rainfall_in, 
-                    temperature_f, humidity_pct, zero_factor
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                measurement['timestamp'],
-                measurement['node_id'],
-                measurement['weight_g'],
-                measurement['rainfall_in'],
-                measurement['temperature_f'],
-                measurement['humidity_pct'],
-                measurement['zero_factor']
-            ))
-            conn.commit()
+        plans = {}
+        for name, (sql, params) in queries.items():
+            details = [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            plans[name] = details
+            for detail in details:
+                if detail.startswith('SCAN ') and 'INDEX' not in detail:
+                    logger.warning(f"Query plan regression in {name}: {detail}")
+            logger.info(f"Query plan for {name}: {'; '.join(details)}")
+        return plans
+    
+    def insert_measurement(self, measurement: Dict[str, Union[float, int, str]]) -> bool:
+        """Insert a new raw measurement and update its aggregates in one transaction"""
+        return bool(self.insert_measurements([measurement]))
+    
+    def insert_measurements(self, measurements: List[Dict[str, Union[float, int, str]]]
+                            ) -> Optional[List[Dict[str, Union[float, int, str]]]]:
+        """
+        Insert a batch of raw measurements in a single transaction.
+        
+        Raw rows are written with one executemany and every hourly/daily bucket touched
+        by the batch is updated once, so replaying a backlog costs one commit per batch
+        instead of one per reading. Measurements carrying a sequence number that is
+        already stored (a retry or replay) are skipped and do not touch the aggregates.
+        
+        Stored measurements gain the derived fields (rain_rate_in_hr, weight_corrected_g,
+        zero_drift, event) written alongside them; see rain_processor.
+        
+        Args:
+            measurements: Decoded measurements as returned by PayloadDecoder.decode
+        
+        Returns:
+            The measurements actually stored, in order and with their derived fields,
+            or None if the batch was rolled back. Skipped duplicates are left out, so
+            callers publish or cache only what is new.
+        """
+        if not measurements:
+            return []
+        
+        with self._write_lock:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            started = time.perf_counter()
             
-            # After inserting raw data, update aggregates
-            self.update_aggregates(measurement['timestamp'])
+            try:
+                fresh = self._skip_duplicates(cursor, measurements)
+                self._load_rain_state(cursor, fresh)
+                derived, states = self.rain.derive(fresh)
+                cursor.executemany('''
+                    INSERT INTO raw_measurements (
+                        timestamp, node_id, weight_g, rainfall_in, 
+                        temperature_f, humidity_pct, zero_factor, seq,
+                        rain_rate_in_hr, weight_corrected_g, zero_drift, event
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [(
+                    m['timestamp'],
+                    m['node_id'],
+                    m['weight_g'],
+                    m['rainfall_in'],
+                    m['temperature_f'],
+                    m['humidity_pct'],
+                    m['zero_factor'],
+                    m.get('seq')
+                ) + values for m, values in zip(fresh, derived)])
+                self._store_rain_state(cursor, states)
+                
+                # Fold the new readings into their hourly and daily buckets
+                with AGGREGATE_SECONDS.time():
+                    self.update_aggregates(cursor, fresh)
+                conn.commit()
+                self.rain.commit(states)
+                INSERT_SECONDS.observe(time.perf_counter() - started)
+                
+                latest_rates = {}
+                for m, values in zip(fresh, derived):
+                    m.update(zip(DERIVED_COLUMNS, values))
+                    if values[0] is not None:
+                        latest_rates[m['node_id']] = values[0]
+                    if values[3]:
+                        RAIN_EVENTS.inc(labels=(m['node_id'], values[3]))
+                for node_id, rate in latest_rates.items():
+                    RAIN_RATE.set(rate, (node_id,))
+                per_node: Dict[int, int] = {}
+                for m in fresh:
+                    per_node[m['node_id']] = per_node.get(m['node_id'], 0) + 1
+                for node_id, count in per_node.items():
+                    STORED.inc(count, (node_id,))
+                DUPLICATES.inc(len(measurements) - len(fresh))
+                return fresh
             
-        except sqlite3.Error as e:
-            logger.error(f"Error inserting measurement: {e}")
-            conn.rollback()
+            except sqlite3.Error as e:
+                logger.error(f"Error inserting {len(measurements)} measurement(s): {e}")
+                conn.rollback()
+                INSERT_FAILURES.inc()
+                return None
     
-    def update_aggregates(self, timestamp: str):
-        """Update hourly and daily aggregates for the given timestamp"""
-        dt = datetime.fromisoformat(timestamp)
-        hour_start = dt.replace(minute=0, second=0, microsecond=0)
-        day_start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    def _skip_duplicates(self, cursor: sqlite3.Cursor,
+                         measurements: List[Dict[str, Union[float, int, str]]]) -> List[Dict]:
+        """Drop measurements whose (node_id, seq, timestamp) is already stored or repeated in the batch"""
+        ranges: Dict[int, List[int]] = {}
+        for m in measurements:
+            seq = m.get('seq')
+            if seq is not None:
+                bounds = ranges.setdefault(m['node_id'], [seq, seq])
+                bounds[0] = min(bounds[0], seq)
+                bounds[1] = max(bounds[1], seq)
+        if not ranges:
+            return measurements
+        
+        seen = set()
+        for node_id, (low, high) in ranges.items():
+            cursor.execute(SEQUENCE_RANGE_SQL, (node_id, low, high))
+            seen.update((node_id, seq, timestamp) for seq, timestamp in cursor.fetchall())
+        
+        fresh = []
+        for m in measurements:
+            seq = m.get('seq')
+            if seq is not None:
+                key = (m['node_id'], seq, m['timestamp'])
+                if key in seen:
+                    continue
+                seen.add(key)
+            fresh.append(m)
         
-        self._update_hourly_aggregate(hour_start)
-        self._update_daily_aggregate(day_start)
+        if len(fresh) < len(measurements):
+            logger.info(f"Skipped {len(measurements) - len(fresh)} duplicate measurement(s)")
+        return fresh
     
-    def _update_hourly_aggregate(self, hour_start: datetime):
-        """Update or create hourly aggregate for the given hour"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+    def _load_rain_state(self, cursor: sqlite3.Cursor, measurements: List[Dict[str, Union[float, int, str]]]):
+        """Seed the rain processor with the stored state of nodes it has not seen since startup"""
+        for node_id in {m['node_id'] for m in measurements}:
+            if self.rain.known(node_id):
+                continue
+            row = cursor.execute(RAIN_STREAM_STATE_SQL, (node_id,)).fetchone()
+            if row is not None:
+                state = NodeState(*(row[column] for column in STATE_COLUMNS))
+            else:
+                # First batch since the derived columns were added: carry on from the latest reading
+                latest = cursor.execute(LATEST_MEASUREMENT_SQL, (node_id,)).fetchone()
+                state = NodeState()
+                if latest is not None:
+                    zero_factor = latest['zero_factor']
+                    state = NodeState(latest['timestamp'], zero_factor, zero_factor, zero_factor)
+            self.rain.load(node_id, state)
+    
+    @staticmethod
+    def _store_rain_state(cursor: sqlite3.Cursor, states: Dict[int, NodeState]):
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO rain_stream_state (node_id, {', '.join(STATE_COLUMNS)})
+            VALUES (?, {', '.join('?' * len(STATE_COLUMNS))})
+        ''', [(node_id,) + state.row() for node_id, state in states.items()])
+    
+    def rederive(self, chunk_size: int = 5000) -> int:
+        """
+        Recompute the derived columns of every stored reading, node by node in time order.
         
-        hour_end = hour_start + timedelta(hours=1)
+        Fills rows stored before the columns existed and corrects readings that arrived
+        out of order. Each chunk is its own transaction under the write lock. Run it
+        while nothing else is ingesting into the file: another process's in-memory
+        state would not see the result.
         
-        try:
-            # Calculate hourly aggregates
-            cursor.execute('''
-                INSERT OR REPLACE INTO hourly_aggregates (
-                    hour_start, node_id, total_rainfall_in, 
-                    avg_temperature_f, avg_humidity_pct, measurement_count
-                )
-                SELECT 
-                    ?, 
-                    node_id,
-                    SUM(rainfall_in),
-                    AVG(temperature_f),
-                    AVG(humidity_pct),
-                    COUNT(*)
-                FROM raw_measurements
-                WHERE timestamp >= ? AND timestamp < ?
-                GROUP BY node_id
-            ''', (hour_start.isoformat(), hour_start.isoformat(), hour_end.isoformat()))
+        Returns:
+            Number of readings updated
+        """
+        with self._write_lock:
+            node_ids = [row[0] for row in self.get_connection().execute(
+                'SELECT DISTINCT node_id FROM raw_measurements')]
+        
+        processor = RainProcessor()
+        updated = 0
+        for node_id in node_ids:
+            position = ('', 0)
+            while True:
+                with self._write_lock:
+                    conn = self.get_connection()
+                    try:
+                        rows = conn.execute('''
+                            SELECT id, timestamp, node_id, weight_g, rainfall_in, zero_factor
+                            FROM raw_measurements
+                            WHERE node_id = ? AND (timestamp, id) > (?, ?)
+                            ORDER BY timestamp, id
+                            LIMIT ?
+                        ''', (node_id,) + position + (chunk_size,)).fetchall()
+                        if not rows:
+                            break
+                        derived, states = processor.derive(dict(row) for row in rows)
+                        processor.commit(states)
+                        conn.executemany(f'''
+                            UPDATE raw_measurements SET {', '.join(f"{column} = ?" for column in DERIVED_COLUMNS)}
+                            WHERE id = ?
+                        ''', [values + (row['id'],) for row, values in zip(rows, derived)])
+                        self._store_rain_state(conn.cursor(), states)
+                        conn.commit()
+                    except sqlite3.Error as e:
+                        logger.error(f"Error deriving rain values for node {node_id}: {e}")
+                        conn.rollback()
+                        raise
+                updated += len(rows)
+                position = (rows[-1]['timestamp'], rows[-1]['id'])
+        
+        # Later inserts continue from the recomputed state
+        self.rain.reset()
+        logger.info(f"Derived rain values for {updated} reading(s) from {len(node_ids)} node(s)")
+        return updated
+    
+    def update_aggregates(self, cursor: sqlite3.Cursor, measurements: List[Dict[str, Union[float, int, str]]]):
+        """
+        Apply measurements as deltas to their hourly, daily and monthly aggregates.
+        
+        Readings are summed per bucket first, so each bucket is written once. Runs on the
+        caller's cursor so it shares the insert transaction, and the cost does not depend
+        on how many readings are already in the bucket.
+        """
+        hourly: Dict[tuple, List[float]] = {}
+        daily: Dict[tuple, List[float]] = {}
+        monthly: Dict[tuple, List[float]] = {}
+        
+        for m in measurements:
+            dt = datetime.fromisoformat(m['timestamp'])
+            hour_key = (dt.replace(minute=0, second=0, microsecond=0).isoformat(), m['node_id'])
+            day_key = (dt.date().isoformat(), m['node_id'])
+            month_key = (day_key[0][:7], m['node_id'])
+            for buckets, key in ((hourly, hour_key), (daily, day_key), (monthly, month_key)):
+                totals = buckets.setdefault(key, [0.0, 0.0, 0.0, 0])
+                totals[0] += m['rainfall_in']
+                totals[1] += m['temperature_f']
+                totals[2] += m['humidity_pct']
+                totals[3] += 1
+        
+        cursor.executemany(self._aggregate_upsert_sql('hourly_aggregates', 'hour_start'),
+                           [key + tuple(totals) for key, totals in hourly.items()])
+        cursor.executemany(self._aggregate_upsert_sql('daily_aggregates', 'date'),
+                           [key + tuple(totals) for key, totals in daily.items()])
+        cursor.executemany(self._aggregate_upsert_sql('monthly_aggregates', 'month'),
+                           [key + tuple(totals) for key, totals in monthly.items()])
+        # Late readings for an already closed day; close_days() recomputes from there
+        self._mark_stats_stale(cursor, list(daily))
+    
+    def _mark_stats_stale(self, cursor: sqlite3.Cursor, days: List[Tuple[str, int]]):
+        """Flag rainfall stats of nodes whose closed days (date, node_id) changed"""
+        cursor.executemany('''
+            UPDATE rainfall_stats SET recompute_from = MIN(COALESCE(recompute_from, ?1), ?1)
+            WHERE node_id = ?2 AND as_of >= ?1
+        ''', days)
+    
+    @staticmethod
+    def _aggregate_upsert_sql(table: str, bucket_column: str) -> str:
+        """Build the upsert that adds sums and counts into an aggregate bucket"""
+        return f'''
+            INSERT INTO {table} (
+                {bucket_column}, node_id, total_rainfall_in,
+                sum_temperature_f, sum_humidity_pct, measurement_count,
+                avg_temperature_f, avg_humidity_pct
+            )
+            VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?4 * 1.0 / ?6, ?5 * 1.0 / ?6)
+            ON CONFLICT({bucket_column}, node_id) DO UPDATE SET
+                total_rainfall_in = total_rainfall_in + excluded.total_rainfall_in,
+                sum_temperature_f = sum_temperature_f + excluded.sum_temperature_f,
+                sum_humidity_pct = sum_humidity_pct + excluded.sum_humidity_pct,
+                measurement_count = measurement_count + excluded.measurement_count,
+                avg_temperature_f = (sum_temperature_f + excluded.sum_temperature_f)
+                    / (measurement_count + excluded.measurement_count),
+                avg_humidity_pct = (sum_humidity_pct + excluded.sum_humidity_pct)
+                    / (measurement_count + excluded.measurement_count)
+        '''
+    
+    def rebuild_aggregates(self, start_time: Optional[datetime] = None,
+                           end_time: Optional[datetime] = None) -> int:
+        """
+        Recompute hourly and daily aggregates from raw_measurements.
+        
+        Intended for repairs after manual edits or an interrupted import. Whole days are
+        rebuilt, so the range is widened to day boundaries. Days whose raw rows were
+        already removed by retention are left alone, and the monthly tier is re-derived
+        from the daily rows of every month the range touches.
+        
+        Args:
+            start_time: First day to rebuild (default: earliest raw measurement, also the lower bound)
+            end_time: Last day to rebuild, inclusive (default: latest raw measurement)
+        
+        Returns:
+            int: Number of raw measurements the rebuilt aggregates cover
+        """
+        with self._write_lock:
+            conn = self.get_connection()
+            cursor = conn.cursor()
             
-            conn.commit()
-        except sqlite3.Error as e:
-            logger.error(f"Error updating hourly aggregate: {e}")
-            conn.rollback()
+            cursor.execute('SELECT MIN(timestamp), MAX(timestamp) FROM raw_measurements')
+            earliest, latest = cursor.fetchone()
+            if earliest is None:
+                logger.info("No raw measurements to rebuild aggregates from")
+                return 0
+            
+            # Aggregates before the first retained raw day are all that is left of those days
+            first_day = datetime.fromisoformat(earliest[:10])
+            day_start = (start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+                         if start_time else first_day)
+            day_start = max(day_start, first_day)
+            day_end = (end_time.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+                       if end_time else datetime.fromisoformat(latest[:10]) + timedelta(days=1))
+            if day_end <= day_start:
+                return 0
+            
+            try:
+                cursor.execute('DELETE FROM hourly_aggregates WHERE hour_start >= ? AND hour_start < ?',
+                               (day_start.isoformat(), day_end.isoformat()))
+                cursor.execute('DELETE FROM daily_aggregates WHERE date >= ? AND date < ?',
+                               (day_start.date().isoformat(), day_end.date().isoformat()))
+                
+                cursor.execute('''
+                    INSERT INTO hourly_aggregates (
+                        hour_start, node_id, total_rainfall_in,
+                        sum_temperature_f, sum_humidity_pct, measurement_count,
+                        avg_temperature_f, avg_humidity_pct
+                    )
+                    SELECT
+                        substr(timestamp, 1, 13) || ':00:00',
+                        node_id,
+                        SUM(rainfall_in),
+                        SUM(temperature_f),
+                        SUM(humidity_pct),
+                        COUNT(*),
+                        AVG(temperature_f),
+                        AVG(humidity_pct)
+                    FROM raw_measurements
+                    WHERE timestamp >= ? AND timestamp < ?
+                    GROUP BY substr(timestamp, 1, 13), node_id
+                ''', (day_start.isoformat(), day_end.isoformat()))
+                
+                cursor.execute('''
+                    INSERT INTO daily_aggregates (
+                        date, node_id, total_rainfall_in,
+                        sum_temperature_f, sum_humidity_pct, measurement_count,
+                        avg_temperature_f, avg_humidity_pct
+                    )
+                    SELECT
+                        substr(timestamp, 1, 10),
+                        node_id,
+                        SUM(rainfall_in),
+                        SUM(temperature_f),
+                        SUM(humidity_pct),
+                        COUNT(*),
+                        AVG(temperature_f),
+                        AVG(humidity_pct)
+                    FROM raw_measurements
+                    WHERE timestamp >= ? AND timestamp < ?
+                    GROUP BY substr(timestamp, 1, 10), node_id
+                ''', (day_start.isoformat(), day_end.isoformat()))
+                
+                cursor.execute('SELECT COALESCE(SUM(measurement_count), 0) FROM daily_aggregates WHERE date >= ? AND date < ?',
+                               (day_start.date().isoformat(), day_end.date().isoformat()))
+                rebuilt = cursor.fetchone()[0]
+                
+                last_day = day_end - timedelta(days=1)
+                self._rollup_monthly(cursor, day_start.strftime('%Y-%m'), last_day.strftime('%Y-%m'))
+                cursor.execute('SELECT node_id FROM rainfall_stats')
+                self._mark_stats_stale(cursor, [(day_start.date().isoformat(), row[0]) for row in cursor.fetchall()])
+                conn.commit()
+                logger.info(f"Rebuilt aggregates from {rebuilt} raw measurements")
+                return rebuilt
+            except sqlite3.Error as e:
+                logger.error(f"Error rebuilding aggregates: {e}")
+                conn.rollback()
+                raise
+    
+    def run_maintenance(self, raw_retention_days: Optional[int] = None,
+                        hourly_retention_days: Optional[int] = None,
+                        chunk_size: int = 5000, vacuum_pages: int = 1000) -> Dict[str, Any]:
+        """
+        Apply tiered retention and hand the freed space back to the filesystem.
+        
+        Raw rows older than the raw retention window and hourly rows older than the
+        hourly window are deleted; daily and monthly aggregates are kept. Before raw
+        days are deleted their daily counts are checked against the raw rows, and any
+        day that does not match is rebuilt first, so nothing is lost in the roll-up.
+        
+        Deletes and vacuum steps run in bounded chunks, each its own short transaction,
+        and the write lock is released between chunks so ingest keeps flowing.
+        
+        Args:
+            raw_retention_days: Days of raw measurements to keep (default: RAW_RETENTION_DAYS)
+            hourly_retention_days: Days of hourly aggregates to keep (default: HOURLY_RETENTION_DAYS)
+            chunk_size: Maximum rows deleted per transaction
+            vacuum_pages: Maximum pages released per incremental vacuum step
+        
+        Returns:
+            Dict with rows deleted per tier, days rebuilt, bytes reclaimed and duration
+        """
+        raw_days = raw_retention_days if raw_retention_days is not None else self.RAW_RETENTION_DAYS
+        hourly_days = hourly_retention_days if hourly_retention_days is not None else self.HOURLY_RETENTION_DAYS
+        # Hourly rows must outlive raw rows, or a rebuild could no longer recreate them
+        hourly_days = max(hourly_days, raw_days)
+        
+        started = time.monotonic()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        raw_cutoff = (today - timedelta(days=raw_days)).isoformat()
+        hourly_cutoff = (today - timedelta(days=hourly_days)).isoformat()
+        size_before = self._database_size()
+        
+        rebuilt = self._reconcile_daily(raw_cutoff)
+        raw_deleted = self._delete_in_chunks(
+            'DELETE FROM raw_measurements WHERE id IN '
+            '(SELECT id FROM raw_measurements WHERE timestamp < ? LIMIT ?)',
+            raw_cutoff, chunk_size)
+        hourly_deleted = self._delete_in_chunks(
+            'DELETE FROM hourly_aggregates WHERE id IN '
+            '(SELECT id FROM hourly_aggregates WHERE hour_start < ? LIMIT ?)',
+            hourly_cutoff, chunk_size)
+        self._incremental_vacuum(vacuum_pages)
+        
+        report = {
+            'raw_rows_deleted': raw_deleted,
+            'hourly_rows_deleted': hourly_deleted,
+            'days_rebuilt': rebuilt,
+            'bytes_reclaimed': max(0, size_before - self._database_size()),
+            'free_bytes': self._free_bytes(),
+            'duration_s': round(time.monotonic() - started, 3),
+        }
+        logger.info(f"Maintenance removed {raw_deleted} raw and {hourly_deleted} hourly row(s), "
+                    f"reclaimed {report['bytes_reclaimed']} bytes in {report['duration_s']}s")
+        return report
+    
+    def _reconcile_daily(self, cutoff: str) -> int:
+        """Rebuild any day before cutoff whose daily counts disagree with its raw rows"""
+        conn = self.get_read_connection()
+        raw_counts = conn.execute('''
+            SELECT substr(timestamp, 1, 10) AS day, node_id, COUNT(*) AS count
+            FROM raw_measurements
+            WHERE timestamp < ?
+            GROUP BY day, node_id
+        ''', (cutoff,)).fetchall()
+        if not raw_counts:
+            return 0
+        
+        daily_counts = {
+            (row['date'], row['node_id']): row['measurement_count']
+            for row in conn.execute('SELECT date, node_id, measurement_count FROM daily_aggregates WHERE date < ?',
+                                    (cutoff[:10],))
+        }
+        stale = sorted({row['day'] for row in raw_counts
+                        if daily_counts.get((row['day'], row['node_id'])) != row['count']})
+        for day in stale:
+            logger.warning(f"Daily aggregates for {day} do not match raw data, rebuilding before pruning")
+            day_start = datetime.fromisoformat(day)
+            self.rebuild_aggregates(day_start, day_start)
+        return len(stale)
     
-    def _update_daily_aggregate(self, day_start: datetime):
-        """Update or create daily aggregate for the given day"""
+    def _delete_in_chunks(self, sql: str, cutoff: str, chunk_size: int) -> int:
+        """Run a bounded DELETE repeatedly, committing and releasing the write lock in between"""
+        deleted = 0
+        while True:
+            with self._write_lock:
+                conn = self.get_connection()
+                try:
+                    count = conn.execute(sql, (cutoff, chunk_size)).rowcount
+                    conn.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Error pruning old rows: {e}")
+                    conn.rollback()
+                    raise
+            deleted += count
+            if count < chunk_size:
+                return deleted
+            # Give a waiting writer a chance at the lock before the next chunk
+            time.sleep(0)
+    
+    def _incremental_vacuum(self, pages: int):
+        """Release free pages back to the filesystem a few at a time"""
         conn = self.get_connection()
-        cursor = conn.cursor()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            if self._free_bytes():
+                logger.info("Freed pages will be reused but the file will not shrink; "
+                            "run 'database_handler.py vacuum' once to enable incremental vacuum")
+            return
         
-        day_end = day_start + timedelta(days=1)
+        while True:
+            with self._write_lock:
+                free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free_before:
+                    break
+                conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+                if conn.execute("PRAGMA freelist_count").fetchone()[0] >= free_before:
+                    break
+            time.sleep(0)
         
-        try:
-            # Calculate daily aggregates
+        # Deletes grow the WAL; truncate it so the space is returned as well
+        with self._write_lock:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    
+    def vacuum(self) -> int:
+        """Switch to incremental auto-vacuum and rebuild the file; blocks writes until done"""
+        with self._write_lock:
+            conn = self.get_connection()
+            size_before = self._database_size()
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            reclaimed = size_before - self._database_size()
+        logger.info(f"Vacuum reclaimed {reclaimed} bytes")
+        return reclaimed
+    
+    def _database_size(self) -> int:
+        conn = self.get_connection()
+        return (conn.execute("PRAGMA page_count").fetchone()[0]
+                * conn.execute("PRAGMA page_size").fetchone()[0])
+    
+    def _free_bytes(self) -> int:
+        conn = self.get_connection()
+        return (conn.execute("PRAGMA freelist_count").fetchone()[0]
+                * conn.execute("PRAGMA page_size").fetchone()[0])
+    
+    def close_days(self, through: Optional[date] = None, chunk_days: int = 31) -> int:
+        """
+        Fold closed days into the rainfall summary and climatology tables.
+        
+        Each node advances one day at a time from the day after its last closed day (or
+        from a day marked by a late reading) up to `through`, but never past its own
+        latest data. Consecutive days update the month/year totals and hourly maxima
+        by deltas; only the first day of a run is recomputed from the aggregate tables.
+        Each day also refreshes the climatology row for its day of year. A node without
+        stats gets its whole climatology built in one pass over its daily rows.
+        
+        Days are processed in chunks, each its own transaction under the write lock, so
+        a long catch-up does not hold up ingest.
+        
+        Args:
+            through: Last day to close (default: yesterday)
+            chunk_days: Days folded per transaction
+        
+        Returns:
+            Number of node-days folded
+        """
+        through = through or datetime.now().date() - timedelta(days=1)
+        with self._write_lock:
+            nodes = self.get_connection().execute('''
+                SELECT node_id, MIN(date), MAX(date) FROM daily_aggregates GROUP BY node_id
+            ''').fetchall()
+        
+        folded = 0
+        for node_id, first, last in nodes:
+            first_date = date.fromisoformat(first)
+            end = min(through, date.fromisoformat(last))
+            while True:
+                with self._write_lock:
+                    conn = self.get_connection()
+                    try:
+                        count = self._close_node_days(conn.cursor(), node_id, first_date, end, chunk_days)
+                        conn.commit()
+                    except sqlite3.Error as e:
+                        logger.error(f"Error closing days for node {node_id}: {e}")
+                        conn.rollback()
+                        raise
+                if not count:
+                    break
+                folded += count
+        
+        if folded:
+            logger.info(f"Closed {folded} node-day(s) into rainfall stats through {through.isoformat()}")
+        return folded
+    
+    def _close_node_days(self, cursor: sqlite3.Cursor, node_id: int, first_date: date, end: date,
+                         limit: int) -> int:
+        """Fold up to limit days of one node; returns how many were folded"""
+        cursor.execute(RAINFALL_STATS_SQL, (node_id,))
+        state = cursor.fetchone()
+        state = dict(state) if state else None
+        if state is None:
+            # New node: a summary as of the last day is enough, climatology needs all history
+            if end < first_date:
+                return 0
+            self._rebuild_climatology(cursor, node_id, first_date, end)
+            day, base = end, None
+        elif state['recompute_from']:
+            day, base = date.fromisoformat(state['recompute_from']), None
+        else:
+            day, base = date.fromisoformat(state['as_of']) + timedelta(days=1), state
+        
+        count = 0
+        while day <= end and count < limit:
+            base = self._fold_day(cursor, node_id, day, base)
+            if state is not None:
+                self._refresh_climatology(cursor, node_id, first_date, day)
+            day += timedelta(days=1)
+            count += 1
+        if not count:
+            return 0
+        
+        cursor.execute(f'''
+            INSERT OR REPLACE INTO rainfall_stats ({', '.join(base)})
+            VALUES ({', '.join('?' * len(base))})
+        ''', tuple(base.values()))
+        return count
+    
+    def _fold_day(self, cursor: sqlite3.Cursor, node_id: int, day: date, base: Optional[Dict]) -> Dict:
+        """Stats of a node as of day, built on the previous day's stats when given"""
+        day_start = datetime.combine(day, datetime.min.time())
+        next_day = (day_start + timedelta(days=1)).isoformat()
+        
+        cursor.execute('''
+            SELECT
+                COALESCE(SUM(CASE WHEN date = ?2 THEN total_rainfall_in END), 0),
+                COALESCE(SUM(CASE WHEN date > ?3 THEN total_rainfall_in END), 0),
+                COALESCE(SUM(total_rainfall_in), 0)
+            FROM daily_aggregates
+            WHERE node_id = ?1 AND date > ?4 AND date <= ?2
+        ''', (node_id, day.isoformat(), (day - timedelta(days=7)).isoformat(),
+              (day - timedelta(days=30)).isoformat()))
+        day_total, rolling_7d, rolling_30d = cursor.fetchone()
+        
+        if base is not None and base['as_of'] == (day - timedelta(days=1)).isoformat():
+            same_month = base['as_of'][:7] == day.isoformat()[:7]
+            same_year = base['as_of'][:4] == day.isoformat()[:4]
+            mtd = (base['month_to_date_in'] if same_month else 0.0) + day_total
+            ytd = (base['year_to_date_in'] if same_year else 0.0) + day_total
+            day_peak = self._wettest_hour(cursor, node_id, day_start.isoformat(), next_day)
+            mtd_peak = wetter(day_peak, (base['max_hourly_mtd_in'], base['max_hourly_mtd_at'])
+                              if same_month else (None, None))
+            ytd_peak = wetter(day_peak, (base['max_hourly_ytd_in'], base['max_hourly_ytd_at'])
+                              if same_year else (None, None))
+        else:
+            month_start = day.replace(day=1)
             cursor.execute('''
-                INSERT OR REPLACE INTO daily_aggregates (
-                    date, node_id, total_rainfall_in, 
-                    avg_temperature_f, avg_humidity_pct, measurement_count
-                )
-                SELECT 
-                    ?,
-                    node_id,
-                    SUM(rainfall_in),
-                    AVG(temperature_f),
-                    AVG(humidity_pct),
-                    COUNT(*)
-                FROM raw_measurements
-                WHERE timestamp >= ? AND timestamp < ?
-                GROUP BY node_id
-            ''', (day_start.date().isoformat(), day_start.isoformat(), day_end.isoformat()))
-            
+                SELECT COALESCE(SUM(total_rainfall_in), 0) FROM daily_aggregates
+                WHERE node_id = ? AND date >= ? AND date <= ?
+            ''', (node_id, month_start.isoformat(), day.isoformat()))
+            mtd = cursor.fetchone()[0]
+            cursor.execute('''
+                SELECT COALESCE(SUM(total_rainfall_in), 0) FROM monthly_aggregates
+                WHERE node_id = ? AND month >= ? AND month < ?
+            ''', (node_id, day.isoformat()[:4] + '-01', day.isoformat()[:7]))
+            ytd = cursor.fetchone()[0] + mtd
+            mtd_peak = self._wettest_hour(cursor, node_id, month_start.isoformat(), next_day)
+            ytd_peak = self._wettest_hour(cursor, node_id, day.replace(month=1, day=1).isoformat(), next_day)
+        
+        return {
+            'node_id': node_id,
+            'as_of': day.isoformat(),
+            'recompute_from': None,
+            'day_in': day_total,
+            'month_to_date_in': mtd,
+            'year_to_date_in': ytd,
+            'rolling_7d_in': rolling_7d,
+            'rolling_30d_in': rolling_30d,
+            'max_hourly_mtd_in': mtd_peak[0],
+            'max_hourly_mtd_at': mtd_peak[1],
+            'max_hourly_ytd_in': ytd_peak[0],
+            'max_hourly_ytd_at': ytd_peak[1],
+            'updated_at': datetime.now().isoformat(),
+        }
+    
+    @staticmethod
+    def _wettest_hour(cursor: sqlite3.Cursor, node_id: int, start: str, end: str) -> Tuple[Optional[float], Optional[str]]:
+        """Wettest hour of a node in [start, end) as (inches, hour_start)"""
+        cursor.execute('''
+            SELECT total_rainfall_in, hour_start FROM hourly_aggregates
+            WHERE node_id = ? AND hour_start >= ? AND hour_start < ?
+            ORDER BY total_rainfall_in DESC LIMIT 1
+        ''', (node_id, start, end))
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else (None, None)
+    
+    def _refresh_climatology(self, cursor: sqlite3.Cursor, node_id: int, first_date: date, day: date):
+        """Recompute the climatology row for day's day of year from every year on record"""
+        day_of_year = day.isoformat()[5:]
+        cursor.execute(CLIMATOLOGY_YEARS_SQL, (node_id, day_of_year, day.isoformat()))
+        daily, mtd, ytd = [], [], []
+        for year, day_total, month_total, year_total in cursor.fetchall():
+            if day_total is None:
+                continue
+            daily.append(day_total)
+            # Month and year totals only count from years the node covered from the start
+            if first_date.isoformat() <= f"{year}-{day_of_year[:2]}-01":
+                mtd.append(month_total)
+            if first_date.isoformat() <= f"{year}-01-01":
+                ytd.append(year_total)
+        if daily:
+            self._store_climatology(cursor, node_id, [(day_of_year, climatology_values(daily, mtd, ytd))])
+    
+    def _rebuild_climatology(self, cursor: sqlite3.Cursor, node_id: int, first_date: date, through: date):
+        """Build every climatology row of a node in one ordered pass over its daily rows"""
+        cursor.execute('''
+            SELECT date, total_rainfall_in FROM daily_aggregates
+            WHERE node_id = ? AND date <= ?
+            ORDER BY date
+        ''', (node_id, through.isoformat()))
+        samples: Dict[str, Tuple[List[float], List[float], List[float]]] = {}
+        year = month = None
+        ytd = mtd = 0.0
+        for day, total in cursor.fetchall():
+            if day[:4] != year:
+                year, ytd = day[:4], 0.0
+            if day[:7] != month:
+                month, mtd = day[:7], 0.0
+            ytd += total
+            mtd += total
+            daily, month_totals, year_totals = samples.setdefault(day[5:], ([], [], []))
+            daily.append(total)
+            if first_date.isoformat() <= f"{month}-01":
+                month_totals.append(mtd)
+            if first_date.isoformat() <= f"{year}-01-01":
+                year_totals.append(ytd)
+        
+        cursor.execute('DELETE FROM rainfall_climatology WHERE node_id = ?', (node_id,))
+        self._store_climatology(cursor, node_id, [(day_of_year, climatology_values(*values))
+                                                  for day_of_year, values in samples.items()])
+    
+    @staticmethod
+    def _store_climatology(cursor: sqlite3.Cursor, node_id: int, rows: List[Tuple[str, Tuple]]):
+        cursor.executemany(f'''
+            INSERT OR REPLACE INTO rainfall_climatology (node_id, day_of_year, {', '.join(CLIMATOLOGY_COLUMNS)})
+            VALUES (?, ?, {', '.join('?' * len(CLIMATOLOGY_COLUMNS))})
+        ''', [(node_id, day_of_year) + values for day_of_year, values in rows])
+    
+    def reset_rainfall_stats(self):
+        """Drop all rainfall stats and climatology so the next close_days() rebuilds them"""
+        with self._write_lock:
+            conn = self.get_connection()
+            conn.execute('DELETE FROM rainfall_stats')
+            conn.execute('DELETE FROM rainfall_climatology')
             conn.commit()
-        except sqlite3.Error as e:
-            logger.error(f"Error updating daily aggregate: {e}")
-            conn.rollback()
+    
+    def get_rainfall_stats(self, node_id: int = 1) -> Optional[Dict]:
+        """
+        A node's rainfall summary as of its last closed day, with the climatology of that
+        day of year and the month- and year-to-date totals as a percentage of normal.
+        """
+        conn = self.get_read_connection()
+        row = conn.execute(RAINFALL_STATS_SQL, (node_id,)).fetchone()
+        if row is None:
+            return None
+        stats = dict(row)
+        normal = conn.execute(CLIMATOLOGY_DAY_SQL, (node_id, stats['as_of'][5:])).fetchone()
+        stats['normal'] = dict(normal) if normal else None
+        stats['percent_of_normal'] = {
+            'month_to_date': (100 * stats['month_to_date_in'] / normal['mtd_mean_in']
+                              if normal and normal['mtd_mean_in'] else None),
+            'year_to_date': (100 * stats['year_to_date_in'] / normal['ytd_mean_in']
+                             if normal and normal['ytd_mean_in'] else None),
+        }
+        return stats
+    
+    def get_climatology(self, node_id: int = 1, day_of_year: Optional[str] = None) -> List[Dict]:
+        """Climatology rows of a node: one day of year (MM-DD), or all of them in calendar order"""
+        conn = self.get_read_connection()
+        if day_of_year:
+            rows = conn.execute(CLIMATOLOGY_DAY_SQL, (node_id, day_of_year)).fetchall()
+        else:
+            rows = conn.execute('SELECT * FROM rainfall_climatology WHERE node_id = ? ORDER BY day_of_year',
+                                (node_id,)).fetchall()
+        return [dict(row) for row in rows]
     
     def get_hourly_data(self, start_time: datetime, end_time: datetime, node_id: int = 1) -> List[Dict]:
         """Get hourly aggregated data for the specified time range"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM hourly_aggregates
-            WHERE hour_start >= ? AND hour_start < ?
-            AND node_id = ?
-            ORDER BY hour_start
-        ''', (start_time.isoformat(), end_time.isoformat(), node_id))
+        cursor.execute(HOURLY_RANGE_SQL, (start_time.isoformat(), end_time.isoformat(), node_id))
         
         return [dict(row) for row in cursor.fetchall()]
     
     def get_daily_data(self, start_date: datetime, end_date: datetime, node_id: int = 1) -> List[Dict]:
         """Get daily aggregated data for the specified date range"""
-        conn = self.get_connection()
+        conn = self.get_read_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM daily_aggregates
-            WHERE date >= ? AND date < ?
-            AND node_id = ?
-            ORDER BY date
-        ''', (start_date.date().isoformat(), end_date.date().isoformat(), node_id))
+        cursor.execute(DAILY_RANGE_SQL, (start_date.date().isoformat(), end_date.date().isoformat(), node_id))
         
         return [dict(row) for row in cursor.fetchall()]
     
+    def get_range_data(self, start_time: datetime, end_time: datetime, node_id: int = 1,
+                       resolution: int = 3600, offset: int = 0) -> Dict[str, Any]:
+        """
+        Aggregate a node's data into fixed-size buckets of any resolution.
+        
+        Reads the coarsest stored tier whose granularity divides the resolution, so a
+        1-week request re-buckets daily rows instead of raw readings. Raw rows only
+        cover the retention window, so fine resolutions return nothing older than that.
+        
+        Args:
+            start_time: Start of the range
+            end_time: End of the range (exclusive)
+            node_id: Node to query
+            resolution: Bucket size in seconds
+            offset: Shift of the bucket grid in seconds (e.g. to start weeks on Monday)
+        
+        Returns:
+            Dict with the tier used and one entry per non-empty bucket
+        """
+        table, bucket_column, granularity = [tier for tier in RANGE_TIERS if resolution % tier[2] == 0][-1]
+        if table == 'raw_measurements':
+            sql = RAW_RESAMPLE_SQL
+            start, end = start_time.isoformat(), end_time.isoformat()
+        else:
+            sql = AGGREGATE_RESAMPLE_SQL.format(table=table, bucket_column=bucket_column)
+            # Aggregate rows are keyed by bucket start; include every bucket overlapping the range
+            if granularity == 86400:
+                start = start_time.date().isoformat()
+                end = ((end_time - timedelta(microseconds=1)).date() + timedelta(days=1)).isoformat()
+            else:
+                start = start_time.replace(minute=0, second=0, microsecond=0).isoformat()
+                end = end_time.isoformat()
+        
+        conn = self.get_read_connection()
+        rows = conn.execute(sql, (offset, resolution, node_id, start, end)).fetchall()
+        
+        data = []
+        for bucket, rainfall, sum_temperature, sum_humidity, count in rows:
+            data.append({
+                'bucket_start': (EPOCH + timedelta(seconds=bucket * resolution + offset)).isoformat(),
+                'total_rainfall_in': rainfall,
+                'avg_temperature_f': sum_temperature / count,
+                'avg_humidity_pct': sum_humidity / count,
+                'measurement_count': count,
+            })
+        return {'tier': table, 'data': data}
+    
+    def iter_range(self, table: str, start_time: datetime, end_time: datetime, node_id: int = 1,
+                   batch_size: int = 1000) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """
+        Stream a node's rows from 'raw', 'hourly' or 'daily' in batches of plain tuples.
+        
+        Rows are fetched from the cursor as they are consumed, so memory use does not
+        grow with the range. The iterator owns a private read-only connection (it may be
+        resumed from a different thread each batch) and closes it when exhausted or
+        garbage collected.
+        
+        Yields:
+            (column names, list of row tuples) per batch
+        """
+        if table == 'raw':
+            sql, params = RAW_EXPORT_SQL, (node_id, start_time.isoformat(), end_time.isoformat())
+        elif table == 'hourly':
+            sql, params = HOURLY_RANGE_SQL, (start_time.isoformat(), end_time.isoformat(), node_id)
+        elif table == 'daily':
+            sql, params = DAILY_RANGE_SQL, (start_time.date().isoformat(), end_time.date().isoformat(), node_id)
+        else:
+            raise ValueError(f"Unknown table: {table}")
+        
+        conn = self.get_connection() if self.db_path == ':memory:' else self._open_read_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield columns, rows
+        finally:
+            if conn is not self.conn:
+                conn.close()
+    
+    def get_latest_measurement(self, node_id: int = 1) -> Optional[Dict]:
+        """Get the most recent raw measurement for a node"""
+        conn = self.get_read_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(LATEST_MEASUREMENT_SQL, (node_id,))
+        row = cursor.fetchone()
+        
+        return dict(row) if row else None
+    
     def close(self):
-        """Close the database connection"""
+        """Close the writer and all reader connections"""
+        with self._read_conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+        self._local = threading.local()
         if self.conn:
             self.conn.close()
-            self.conn = None
\ No newline at end of file
+            self.conn = None
+
+
+class AsyncDatabaseHandler:
+    """
+    Runs DatabaseHandler calls off the event loop.
+    
+    Writes go through a single worker thread that owns the writer connection; reads
+    are spread over a bounded pool of threads, each with its own read-only connection.
+    With WAL enabled, reads do not wait for ingest writes to finish.
+    """
+    
+    def __init__(self, db: DatabaseHandler, readers: int = 4):
+        self.db = db
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+        # Maintenance takes the write lock one chunk at a time, so it runs beside the writer
+        self._maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-maintenance')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-read')
+    
+    async def _run(self, executor: ThreadPoolExecutor, func: Callable, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args))
+    
+    async def insert_measurement(self, measurement: Dict[str, Union[float, int, str]]) -> bool:
+        return await self._run(self._writer, self.db.insert_measurement, measurement)
+    
+    async def insert_measurements(self, measurements: List[Dict[str, Union[float, int, str]]]
+                                  ) -> Optional[List[Dict[str, Union[float, int, str]]]]:
+        return await self._run(self._writer, self.db.insert_measurements, measurements)
+    
+    async def get_hourly_data(self, start_time: datetime, end_time: datetime, node_id: int = 1) -> List[Dict]:
+        return await self._run(self._readers, self.db.get_hourly_data, start_time, end_time, node_id)
+    
+    async def get_daily_data(self, start_date: datetime, end_date: datetime, node_id: int = 1) -> List[Dict]:
+        return await self._run(self._readers, self.db.get_daily_data, start_date, end_date, node_id)
+    
+    async def get_range_data(self, start_time: datetime, end_time: datetime, node_id: int = 1,
+                             resolution: int = 3600, offset: int = 0) -> Dict[str, Any]:
+        return await self._run(self._readers, self.db.get_range_data, start_time, end_time,
+                               node_id, resolution, offset)
+    
+    async def iter_range(self, table: str, start_time: datetime, end_time: datetime, node_id: int = 1,
+                         batch_size: int = 1000) -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """Fetch one batch at a time on the reader pool, so the next batch is only read once this one is sent"""
+        loop = asyncio.get_running_loop()
+        batches = self.db.iter_range(table, start_time, end_time, node_id, batch_size)
+        fetch = None
+        try:
+            while True:
+                # Shielded so a cancel leaves fetch pending until the reader thread is done
+                fetch = loop.run_in_executor(self._readers, next, batches, None)
+                batch = await asyncio.shield(fetch)
+                if batch is None:
+                    return
+                yield batch
+        finally:
+            # Runs if the client disconnects mid-stream; releases the cursor's connection.
+            # A generator still running on a reader thread cannot be closed yet.
+            if fetch is not None and not fetch.done():
+                await asyncio.gather(fetch, return_exceptions=True)
+            batches.close()
+    
+    async def get_latest_measurement(self, node_id: int = 1) -> Optional[Dict]:
+        return await self._run(self._readers, self.db.get_latest_measurement, node_id)
+    
+    async def get_rainfall_stats(self, node_id: int = 1) -> Optional[Dict]:
+        return await self._run(self._readers, self.db.get_rainfall_stats, node_id)
+    
+    async def get_climatology(self, node_id: int = 1, day_of_year: Optional[str] = None) -> List[Dict]:
+        return await self._run(self._readers, self.db.get_climatology, node_id, day_of_year)
+    
+    async def check_query_plans(self) -> Dict[str, List[str]]:
+        return await self._run(self._writer, self.db.check_query_plans)
+    
+    async def close_days(self, through: Optional[date] = None) -> int:
+        return await self._run(self._maintenance, self.db.close_days, through)
+    
+    async def run_maintenance(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self._maintenance, functools.partial(self.db.run_maintenance, **kwargs))
+    
+    def close(self):
+        """Wait for pending work, then close all connections"""
+        self._maintenance.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.db.close()
+
+def main():
+    """Command line entry point for database maintenance tasks"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="WaterLogged database maintenance")
+    parser.add_argument('--db', default="waterlogged.db", help="Path to the SQLite database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    rebuild = subparsers.add_parser('rebuild-aggregates', help="Recompute aggregates from raw measurements")
+    rebuild.add_argument('--start', help="First day to rebuild (ISO format)")
+    rebuild.add_argument('--end', help="Last day to rebuild (ISO format)")
+    
+    subparsers.add_parser('check-plans', help="Print query plans for the hot queries")
+    
+    maintain = subparsers.add_parser('maintain', help="Prune old rows per the retention policy")
+    maintain.add_argument('--raw-days', type=int, help="Days of raw measurements to keep")
+    maintain.add_argument('--hourly-days', type=int, help="Days of hourly aggregates to keep")
+    
+    subparsers.add_parser('vacuum', help="Enable incremental vacuum and compact the file (one-time, blocks writes)")
+    
+    close = subparsers.add_parser('close-days', help="Update rainfall stats and climatology with closed days")
+    close.add_argument('--through', help="Last day to close (ISO format, default: yesterday)")
+    close.add_argument('--rebuild', action='store_true', help="Recompute stats and climatology from scratch")
+    
+    subparsers.add_parser('rederive', help="Recompute rain rate, drift and events of all raw measurements")
+    
+    args = parser.parse_args()
+    db = DatabaseHandler(args.db)
+    try:
+        if args.command == 'rebuild-aggregates':
+            start = datetime.fromisoformat(args.start) if args.start else None
+            end = datetime.fromisoformat(args.end) if args.end else None
+            count = db.rebuild_aggregates(start, end)
+            print(f"Rebuilt aggregates covering {count} measurements")
+        elif args.command == 'check-plans':
+            for name, details in db.check_query_plans().items():
+                print(f"{name}:")
+                for detail in details:
+                    print(f"  {detail}")
+        elif args.command == 'maintain':
+            report = db.run_maintenance(args.raw_days, args.hourly_days)
+            for key, value in report.items():
+                print(f"{key}: {value}")
+        elif args.command == 'vacuum':
+            print(f"Reclaimed {db.vacuum()} bytes")
+        elif args.command == 'close-days':
+            if args.rebuild:
+                db.reset_rainfall_stats()
+            through = date.fromisoformat(args.through) if args.through else None
+            print(f"Closed {db.close_days(through)} node-day(s)")
+        elif args.command == 'rederive':
+            print(f"Derived rain values for {db.rederive()} measurement(s)")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
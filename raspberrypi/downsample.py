@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Downsampling Helpers for WaterLogged Range Queries
+
+Maps the resolutions accepted by GET /data/range (5m ... 1w) to bucket sizes,
+picks a resolution when the client only gives a point budget, and thins an
+already-bucketed series with Largest-Triangle-Three-Buckets (LTTB) so chart
+payloads stay bounded however wide the time range is.
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+# Resolution name -> bucket size in seconds, finest first
+RESOLUTIONS: Dict[str, int] = {
+    '5m': 300,
+    '15m': 900,
+    '1h': 3600,
+    '6h': 21600,
+    '1d': 86400,
+    '1w': 604800,
+}
+
+# Bucket numbers count from 1970-01-01, a Thursday; shift weekly buckets to start on Monday
+WEEK_OFFSET = 4 * 86400
+
+def bucket_offset(resolution: int) -> int:
+    """Grid offset in seconds for a bucket size"""
+    return WEEK_OFFSET if resolution % 604800 == 0 else 0
+
+def choose_resolution(start_time: datetime, end_time: datetime, max_points: int,
+                      resolution: Optional[str] = None) -> str:
+    """
+    Return the requested resolution, or the finest one that fits max_points buckets.
+    
+    Raises:
+        ValueError: If the resolution name is not in RESOLUTIONS
+    """
+    if resolution is not None:
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+        return resolution
+    
+    span = (end_time - start_time).total_seconds()
+    for name, seconds in RESOLUTIONS.items():
+        if span / seconds <= max_points:
+            return name
+    return list(RESOLUTIONS)[-1]
+
+def lttb(x: Sequence[float], y: Sequence[float], threshold: int) -> List[int]:
+    """
+    Pick threshold points that preserve the visual shape of a series.
+    
+    Largest-Triangle-Three-Buckets keeps the first and last points and, from each
+    of the threshold - 2 buckets in between, the point forming the largest
+    triangle with the previously kept point and the next bucket's average.
+    
+    Args:
+        x: Ascending x values (e.g. epoch seconds)
+        y: Values to preserve the shape of
+        threshold: Number of points to keep
+    
+    Returns:
+        Indices of the kept points, ascending
+    """
+    n = len(x)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:threshold]
+    
+    every = (n - 2) / (threshold - 2)
+    kept = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle corner
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(x[next_start:next_end]) / count
+        avg_y = sum(y[next_start:next_end]) / count
+        
+        ax, ay = x[a], y[a]
+        best, best_area = -1, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((ax - avg_x) * (y[j] - ay) - (ax - x[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        kept.append(best)
+        a = best
+    kept.append(n - 1)
+    return kept
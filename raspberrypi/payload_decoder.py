@@ -1,17 +1,126 @@
 #!/usr/bin/env python3
 
 import json
+from array import array
 from datetime import datetime
+from itertools import repeat
 import logging
-from typing import Dict, Optional, Union
+import math
+from operator import mul, truediv
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+
+from metrics import Counter
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('WaterLogged_Decoder')
 
+DECODED = Counter('waterlogged_payloads_decoded_total', "Payloads decoded into measurements")
+REJECTED = Counter('waterlogged_payloads_rejected_total',
+                   "Payloads rejected by the decoder, by reason (format, parse or the failed range check)",
+                   ['reason'])
+
+# Measurement columns shared by all CSV formats: (name, measurement type, array typecode)
+PAYLOAD_COLUMNS = (
+    ('weight_g', 'weight', 'd'),
+    ('rainfall_in', 'rainfall', 'd'),
+    ('temperature_f', 'temperature', 'd'),
+    ('humidity_pct', 'humidity', 'd'),
+    ('zero_factor', 'zero_factor', 'l'),
+)
+
+# Version 2 lines start with this token, followed by node ID, sequence number and
+# device time (Unix seconds, 0 if the node has no clock) before the measurements
+V2_PREFIX = 'v2'
+V2_COLUMNS = (
+    ('node_id', 'node_id', 'l'),
+    ('seq', 'sequence', 'q'),
+    ('device_time', None, 'q'),
+) + PAYLOAD_COLUMNS
+
+# Binary frame: marker, node ID, sequence, device time, then the measurements as
+# scaled integers (little-endian, 25 bytes vs. roughly 50 for the same v2 CSV line)
+BINARY_MARKER = 0xB7
+BINARY_MARKER_HEX = 'B7'
+BINARY_FRAME = struct.Struct('<BHIIiIhHH')
+BINARY_SCALE = {'weight_g': 1000, 'rainfall_in': 10000, 'temperature_f': 10, 'humidity_pct': 10}
+
+# Decimal places kept for each float field, matching decode()
+ROUNDING = {'weight_g': 3, 'rainfall_in': 4, 'temperature_f': 1, 'humidity_pct': 1}
+
+# Device timestamps outside [2020-01-01, now + skew] fall back to the gateway clock
+MIN_DEVICE_TIME = 1577836800
+MAX_CLOCK_SKEW = 86400
+
+# Legacy CSV lines have this many commas and carry no node ID
+LEGACY_COMMAS = len(PAYLOAD_COLUMNS) - 1
+
+def is_legacy(line: str) -> bool:
+    return not line.startswith(V2_PREFIX + ',') and line.count(',') == LEGACY_COMMAS
+
+def tag_legacy(line: str, node_id: int, seq: int, device_time: int) -> str:
+    """Rewrite a legacy line as v2, giving it the node ID, sequence and time it lacks"""
+    return f"{V2_PREFIX},{node_id},{seq},{device_time},{line}"
+
+class DecodedBatch:
+    """
+    Columnar result of PayloadDecoder.decode_many.
+    
+    Accepted readings are stored as one typed array per field, in input order.
+    Rejected lines are summarized as a count per reason plus a few examples.
+    """
+    
+    MAX_REJECT_EXAMPLES = 10
+    
+    def __init__(self, columns: Dict[str, array], timestamps: List[str], seqs: List[Optional[int]]):
+        self.columns = columns
+        self.timestamps = timestamps
+        self.seqs = seqs
+        self.reject_counts: Dict[str, int] = {}
+        self.reject_examples: List[Tuple[int, str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.timestamps)
+    
+    @property
+    def rejected(self) -> int:
+        return sum(self.reject_counts.values())
+    
+    def add_reject(self, index: int, reason: str):
+        self.reject_counts[reason] = self.reject_counts.get(reason, 0) + 1
+        if len(self.reject_examples) < self.MAX_REJECT_EXAMPLES:
+            self.reject_examples.append((index, reason))
+    
+    def reject_report(self) -> Dict[str, object]:
+        """Compact summary of rejected lines"""
+        return {
+            'rejected': self.rejected,
+            'by_reason': dict(self.reject_counts),
+            'examples': [{'line': index, 'reason': reason} for index, reason in self.reject_examples]
+        }
+    
+    def rows(self) -> List[Dict[str, Union[float, int, str]]]:
+        """Accepted readings as measurement dicts, in the same shape as decode()"""
+        c = self.columns
+        rows = [
+            {
+                'timestamp': timestamp,
+                'weight_g': weight,
+                'rainfall_in': rainfall,
+                'temperature_f': temperature,
+                'humidity_pct': humidity,
+                'zero_factor': zero_factor,
+                'node_id': node_id
+            }
+            for timestamp, weight, rainfall, temperature, humidity, zero_factor, node_id in zip(
+                self.timestamps, c['weight_g'], c['rainfall_in'], c['temperature_f'],
+                c['humidity_pct'], c['zero_factor'], c['node_id'])
+        ]
+        if self.seqs.count(None) != len(self.seqs):
+            for row, seq in zip(rows, self.seqs):
+                if seq is not None:
+                    row['seq'] = seq
+        return rows
+
 class PayloadDecoder:
     """Decoder for WaterLogged node payload data"""
     
@@ -22,7 +131,9 @@ class PayloadDecoder:
             'rainfall': (0, 15),            # inches (increased max to 15")
             'temperature': (-20, 140),      # °F
             'humidity': (0, 100),           # %
-            'zero_factor': (7000, 10000)    # Load cell zero factor range
+            'zero_factor': (7000, 10000),   # Load cell zero factor range
+            'node_id': (1, 65535),          # Node address
+            'sequence': (0, 4294967295)     # Per-node uint32 message counter
         }
     
     def validate_measurement(self, value: float, measurement_type: str) -> bool:
@@ -41,70 +152,431 @@ class PayloadDecoder:
             return False
             
         min_val, max_val = self.VALID_RANGES[measurement_type]
-        if not isinstance(value, (int, float)) or value < min_val or value > max_val:
+        # NaN passes both comparisons, so check it explicitly (decode_many rejects it too)
+        if (not isinstance(value, (int, float)) or not math.isfinite(value)
+                or value < min_val or value > max_val):
             logger.warning(f"Invalid {measurement_type}: {value} (valid range: {min_val} to {max_val})")
             return False
             
         return True
 
-    def decode(self, payload: str) -> Optional[Dict[str, Union[float, int, str]]]:
+    def device_timestamp(self, device_time: Optional[int], now: datetime,
+                         received: Optional[datetime] = None) -> Tuple[str, bool]:
+        """
+        Convert a device clock reading to the ISO timestamp stored with the measurement
+        
+        Returns:
+            (timestamp, trusted): the gateway's time (received, or now if unknown) is
+            used, and trusted is False, when the device has no clock or its clock is
+            implausible
+        """
+        if device_time and MIN_DEVICE_TIME <= device_time <= now.timestamp() + MAX_CLOCK_SKEW:
+            return datetime.fromtimestamp(device_time).isoformat(), True
+        return (received or now).isoformat(), not device_time
+
+    def decode(self, payload: Union[str, bytes]) -> Optional[Dict[str, Union[float, int, str]]]:
         """
         Decode a payload string from the WaterLogged node
         
         Args:
-            payload: Comma-separated string with format:
+            payload: Comma-separated string in one of two formats:
                     WEIGHT,RAINFALL_IN,TEMPERATURE_F,HUMIDITY,ZERO_FACTOR
+                    v2,NODE_ID,SEQ,DEVICE_TIME,WEIGHT,RAINFALL_IN,TEMPERATURE_F,HUMIDITY,ZERO_FACTOR
+                    or a binary frame (bytes, or a hex string starting with the marker)
                     
         Returns:
             Dictionary containing decoded and validated measurements with timestamp,
-            or None if payload is invalid
+            or None if payload is invalid. Version 2 and binary payloads also carry 'seq'.
         """
         try:
+            # Binary frames are recognized by their leading marker byte
+            if isinstance(payload, (bytes, bytearray, memoryview)):
+                return self._decode_frame(bytes(payload))
+            if self._is_hex_frame(payload.strip()):
+                return self._decode_frame(bytes.fromhex(payload.strip()))
+            
             # Split payload into components
             parts = payload.strip().split(',')
-            if len(parts) != 5:
-                logger.error(f"Invalid payload format. Expected 5 values, got {len(parts)}")
+            columns = PAYLOAD_COLUMNS
+            if parts[0] == V2_PREFIX:
+                columns = V2_COLUMNS
+                parts = parts[1:]
+            if len(parts) != len(columns):
+                logger.error(f"Invalid payload format. Expected {len(columns)} values, got {len(parts)}")
+                REJECTED.inc(labels=('format',))
                 return None
                 
             # Parse values
-            weight = float(parts[0])
-            rainfall = float(parts[1])
-            temperature = float(parts[2])
-            humidity = float(parts[3])
-            zero_factor = int(parts[4])
+            values = {
+                name: float(part) if typecode == 'd' else int(part)
+                for (name, _, typecode), part in zip(columns, parts)
+            }
             
             # Validate all measurements
-            validations = [
-                ('weight', weight),
-                ('rainfall', rainfall),
-                ('temperature', temperature),
-                ('humidity', humidity),
-                ('zero_factor', zero_factor)
-            ]
+            for name, measure_type, _ in columns:
+                if measure_type and not self.validate_measurement(values[name], measure_type):
+                    REJECTED.inc(labels=(measure_type,))
+                    return None
             
-            if not all(self.validate_measurement(value, measure_type) 
-                      for measure_type, value in validations):
-                return None
+            timestamp, trusted = self.device_timestamp(values.get('device_time'), datetime.now())
+            if not trusted:
+                logger.warning(f"Implausible device time {values['device_time']}, using gateway time")
             
             # Create measurement packet with timestamp
             measurement = {
-                'timestamp': datetime.now().isoformat(),
-                'weight_g': round(weight, 3),
-                'rainfall_in': round(rainfall, 4),
-                'temperature_f': round(temperature, 1),
-                'humidity_pct': round(humidity, 1),
-                'zero_factor': zero_factor,
-                'node_id': 1  # Placeholder for multiple node support
+                'timestamp': timestamp,
+                'weight_g': round(values['weight_g'], 3),
+                'rainfall_in': round(values['rainfall_in'], 4),
+                'temperature_f': round(values['temperature_f'], 1),
+                'humidity_pct': round(values['humidity_pct'], 1),
+                'zero_factor': values['zero_factor'],
+                'node_id': values.get('node_id', 1)  # Legacy payloads come from node 1
             }
+            if 'seq' in values:
+                measurement['seq'] = values['seq']
             
+            DECODED.inc()
             return measurement
             
         except ValueError as e:
             logger.error(f"Error parsing payload values: {e}")
+            REJECTED.inc(labels=('parse',))
             return None
         except Exception as e:
             logger.error(f"Unexpected error decoding payload: {e}")
+            REJECTED.inc(labels=('error',))
+            return None
+
+    def decode_many(self, lines: List[str], received_at: Optional[List[float]] = None) -> DecodedBatch:
+        """
+        Decode a block of payload lines into columns in one pass.
+        
+        Lines are grouped by format, then each field is parsed and range-checked a whole
+        column at a time instead of line by line, and rejections are counted rather than
+        logged individually. Intended for bulk replays and historical imports; decode()
+        remains the per-line path.
+        
+        Args:
+            lines: Payload strings in the formats accepted by decode(), including
+                   hex-encoded binary frames
+            received_at: When the gateway received each line (seconds since the epoch).
+                   Lines without a usable device time are stamped with it instead of
+                   the time of decoding, so a replayed backlog keeps its spacing.
+            
+        Returns:
+            DecodedBatch with the accepted readings, in input order, and a reject report
+        """
+        now = datetime.now()
+        if received_at is not None and len(received_at) != len(lines):
+            raise ValueError(f"Got {len(received_at)} receive times for {len(lines)} line(s)")
+        received = [datetime.fromtimestamp(t) for t in received_at] if received_at else None
+        rejects: Dict[int, str] = {}
+        
+        # Group lines by format using their comma counts
+        lines = list(map(str.strip, lines))
+        comma_counts = list(map(str.count, lines, repeat(',')))
+        legacy_commas = len(PAYLOAD_COLUMNS) - 1
+        v2_commas = len(V2_COLUMNS)
+        v2_start = V2_PREFIX + ','
+        if comma_counts.count(legacy_commas) == len(lines):
+            legacy = list(range(len(lines)))
+            v2 = []
+            binary = []
+        elif comma_counts.count(v2_commas) == len(lines) and all(map(str.startswith, lines, repeat(v2_start))):
+            legacy = []
+            v2 = list(range(len(lines)))
+            binary = []
+        else:
+            legacy = []
+            v2 = []
+            binary = []
+            for index, count in enumerate(comma_counts):
+                if count == legacy_commas:
+                    legacy.append(index)
+                elif count == v2_commas and lines[index].startswith(v2_start):
+                    v2.append(index)
+                elif count == 0 and self._is_hex_frame(lines[index]):
+                    binary.append(index)
+                else:
+                    rejects[index] = 'format'
+        
+        groups = []
+        if legacy:
+            kept, parsed = self._parse_columns([lines[i] for i in legacy], legacy, PAYLOAD_COLUMNS, rejects)
+            if received:
+                timestamps = [received[i].isoformat() for i in kept]
+            else:
+                timestamps = [now.isoformat()] * len(kept)
+            parsed['node_id'] = [1] * len(kept)
+            groups.append((kept, parsed, timestamps, [None] * len(kept)))
+        
+        untrusted = 0
+        if v2:
+            prefix = len(v2_start)
+            kept, parsed = self._parse_columns([lines[i][prefix:] for i in v2], v2, V2_COLUMNS, rejects)
+            group, untrusted = self._v2_group(kept, parsed, now, received)
+            groups.append(group)
+        
+        if binary:
+            frames = bytes.fromhex(''.join(lines[i] for i in binary))
+            kept, parsed = self._unpack_frames(memoryview(frames), binary, rejects)
+            group, binary_untrusted = self._v2_group(kept, parsed, now, received)
+            groups.append(group)
+            untrusted += binary_untrusted
+        
+        return self._assemble(groups, rejects, len(lines), untrusted)
+    
+    def decode_frames(self, buffer: Union[bytes, bytearray, memoryview]) -> DecodedBatch:
+        """
+        Decode back-to-back binary frames from one buffer.
+        
+        Frames are unpacked straight out of the buffer through a memoryview, with no
+        per-frame slicing or copying, then range-checked column by column like
+        decode_many(). A trailing partial frame is reported as a 'format' reject.
+        
+        Args:
+            buffer: Concatenated frames as produced by encode()
+            
+        Returns:
+            DecodedBatch with the accepted readings and a reject report
+        """
+        view = memoryview(buffer)
+        count, remainder = divmod(len(view), BINARY_FRAME.size)
+        rejects: Dict[int, str] = {}
+        if remainder:
+            rejects[count] = 'format'
+        
+        kept, parsed = self._unpack_frames(view[:count * BINARY_FRAME.size], range(count), rejects)
+        group, untrusted = self._v2_group(kept, parsed, datetime.now())
+        return self._assemble([group], rejects, count + bool(remainder), untrusted)
+    
+    def encode(self, measurement: Dict[str, Union[float, int, str]]) -> bytes:
+        """
+        Pack a measurement into a binary frame.
+        
+        Measurements without 'seq' are sent with sequence 0, and a missing or
+        unparseable timestamp becomes device time 0 (use the gateway's clock).
+        """
+        timestamp = measurement.get('timestamp')
+        try:
+            device_time = int(datetime.fromisoformat(timestamp).timestamp()) if timestamp else 0
+        except ValueError:
+            device_time = 0
+        
+        return BINARY_FRAME.pack(
+            BINARY_MARKER,
+            measurement.get('node_id', 1),
+            measurement.get('seq', 0),
+            device_time,
+            round(measurement['weight_g'] * BINARY_SCALE['weight_g']),
+            round(measurement['rainfall_in'] * BINARY_SCALE['rainfall_in']),
+            round(measurement['temperature_f'] * BINARY_SCALE['temperature_f']),
+            round(measurement['humidity_pct'] * BINARY_SCALE['humidity_pct']),
+            measurement['zero_factor']
+        )
+    
+    def _decode_frame(self, frame: bytes) -> Optional[Dict[str, Union[float, int, str]]]:
+        """Decode a single binary frame with one struct.unpack_from"""
+        if len(frame) != BINARY_FRAME.size:
+            logger.error(f"Invalid binary frame. Expected {BINARY_FRAME.size} bytes, got {len(frame)}")
+            REJECTED.inc(labels=('format',))
+            return None
+        
+        fields = BINARY_FRAME.unpack_from(frame)
+        if fields[0] != BINARY_MARKER:
+            logger.error(f"Invalid binary frame marker: {fields[0]:#04x}")
+            REJECTED.inc(labels=('format',))
             return None
+        values = {
+            name: value / BINARY_SCALE[name] if name in BINARY_SCALE else value
+            for (name, _, _), value in zip(V2_COLUMNS, fields[1:])
+        }
+        for name, measure_type, _ in V2_COLUMNS:
+            if measure_type and not self.validate_measurement(values[name], measure_type):
+                REJECTED.inc(labels=(measure_type,))
+                return None
+        
+        timestamp, trusted = self.device_timestamp(values['device_time'], datetime.now())
+        if not trusted:
+            logger.warning(f"Implausible device time {values['device_time']}, using gateway time")
+        
+        DECODED.inc()
+        return {
+            'timestamp': timestamp,
+            'weight_g': values['weight_g'],
+            'rainfall_in': values['rainfall_in'],
+            'temperature_f': values['temperature_f'],
+            'humidity_pct': values['humidity_pct'],
+            'zero_factor': values['zero_factor'],
+            'node_id': values['node_id'],
+            'seq': values['seq']
+        }
+    
+    @staticmethod
+    def _is_hex_frame(line: str) -> bool:
+        """True if a text line is a hex-encoded binary frame"""
+        if len(line) != BINARY_FRAME.size * 2 or not line[:2].upper() == BINARY_MARKER_HEX:
+            return False
+        try:
+            bytes.fromhex(line)
+            return True
+        except ValueError:
+            return False
+    
+    def _unpack_frames(self, view: memoryview, indices, rejects: Dict[int, str]) -> Tuple[List[int], Dict[str, list]]:
+        """Unpack whole frames from a buffer into range-checked columns"""
+        records = list(BINARY_FRAME.iter_unpack(view)) if len(view) else []
+        raw_columns = list(zip(*records)) if records else [()] * (len(V2_COLUMNS) + 1)
+        
+        parsed = []
+        for (name, _, _), values in zip(V2_COLUMNS, raw_columns[1:]):
+            scale = BINARY_SCALE.get(name)
+            values = list(map(truediv, values, repeat(scale))) if scale else list(values)
+            parsed.append(values)
+        
+        # Frames that do not start with the marker are misaligned or not ours
+        bad_positions = set()
+        markers = raw_columns[0]
+        if markers.count(BINARY_MARKER) != len(markers):
+            for position, marker in enumerate(markers):
+                if marker != BINARY_MARKER:
+                    bad_positions.add(position)
+                    rejects.setdefault(indices[position], 'format')
+        
+        return self._check_ranges(V2_COLUMNS, parsed, list(indices), rejects, bad_positions)
+    
+    def _v2_group(self, kept: List[int], parsed: Dict[str, list], now: datetime,
+                  received: Optional[List[datetime]] = None) -> Tuple[tuple, int]:
+        """Turn parsed v2 columns into a (kept, columns, timestamps, seqs) group"""
+        untrusted = 0
+        device_times = parsed.pop('device_time')
+        latest = now.timestamp() + MAX_CLOCK_SKEW
+        if device_times and MIN_DEVICE_TIME <= min(device_times) and max(device_times) <= latest:
+            timestamps = [datetime.fromtimestamp(t).isoformat() for t in device_times]
+        else:
+            timestamps = []
+            for index, device_time in zip(kept, device_times):
+                timestamp, trusted = self.device_timestamp(device_time, now, received and received[index])
+                timestamps.append(timestamp)
+                untrusted += not trusted
+        return (kept, parsed, timestamps, parsed.pop('seq')), untrusted
+    
+    def _assemble(self, groups: List[tuple], rejects: Dict[int, str], total: int, untrusted: int) -> DecodedBatch:
+        """Merge decoded groups back into input order and build the batch"""
+        names = [name for name, _, _ in PAYLOAD_COLUMNS] + ['node_id']
+        if len(groups) == 1:
+            kept, merged, timestamps, seqs = groups[0]
+        else:
+            kept, merged, timestamps, seqs = [], {name: [] for name in names}, [], []
+            for group_kept, group_parsed, group_timestamps, group_seqs in groups:
+                kept += group_kept
+                for name in names:
+                    merged[name] += group_parsed[name]
+                timestamps += group_timestamps
+                seqs += group_seqs
+            order = sorted(range(len(kept)), key=kept.__getitem__)
+            merged = {name: [values[i] for i in order] for name, values in merged.items()}
+            timestamps = [timestamps[i] for i in order]
+            seqs = [seqs[i] for i in order]
+        
+        columns = {}
+        for name, _, typecode in PAYLOAD_COLUMNS + (('node_id', None, 'l'),):
+            values = merged[name]
+            digits = ROUNDING.get(name)
+            if digits is not None:
+                values = self._round_column(values, digits)
+            columns[name] = array(typecode, values)
+        batch = DecodedBatch(columns, timestamps, seqs)
+        
+        for index in sorted(rejects):
+            batch.add_reject(index, rejects[index])
+        DECODED.inc(len(batch))
+        for reason, count in batch.reject_counts.items():
+            REJECTED.inc(count, (reason,))
+        if batch.rejected:
+            logger.warning(f"Rejected {batch.rejected} of {total} payloads: {batch.reject_counts}")
+        if untrusted:
+            logger.warning(f"{untrusted} payloads had implausible device time, used gateway time")
+        
+        return batch
+    
+    @staticmethod
+    def _round_column(values: List[float], digits: int) -> List[float]:
+        """
+        round(value, digits) for a whole column, without paying for it where it changes nothing.
+        
+        Scaling, rounding to an integer and scaling back is much cheaper than round() with
+        digits, and gives back the value itself exactly when it already has no more than
+        digits decimals, which is the usual case for parsed readings. Only the values it
+        changes go through round(), so the result matches decode() bit for bit.
+        """
+        scale = 10 ** digits
+        quick = list(map(truediv, map(round, map(mul, values, repeat(scale))), repeat(scale)))
+        if quick == values:
+            return values
+        return [value if fast == value else round(value, digits) for value, fast in zip(values, quick)]
+    
+    def _parse_columns(self, lines: List[str], indices: List[int], columns: tuple,
+                       rejects: Dict[int, str]) -> Tuple[List[int], Dict[str, list]]:
+        """
+        Split, parse and range-check lines of one format column by column.
+        
+        Args:
+            lines: Lines that all have len(columns) fields
+            indices: Position of each line in the caller's input, used for reject reporting
+            columns: Column spec the lines follow
+            rejects: Reject reasons by input position, updated in place
+            
+        Returns:
+            (kept indices, values by column name) for the lines that passed
+        """
+        width = len(columns)
+        flat = ','.join(lines).split(',')
+        
+        # Parse each column; a bad token only costs a per-value retry for that column
+        parsed = []
+        bad_positions = set()
+        for offset, (name, _, typecode) in enumerate(columns):
+            raw = flat[offset::width]
+            convert = float if typecode == 'd' else int
+            try:
+                parsed.append(list(map(convert, raw)))
+            except ValueError:
+                values = []
+                for position, token in enumerate(raw):
+                    try:
+                        values.append(convert(token))
+                    except ValueError:
+                        values.append(None)
+                        bad_positions.add(position)
+                        rejects.setdefault(indices[position], 'parse')
+                parsed.append(values)
+        
+        return self._check_ranges(columns, parsed, indices, rejects, bad_positions)
+    
+    def _check_ranges(self, columns: tuple, parsed: List[list], indices: List[int],
+                      rejects: Dict[int, str], bad_positions: set) -> Tuple[List[int], Dict[str, list]]:
+        """Range-check parsed columns against VALID_RANGES and drop failing rows"""
+        for (name, measurement_type, typecode), values in zip(columns, parsed):
+            if measurement_type is None:
+                continue
+            min_val, max_val = self.VALID_RANGES[measurement_type]
+            # min/max clear a clean column in one pass
+            if (values and None not in values and min_val <= min(values) and max(values) <= max_val
+                    and (typecode != 'd' or math.isfinite(sum(values)))):
+                continue
+            for position, value in enumerate(values):
+                if value is None or not min_val <= value <= max_val:
+                    bad_positions.add(position)
+                    rejects.setdefault(indices[position], measurement_type)
+        
+        kept = list(indices)
+        if bad_positions:
+            keep = [position for position in range(len(indices)) if position not in bad_positions]
+            kept = [indices[position] for position in keep]
+            parsed = [[values[position] for position in keep] for values in parsed]
+        
+        return kept, {name: values for (name, _, _), values in zip(columns, parsed)}
 
     def to_json(self, decoded_data: Dict) -> str:
         """Convert decoded data to JSON string"""
@@ -112,6 +584,10 @@ class PayloadDecoder:
 
 def main():
     """Test the decoder with sample data"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     decoder = PayloadDecoder()
     
     # Test with valid data
@@ -121,6 +597,19 @@ def main():
         print("Decoded payload:")
         print(json.dumps(result, indent=2))
     
+    # Test with a version 2 payload (node ID, sequence number, device time)
+    v2_payload = "v2,2,42,1717243200,245.320,0.2843,73.4,65.2,8234"
+    result = decoder.decode(v2_payload)
+    if result:
+        print("\nDecoded v2 payload:")
+        print(json.dumps(result, indent=2))
+    
+    # Round-trip the v2 payload through the binary codec
+    if result:
+        frame = decoder.encode(result)
+        print(f"\nBinary frame ({len(frame)} bytes): {frame.hex().upper()}")
+        print(json.dumps(decoder.decode(frame), indent=2))
+    
     # Test with invalid data
     invalid_payload = "1000.0,99.99,200.0,101.0,12000"
     result = decoder.decode(invalid_payload)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Streaming Rain Rate and Load-Cell Drift for WaterLogged Rain Gauge System
+
+Derives values at ingest that would otherwise need a node's whole raw history,
+so charts and alerts can read them straight from the stored rows:
+- rain_rate_in_hr: rainfall over the trailing RATE_WINDOW, divided by the time it covers
+- weight_corrected_g: weight_g minus the load cell's zero offset, tracked over dry readings
+- zero_drift: how far the smoothed zero factor has moved since the scale was last tared
+- event: 'retare' when the zero factor jumps (the node rebooted and tared again),
+  'empty' when the container weighs well under its zero (emptied or knocked outside a
+  drain cycle), or 'drift' when zero_drift first passes DRIFT_LIMIT
+
+Each node keeps a handful of scalars and a bounded window of recent readings, so
+memory does not grow with history. Readings are expected in time order per node;
+one older than the node's latest is stored without a rate and leaves the state alone.
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+# Rain rate is averaged over this many seconds: one report from a node on the usual
+# 15 minute cycle, several from a faster node
+RATE_WINDOW = timedelta(seconds=900)
+# Readings further apart than this have no rate; the rain could have fallen at any point
+MAX_GAP = timedelta(hours=1)
+# Upper bound on the readings kept per node for the rate window
+WINDOW_READINGS = 32
+
+# Weight given to each new zero factor in its moving average
+ZERO_ALPHA = 0.05
+# A zero factor step this large (counts) is a re-tare, not drift
+RETARE_STEP = 200
+# Smoothed drift from the last tare (counts) that raises a 'drift' event; it clears at half
+DRIFT_LIMIT = 100
+
+# Weight given to each dry reading in the zero offset estimate
+OFFSET_ALPHA = 0.1
+# Only dry readings this close to the current offset (grams) update it
+DRY_WEIGHT_G = 20.0
+# A corrected weight this far below zero (grams) means water left outside a drain cycle
+EMPTY_WEIGHT_G = 50.0
+
+# Derived fields added to each measurement, in the order they are stored
+DERIVED_COLUMNS = ('rain_rate_in_hr', 'weight_corrected_g', 'zero_drift', 'event')
+
+# Persisted per-node state, in rain_stream_state column order
+STATE_COLUMNS = ('last_timestamp', 'last_zero_factor', 'zero_reference', 'zero_smoothed',
+                 'weight_offset_g', 'drifting')
+
+class NodeState:
+    """Running state of one node; everything but the rate window is persisted"""
+    
+    __slots__ = STATE_COLUMNS + ('last_time', 'window', 'window_rain')
+    
+    def __init__(self, last_timestamp: Optional[str] = None, last_zero_factor: Optional[int] = None,
+                 zero_reference: Optional[float] = None, zero_smoothed: Optional[float] = None,
+                 weight_offset_g: float = 0.0, drifting: bool = False):
+        self.last_timestamp = last_timestamp
+        self.last_time = datetime.fromisoformat(last_timestamp) if last_timestamp else None
+        self.last_zero_factor = last_zero_factor
+        self.zero_reference = zero_reference
+        self.zero_smoothed = zero_smoothed
+        self.weight_offset_g = weight_offset_g
+        self.drifting = bool(drifting)
+        # (interval start, interval end, rainfall) of the readings inside the rate window, and their total
+        self.window: Deque[Tuple[datetime, datetime, float]] = deque()
+        self.window_rain = 0.0
+    
+    def copy(self) -> 'NodeState':
+        state = NodeState(self.last_timestamp, self.last_zero_factor, self.zero_reference,
+                          self.zero_smoothed, self.weight_offset_g, self.drifting)
+        state.window.extend(self.window)
+        state.window_rain = self.window_rain
+        return state
+    
+    def row(self) -> Tuple:
+        return tuple(getattr(self, column) for column in STATE_COLUMNS)
+
+class RainProcessor:
+    """
+    Per-node streaming derivation of rain rate, zero drift and drift-corrected weight.
+    
+    derive() works on copies of the node states and returns them, so a batch whose
+    transaction rolls back leaves the processor untouched; pass them to commit()
+    once the rows are stored.
+    """
+    
+    def __init__(self):
+        self._states: Dict[int, NodeState] = {}
+    
+    def known(self, node_id: int) -> bool:
+        return node_id in self._states
+    
+    def load(self, node_id: int, state: NodeState):
+        """Seed a node's state, e.g. from the database after a restart"""
+        self._states[node_id] = state
+    
+    def reset(self):
+        self._states.clear()
+    
+    def derive(self, measurements: Iterable[Dict[str, Union[float, int, str]]]
+               ) -> Tuple[List[Tuple], Dict[int, NodeState]]:
+        """
+        Derived values for each measurement, in order.
+        
+        Returns:
+            (rows, states): one DERIVED_COLUMNS tuple per measurement, and the updated
+            state of every node the measurements touched
+        """
+        states: Dict[int, NodeState] = {}
+        rows = []
+        for m in measurements:
+            node_id = m['node_id']
+            state = states.get(node_id)
+            if state is None:
+                state = states[node_id] = self._states.get(node_id, NodeState()).copy()
+            rows.append(self._step(state, m))
+        return rows, states
+    
+    def commit(self, states: Dict[int, NodeState]):
+        """Adopt the states returned by derive() once its rows are stored"""
+        self._states.update(states)
+    
+    @staticmethod
+    def _step(state: NodeState, m: Dict[str, Union[float, int, str]]) -> Tuple:
+        """Fold one reading into its node's state and return its derived values"""
+        time = datetime.fromisoformat(m['timestamp'])
+        zero_factor = m['zero_factor']
+        rainfall = m['rainfall_in']
+        weight = m['weight_g']
+        
+        if state.last_time is not None and time <= state.last_time:
+            # Late or repeated reading: describe it with the current state, change nothing
+            drift = state.zero_smoothed - state.zero_reference
+            return None, round(weight - state.weight_offset_g, 3), round(drift, 2), None
+        
+        event = None
+        
+        # Rain rate over the trailing window, if the interval since the last reading is known
+        rate = None
+        window = state.window
+        if state.last_time is None or time - state.last_time > MAX_GAP:
+            window.clear()
+            state.window_rain = 0.0
+        else:
+            window.append((state.last_time, time, rainfall))
+            state.window_rain += rainfall
+            # The newest interval always stays, however long it was
+            cutoff = time - RATE_WINDOW
+            while window[0][1] <= cutoff or len(window) > WINDOW_READINGS:
+                state.window_rain -= window.popleft()[2]
+            span = (time - window[0][0]).total_seconds()
+            # The running total can pick up rounding error; never report a negative rate
+            rate = round(max(state.window_rain, 0.0) * 3600 / span, 4)
+        
+        # Zero factor: a jump is a re-tare, anything else is smoothed into the drift
+        if state.zero_reference is None or abs(zero_factor - state.last_zero_factor) >= RETARE_STEP:
+            if state.zero_reference is not None:
+                event = 'retare'
+            state.zero_reference = state.zero_smoothed = float(zero_factor)
+            state.weight_offset_g = 0.0
+            state.drifting = False
+        else:
+            state.zero_smoothed += ZERO_ALPHA * (zero_factor - state.zero_smoothed)
+        drift = state.zero_smoothed - state.zero_reference
+        
+        # Weight: dry readings near the current offset track the load cell's zero
+        corrected = weight - state.weight_offset_g
+        if corrected < -EMPTY_WEIGHT_G:
+            event = event or 'empty'
+        elif rainfall == 0 and abs(corrected) < DRY_WEIGHT_G:
+            state.weight_offset_g += OFFSET_ALPHA * corrected
+        
+        if abs(drift) >= DRIFT_LIMIT:
+            if not state.drifting:
+                state.drifting = True
+                event = event or 'drift'
+        elif abs(drift) < DRIFT_LIMIT / 2:
+            state.drifting = False
+        
+        state.last_timestamp = m['timestamp']
+        state.last_time = time
+        state.last_zero_factor = zero_factor
+        return rate, round(corrected, 3), round(drift, 2), event
@@ -1,107 +1,259 @@
 #!/usr/bin/env python3
 
+import argparse
+import selectors
 import serial
+import threading
 import time
 import logging
-import requests
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import json
 from datetime import datetime
+from api_sender import ApiSender, DirectIngestSender
+from payload_decoder import is_legacy, tag_legacy
+import metrics
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger('WaterLogged_Serial')
 
-class SerialHandler:
-    def __init__(self, port: str = '/dev/waterlogged_arduino', baudrate: int = 9600):
-        self.port = port
+LINES_RECEIVED = metrics.Counter('waterlogged_serial_lines_total', "Lines read from a serial port", ['port'])
+RECONNECTS = metrics.Counter('waterlogged_serial_reconnects_total', "Serial reconnect attempts", ['port'])
+PORTS_CONNECTED = metrics.Gauge('waterlogged_serial_ports_connected', "Serial ports currently open")
+
+def split_lines(buffer: bytes, chunk: bytes) -> Tuple[List[str], bytes]:
+    """Complete lines in buffer + chunk, and the trailing partial line to keep for the next read"""
+    *complete, rest = (buffer + chunk).split(b'\n')
+    lines = []
+    for raw in complete:
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line:
+            lines.append(line)
+    return lines, rest
+
+class SerialPortState:
+    """One device watched by SerialGateway"""
+    
+    def __init__(self, path: str, node_id: Optional[int] = None):
+        self.path = path
+        # Node ID given to legacy lines from this port, which carry none of their own
+        self.node_id = node_id
+        self.serial: Optional[serial.Serial] = None
+        self.buffer = b''
+        self.seq = 0
+        self.backoff = 0.0
+        self.retry_at = 0.0
+        # Output until this time is the Arduino's boot noise after the open reset it
+        self.settle_until = 0.0
+    
+    def tag(self, line: str) -> str:
+        """Rewrite a legacy line as v2 with this port's node ID; other lines already name their node"""
+        if self.node_id is None or not is_legacy(line):
+            return line
+        self.seq += 1
+        # The receive time makes (node, seq, time) unique across gateway restarts, so the
+        # API can drop a batch resent after a timeout; with 0 every reading is stamped anew
+        return tag_legacy(line, self.node_id, self.seq, int(time.time()))
+
+class SerialGateway:
+    """
+    Reads many serial devices from one thread and one selector.
+    
+    Every port is opened non-blocking and registered with the selector, so a single
+    wakeup drains whichever ports have data and idle ports cost nothing. A port that
+    fails is closed and reopened on its own exponential backoff while the others keep
+    reading. All lines go to one shared sender, so the process holds one spool, one
+    HTTP session and one interpreter whatever the number of devices.
+    """
+    
+    def __init__(self, ports: Dict[str, Optional[int]], baudrate: int = 9600,
+                 sender: Optional[ApiSender] = None, max_backoff: float = 60.0, settle_time: float = 2.0):
         self.baudrate = baudrate
-        self.serial = None
-        self.api_url = 'http://localhost:8000/measurements'
+        self.sender = sender or ApiSender()
+        self.max_backoff = max_backoff
+        self.settle_time = settle_time
+        self.ports = [SerialPortState(path, node_id) for path, node_id in ports.items()]
+        self.selector = selectors.DefaultSelector()
+        self._stopping = threading.Event()
+        PORTS_CONNECTED.set_function(lambda: sum(port.serial is not None for port in self.ports))
     
-    def connect(self) -> bool:
-        """Establish connection to Arduino"""
+    def open_port(self, port: SerialPortState):
+        """Open a port without waiting for the Arduino to reset; schedule a retry on failure"""
         try:
-            self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
-            time.sleep(2)  # Allow Arduino to reset
-            logger.info(f"Connected to Arduino on {self.port}")
-            return True
-        except serial.SerialException as e:
-            logger.error(f"Failed to connect to Arduino: {e}")
-            return False
-    
-    def read_line(self) -> Optional[str]:
-        """Read a line from the serial port"""
-        if not self.serial:
-            return None
-        
-        try:
-            if self.serial.in_waiting:
-                line = self.serial.readline().decode('utf-8').strip()
-                return line
-        except Exception as e:
-            logger.error(f"Error reading from serial: {e}")
-            self.reconnect()
-        return None
-    
-    def reconnect(self):
-        """Attempt to reconnect to Arduino"""
-        logger.info("Attempting to reconnect...")
+            port.serial = serial.Serial(port.path, self.baudrate, timeout=0)
+        except (serial.SerialException, OSError) as e:
+            self._schedule_retry(port, e)
+            return
+        port.buffer = b''
+        port.backoff = 0.0
+        port.settle_until = time.monotonic() + self.settle_time
+        self.selector.register(port.serial.fileno(), selectors.EVENT_READ, port)
+        logger.info(f"Connected to {port.path}")
+    
+    def close_port(self, port: SerialPortState):
+        if port.serial is None:
+            return
         try:
-            if self.serial:
-                self.serial.close()
-            time.sleep(5)  # Wait before reconnecting
-            self.connect()
-        except Exception as e:
-            logger.error(f"Reconnection failed: {e}")
+            self.selector.unregister(port.serial.fileno())
+        except (KeyError, ValueError):
+            pass
+        port.serial.close()
+        port.serial = None
     
-    def send_to_api(self, data: str):
-        """Send measurement data to API server"""
+    def _schedule_retry(self, port: SerialPortState, error: Exception):
+        port.backoff = min(max(port.backoff * 2, 1.0), self.max_backoff)
+        port.retry_at = time.monotonic() + port.backoff
+        RECONNECTS.inc(labels=(port.path,))
+        logger.error(f"{port.path} unavailable ({error}), retrying in {port.backoff:.0f}s")
+    
+    def read_port(self, port: SerialPortState) -> List[str]:
+        """Drain a readable port and return its complete lines, tagged with their source"""
         try:
-            response = requests.post(self.api_url, json=data)
-            if response.status_code == 200:
-                logger.info("Data successfully sent to API")
-            else:
-                logger.error(f"API error: {response.status_code} - {response.text}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to send data to API: {e}")
+            chunk = port.serial.read(port.serial.in_waiting or 1)
+            if not chunk:
+                # Readable with nothing to read: the device went away
+                raise serial.SerialException("device disconnected")
+        except (serial.SerialException, OSError) as e:
+            self.close_port(port)
+            self._schedule_retry(port, e)
+            return []
+        
+        lines, port.buffer = split_lines(port.buffer, chunk)
+        if time.monotonic() < port.settle_until:
+            return []
+        if lines:
+            LINES_RECEIVED.inc(len(lines), (port.path,))
+        return [port.tag(line) for line in lines]
+    
+    def poll(self, timeout: float = 1.0) -> List[str]:
+        """Reopen ports whose backoff has expired, then wait for data on any open port"""
+        now = time.monotonic()
+        for port in self.ports:
+            if port.serial is None and now >= port.retry_at:
+                self.open_port(port)
+        
+        # Wake for the earliest retry even if no port has data
+        retries = [port.retry_at for port in self.ports if port.serial is None]
+        if retries:
+            timeout = max(0.0, min(timeout, min(retries) - time.monotonic()))
+        if not self.selector.get_map():
+            time.sleep(timeout)
+            return []
+        
+        lines = []
+        for key, _ in self.selector.select(timeout):
+            lines.extend(self.read_port(key.data))
+        return lines
     
     def run(self):
-        """Main loop to read and process data"""
-        while True:
+        """Main loop: forward whatever all ports delivered in one wakeup as a single batch"""
+        self.sender.start()
+        while not self._stopping.is_set():
             try:
-                if not self.serial and not self.connect():
-                    time.sleep(5)
-                    continue
-                
-                line = self.read_line()
-                if line:
-                    logger.info(f"Received data: {line}")
-                    self.send_to_api(line)
-                
-                time.sleep(0.1)  # Prevent CPU overuse
-                
+                lines = self.poll()
+                if lines:
+                    logger.info(f"Received {len(lines)} line(s): {lines[-1]}")
+                    self.sender.submit(lines)
             except KeyboardInterrupt:
-                logger.info("Stopping serial handler...")
+                logger.info("Stopping serial gateway...")
                 break
             except Exception as e:
                 logger.error(f"Unexpected error: {e}")
-                time.sleep(5)
+                time.sleep(1)
+    
+    def stop(self):
+        """Make run() return after its current wait"""
+        self._stopping.set()
     
     def close(self):
-        """Close the serial connection"""
-        if self.serial:
-            self.serial.close()
-            logger.info("Serial connection closed")
+        """Close every port and flush pending data to the spool"""
+        for port in self.ports:
+            self.close_port(port)
+        self.selector.close()
+        self.sender.stop()
+
+class SerialHandler(SerialGateway):
+    """
+    Single-port gateway, for code written against the original one-device handler.
+    
+    Reads through the same non-blocking selector loop, reconnect backoff and reset
+    settling as SerialGateway; only the one-port constructor and helpers are added.
+    """
+    
+    def __init__(self, port: str = '/dev/waterlogged_arduino', baudrate: int = 9600,
+                 sender: Optional[ApiSender] = None, node_id: Optional[int] = None, **kwargs):
+        super().__init__({port: node_id}, baudrate, sender=sender, **kwargs)
+        self.port = port
+    
+    @property
+    def serial(self) -> Optional[serial.Serial]:
+        return self.ports[0].serial
+    
+    def connect(self) -> bool:
+        """Open the port now instead of on the first poll; True if it opened"""
+        if self.serial is None:
+            self.open_port(self.ports[0])
+        return self.serial is not None
+    
+    def reconnect(self) -> bool:
+        """Close and reopen the port"""
+        self.close_port(self.ports[0])
+        return self.connect()
+    
+    def read_lines(self, timeout: float = 1.0) -> List[str]:
+        """Wait up to timeout for data and return every complete line received so far"""
+        return self.poll(timeout)
+    
+    def send_to_api(self, data: str):
+        """Queue measurement data for delivery to the API server"""
+        self.sender.submit([data])
+
+def parse_ports(specs: List[str]) -> Dict[str, Optional[int]]:
+    """Parse --port values of the form PATH or PATH=NODE_ID"""
+    ports = {}
+    for spec in specs:
+        path, _, node_id = spec.partition('=')
+        ports[path] = int(node_id) if node_id else None
+    return ports
+
+def create_sender(mode: str, api_url: str, socket_path: str, db_path: str,
+                  spool_path: str = 'serial_spool.db') -> ApiSender:
+    """Build the sender for an ingest mode: http, unix or direct"""
+    if mode == 'direct':
+        return DirectIngestSender(db_path=db_path, spool_path=spool_path)
+    if mode == 'unix':
+        return ApiSender(api_url=api_url, spool_path=spool_path, unix_socket=socket_path)
+    return ApiSender(api_url=api_url, spool_path=spool_path)
 
 def main():
-    handler = SerialHandler()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    parser = argparse.ArgumentParser(description="WaterLogged serial handler")
+    parser.add_argument('--port', action='append', dest='ports', metavar='PATH[=NODE_ID]',
+                        help="Serial device; repeat to read several from one process. "
+                             "NODE_ID tags legacy lines, which carry no node ID of their own "
+                             "(default: /dev/waterlogged_arduino)")
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--mode', choices=['http', 'unix', 'direct'], default='http',
+                        help="Deliver readings over HTTP, over the API's Unix socket, "
+                             "or write them to the database in-process")
+    parser.add_argument('--api-url', default='http://localhost:8000/measurements/batch')
+    parser.add_argument('--socket', default='/tmp/waterlogged_api.sock',
+                        help="API server Unix socket (unix mode)")
+    parser.add_argument('--db', default='waterlogged.db', help="SQLite database (direct mode)")
+    parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port")
+    args = parser.parse_args()
+    
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    
+    sender = create_sender(args.mode, args.api_url, args.socket, args.db)
+    ports = parse_ports(args.ports or ['/dev/waterlogged_arduino'])
+    gateway = SerialGateway(ports, args.baudrate, sender=sender)
     try:
-        handler.run()
+        gateway.run()
     finally:
-        handler.close()
+        gateway.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
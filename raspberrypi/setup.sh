@@ -28,6 +28,10 @@ source venv/bin/activate
 echo "Installing Python packages..."
 pip install -r requirements.txt
 
+# Compile bytecode now so the first start after boot does not have to
+echo "Compiling Python modules..."
+python3 -m compileall -q .
+
 # Initialize database
 echo "Initializing database..."
 python3 -c "from database_handler import DatabaseHandler; DatabaseHandler()"
@@ -0,0 +1,70 @@
+"""Tests for replaying the gateway's on-disk spool"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from api_sender import DirectIngestSender
+
+class LostResponseSender(DirectIngestSender):
+    """Stores every batch but reports the first one as failed, like a POST that timed out"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.posts = 0
+    
+    def _post(self, lines, received_at):
+        self.posts += 1
+        return super()._post(lines, received_at) and self.posts > 1
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / 'waterlogged.db'), str(tmp_path / 'serial_spool.db')
+
+def spool_lines(sender, lines, received):
+    conn = sender._open_spool()
+    conn.executemany("INSERT INTO spool (payload, received_at) VALUES (?, ?)",
+                     [(line, t.timestamp()) for line, t in zip(lines, received)])
+    conn.commit()
+    return conn
+
+def test_backlog_keeps_receive_times(paths):
+    db_path, spool_path = paths
+    # A legacy node reporting every 30 minutes while the API was down for four hours
+    start = datetime(2026, 3, 1, 8, 10)
+    received = [start + timedelta(minutes=30 * i) for i in range(8)]
+    sender = DirectIngestSender(db_path=db_path, spool_path=spool_path)
+    spool_lines(sender, [f"{500 + i}.0,0.05,60.0,80.0,8400" for i in range(8)], received).close()
+    
+    sender.start()
+    sender.stop()
+    
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT timestamp, rain_rate_in_hr FROM raw_measurements ORDER BY id").fetchall()
+    hours = conn.execute("SELECT hour_start, measurement_count FROM hourly_aggregates ORDER BY hour_start").fetchall()
+    spooled = sqlite3.connect(spool_path).execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+    
+    assert spooled == 0
+    assert [row[0] for row in rows] == [t.isoformat() for t in received]
+    # Only the first reading lacks a previous one to take a rate from
+    assert rows[0][1] is None
+    assert all(rate is not None for _, rate in rows[1:])
+    assert [count for _, count in hours] == [2, 2, 2, 2]
+
+def test_resent_batch_is_stored_once(paths):
+    db_path, spool_path = paths
+    start = datetime(2026, 3, 1, 8, 10)
+    sender = LostResponseSender(db_path=db_path, spool_path=spool_path)
+    conn = spool_lines(sender, ["500.0,0.05,60.0,80.0,8400", "501.0,0.05,60.0,80.0,8400"],
+                       [start, start + timedelta(minutes=5)])
+    
+    # The first send is stored but looks failed, so the lines stay spooled and go again
+    assert sender._flush(conn) == 0
+    assert sender._flush(conn) == 2
+    sender.db.close()
+    
+    db = sqlite3.connect(db_path)
+    assert db.execute("SELECT COUNT(*), SUM(rainfall_in) FROM raw_measurements").fetchone() == (2, 0.1)
+    assert db.execute("SELECT total_rainfall_in FROM hourly_aggregates").fetchone() == (0.1,)
+    assert db.execute("SELECT node_id, seq FROM raw_measurements ORDER BY id").fetchall() == [(1, 1), (1, 2)]
@@ -0,0 +1,130 @@
+"""Tests for the ingest endpoints and caches of api_server"""
+
+import time
+
+import pytest
+
+pytest.importorskip('fastapi')
+from fastapi.testclient import TestClient
+
+import api_server
+from database_handler import DatabaseHandler
+from payload_decoder import PayloadDecoder
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # The server opens waterlogged.db in its working directory
+    monkeypatch.chdir(tmp_path)
+    # Caches are module globals; start each test without another test's readings
+    monkeypatch.setattr(api_server, 'latest_readings', api_server.LatestReadingCache())
+    monkeypatch.setattr(api_server, 'response_cache', api_server.ResponseCache())
+    with TestClient(api_server.app) as client:
+        yield client
+
+def test_batch_replay_publishes_only_new_readings(client):
+    lines = [f"v2,3,{seq},{1760000000 + seq * 900},500.0,0.01,60.0,80.0,8400" for seq in range(1, 5)]
+    queue = api_server.broadcaster.subscribe()
+    try:
+        first = client.post('/measurements/batch', json={'payloads': lines[:3]}).json()
+        assert first['inserted'] == 3
+        assert queue.qsize() == 3
+        
+        # A retry of the first three plus one new reading
+        replay = client.post('/measurements/batch', json={'payloads': lines}).json()
+        assert replay['inserted'] == 1
+        assert queue.qsize() == 4
+        events = [queue.get_nowait() for _ in range(4)]
+    finally:
+        api_server.broadcaster.unsubscribe(queue)
+    assert '"seq": 4' in events[-1]
+    assert '"rain_rate_in_hr"' in events[-1]
+
+def test_current_reading_sees_direct_ingest(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(api_server, 'latest_readings', api_server.LatestReadingCache(ttl=0.2))
+    first = "v2,5,1,1760000000,500.0,0.01,60.0,80.0,8400"
+    client.post('/measurements/batch', json={'payloads': [first]})
+    assert client.get('/data/current', params={'node_id': 5}).json()['data']['seq'] == 1
+    
+    # Another process writes straight to the database, as DirectIngestSender does
+    other = DatabaseHandler(str(tmp_path / 'waterlogged.db'))
+    other.insert_measurements(PayloadDecoder().decode_many(
+        ["v2,5,2,1760000900,501.0,0.02,60.0,80.0,8400"]).rows())
+    other.close()
+    assert client.get('/data/current', params={'node_id': 5}).json()['data']['seq'] == 1
+    
+    time.sleep(0.25)
+    assert client.get('/data/current', params={'node_id': 5}).json()['data']['seq'] == 2
+
+HOURS = ('hourly', 1, '2026-03-09T00:00:00', '2026-03-09T06:00:00')
+DAYS = ('daily', 1, '2026-03-01', '2026-03-09')
+
+def reading(timestamp, node_id=1):
+    return {'timestamp': timestamp, 'node_id': node_id}
+
+def test_response_cache_drops_only_touched_ranges():
+    cache = api_server.ResponseCache()
+    for key in (HOURS, DAYS):
+        cache.put(key, b'[]', True, cache.generation)
+    
+    # Another node, and the bucket the range ends before, leave both entries alone
+    cache.invalidate([reading('2026-03-09T03:10:00', node_id=2), reading('2026-03-09T06:00:00')])
+    assert cache.get(HOURS) == b'[]' and cache.get(DAYS) == b'[]'
+    
+    # The first hour of the range is inside it; the day is past the daily range's end
+    cache.invalidate([reading('2026-03-09T00:00:00')])
+    assert cache.get(HOURS) is None
+    assert cache.get(DAYS) == b'[]'
+    
+    cache.invalidate([reading('2026-03-01T23:59:59')])
+    assert cache.get(DAYS) is None
+    assert cache.stats() == {'entries': 0, 'hits': 3, 'misses': 2, 'hit_ratio': 0.6, 'invalidations': 2}
+
+def test_response_cache_ignores_results_older_than_an_ingest():
+    cache = api_server.ResponseCache()
+    generation = cache.generation
+    # A reading lands while the query is running, so its result may already be stale
+    cache.invalidate([reading('2026-03-20T00:00:00')])
+    cache.put(HOURS, b'stale', True, generation)
+    assert cache.get(HOURS) is None
+    
+    generation = cache.generation
+    cache.clear()
+    cache.put(HOURS, b'stale', False, generation)
+    assert cache.get(HOURS) is None
+    
+    cache.put(HOURS, b'fresh', False, cache.generation)
+    assert cache.get(HOURS) == b'fresh'
+    assert cache.generation == generation + 1
+
+def test_response_cache_expires_and_evicts(monkeypatch):
+    cache = api_server.ResponseCache(max_entries=2, open_ttl=10.0, closed_ttl=100.0)
+    now = 1000.0
+    monkeypatch.setattr(api_server.time, 'monotonic', lambda: now)
+    cache.put(HOURS, b'open', True, cache.generation)
+    cache.put(DAYS, b'closed', False, cache.generation)
+    now += 11
+    assert cache.get(HOURS) is None
+    assert cache.get(DAYS) == b'closed'
+    
+    # DAYS was used last, so a third entry evicts the oldest one
+    cache.put(HOURS, b'open', True, cache.generation)
+    cache.get(DAYS)
+    cache.put(('daily', 2) + DAYS[2:], b'other', False, cache.generation)
+    assert cache.get(HOURS) is None
+    assert cache.get(DAYS) == b'closed'
+
+def test_hourly_endpoint_is_cached_until_its_range_changes(client):
+    params = {'start': '2025-10-09T00:00:00', 'end': '2025-10-10T00:00:00', 'node_id': 7}
+    line = "v2,7,{seq},{time},500.0,0.01,60.0,80.0,8400"
+    client.post('/measurements/batch', json={'payloads': [line.format(seq=1, time=1760000000)]})
+    
+    first = client.get('/data/hourly', params=params).json()
+    assert client.get('/data/hourly', params=params).json() == first
+    assert client.get('/cache/stats').json()['data']['hits'] == 1
+    
+    # A reading for the same hour must show up on the next request
+    client.post('/measurements/batch', json={'payloads': [line.format(seq=2, time=1760000060)]})
+    second = client.get('/data/hourly', params=params).json()
+    assert [row['measurement_count'] for row in second['data']] == [2]
+    stats = client.get('/cache/stats').json()['data']
+    assert (stats['hits'], stats['invalidations']) == (1, 1)
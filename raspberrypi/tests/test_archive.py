@@ -0,0 +1,76 @@
+"""Tests for the Parquet archive; skipped where pyarrow is not installed"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip('pyarrow')
+import archive
+from archive import ParquetArchive, PartitionCache
+from database_handler import DatabaseHandler
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseHandler(str(tmp_path / 'waterlogged.db'))
+    start = datetime(2026, 3, 30)
+    # Every 6 hours for five days either side of a month boundary, 0.01 in each
+    db.insert_measurements([{
+        'timestamp': (start + timedelta(hours=6 * i)).isoformat(), 'node_id': 2, 'seq': i + 1,
+        'weight_g': 100.0, 'rainfall_in': 0.01, 'temperature_f': 50.0 + i, 'humidity_pct': 60.0,
+        'zero_factor': 8400,
+    } for i in range(20)])
+    yield db
+    db.close()
+
+def test_export_read_and_aggregate(db, tmp_path):
+    parquet = ParquetArchive(str(tmp_path / 'archive'))
+    written = parquet.export(db)
+    assert written['raw'] == 20 and written['daily'] == 5
+    assert parquet.partition_path('raw', 2, '2026-03').exists()
+    assert parquet.partition_path('raw', 2, '2026-04').exists()
+    
+    raw = parquet.read('raw', 2, date(2026, 3, 31), date(2026, 4, 2), ['rainfall_in'])
+    assert raw.num_rows == 8
+    assert raw.column_names == ['timestamp', 'rainfall_in']
+    
+    months = parquet.aggregate(2, date(2026, 1, 1), date(2026, 5, 1), 'month')
+    assert [row['period'] for row in months] == ['2026-03', '2026-04']
+    assert [row['measurement_count'] for row in months] == [8, 12]
+    assert sum(row['total_rainfall_in'] for row in months) == pytest.approx(0.2)
+    assert months[0]['avg_temperature_f'] == pytest.approx(sum(50.0 + i for i in range(8)) / 8)
+    
+    # Nothing new closed since: a second export writes nothing
+    assert parquet.export(db) == {'raw': 0, 'hourly': 0, 'daily': 0}
+
+def test_partition_cache_is_bounded_by_bytes(db, tmp_path):
+    parquet = ParquetArchive(str(tmp_path / 'archive'))
+    parquet.export(db)
+    paths = [str(parquet.partition_path('raw', 2, month)) for month in ('2026-03', '2026-04')]
+    columns = ('timestamp', 'rainfall_in')
+    
+    cache = PartitionCache(max_bytes=10 ** 9)
+    tables = [cache.read(path, 1, columns) for path in paths]
+    assert len(cache) == 2 and cache.nbytes == sum(table.nbytes for table in tables)
+    assert cache.read(paths[0], 1, columns) is tables[0]
+    
+    # A rewritten file (new mtime) replaces its old entry instead of adding to it
+    cache.read(paths[0], 2, columns)
+    assert len(cache) == 2
+    
+    # Room for one table only: the least recently used one goes
+    cache = PartitionCache(max_bytes=max(table.nbytes for table in tables))
+    cache.read(paths[0], 1, columns)
+    cache.read(paths[1], 1, columns)
+    assert len(cache) == 1 and cache.nbytes <= cache.max_bytes
+    
+    # A table bigger than the budget is returned but not kept
+    cache = PartitionCache(max_bytes=1)
+    assert cache.read(paths[0], 1, columns).num_rows == 8
+    assert len(cache) == 0 and cache.nbytes == 0
+
+def test_archive_reads_go_through_the_shared_cache(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, '_partitions', PartitionCache())
+    parquet = ParquetArchive(str(tmp_path / 'archive'))
+    parquet.export(db)
+    parquet.read('daily', 2, date(2026, 3, 1), date(2026, 5, 1))
+    assert len(archive._partitions) == 2
@@ -0,0 +1,279 @@
+"""Tests for DatabaseHandler ingest, aggregates and maintenance"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from benchmarks.generator import SyntheticNodes
+from database_handler import CLIMATOLOGY_COLUMNS, DatabaseHandler, climatology_values
+
+AGGREGATE_TABLES = {
+    'hourly_aggregates': 'hour_start',
+    'daily_aggregates': 'date',
+    'monthly_aggregates': 'month',
+}
+
+@pytest.fixture
+def db(tmp_path):
+    db = DatabaseHandler(str(tmp_path / 'waterlogged.db'))
+    yield db
+    db.close()
+
+def readings(count, nodes=3, interval=600.0, start=datetime(2026, 3, 30), seed=1):
+    return list(SyntheticNodes(nodes, interval=interval, seed=seed, start=start).readings(count))
+
+def aggregate_rows(db, table):
+    bucket = AGGREGATE_TABLES[table]
+    return db.get_connection().execute(f'''
+        SELECT {bucket}, node_id, total_rainfall_in, sum_temperature_f, sum_humidity_pct,
+               measurement_count, avg_temperature_f, avg_humidity_pct
+        FROM {table} ORDER BY {bucket}, node_id
+    ''').fetchall()
+
+def assert_rows_close(actual, expected):
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        assert tuple(got[:2]) == tuple(want[:2])
+        assert tuple(got[2:]) == pytest.approx(tuple(want[2:]))
+
+def test_running_sums_match_a_rebuild(db):
+    data = readings(1500)
+    # Mixed batch sizes, and single inserts, all landing in buckets that already have rows
+    db.insert_measurements(data[:700])
+    for m in data[700:750]:
+        assert db.insert_measurement(m)
+    db.insert_measurements(data[750:])
+    incremental = {table: aggregate_rows(db, table) for table in AGGREGATE_TABLES}
+    
+    assert db.rebuild_aggregates() == len(data)
+    for table in AGGREGATE_TABLES:
+        assert_rows_close(incremental[table], aggregate_rows(db, table))
+    
+    # Spot check the running averages against their sums
+    for row in incremental['daily_aggregates']:
+        assert row['avg_temperature_f'] == pytest.approx(row['sum_temperature_f'] / row['measurement_count'])
+    # The synthetic readings span a month boundary
+    assert {row['month'] for row in incremental['monthly_aggregates']} == {'2026-03', '2026-04'}
+
+def test_out_of_order_batches_give_the_same_aggregates(db, tmp_path):
+    data = readings(600)
+    db.insert_measurements(data[300:])
+    db.insert_measurements(data[:300])
+    
+    ordered = DatabaseHandler(str(tmp_path / 'ordered.db'))
+    try:
+        ordered.insert_measurements(data)
+        for table in AGGREGATE_TABLES:
+            assert_rows_close(aggregate_rows(db, table), aggregate_rows(ordered, table))
+    finally:
+        ordered.close()
+
+def stored_count(db):
+    return db.get_connection().execute('SELECT COUNT(*) FROM raw_measurements').fetchone()[0]
+
+def test_batch_insert_returns_the_stored_rows(db):
+    data = readings(10)
+    stored = db.insert_measurements(data)
+    assert [(m['node_id'], m['seq']) for m in stored] == [(m['node_id'], m['seq']) for m in data]
+    assert all('rain_rate_in_hr' in m for m in stored)
+    assert db.insert_measurements([]) == []
+
+def test_replayed_batch_is_skipped(db):
+    data = readings(300)
+    db.insert_measurements(data[:200])
+    
+    # A gateway resending everything after a lost response, plus 100 new readings
+    stored = db.insert_measurements(data)
+    assert [(m['node_id'], m['seq']) for m in stored] == [(m['node_id'], m['seq']) for m in data[200:]]
+    assert db.insert_measurements(data) == []
+    assert stored_count(db) == 300
+    
+    running = {table: aggregate_rows(db, table) for table in AGGREGATE_TABLES}
+    db.rebuild_aggregates()
+    for table in AGGREGATE_TABLES:
+        assert_rows_close(running[table], aggregate_rows(db, table))
+
+def test_duplicates_within_a_batch_are_stored_once(db):
+    m = readings(1)[0]
+    assert len(db.insert_measurements([m, dict(m), dict(m)])) == 1
+    assert stored_count(db) == 1
+
+def test_same_sequence_at_another_time_is_a_new_reading(db):
+    # A node that rebooted restarts its counter; the timestamp tells the readings apart
+    first = readings(1)[0]
+    rebooted = dict(first, timestamp='2026-04-15T08:00:00')
+    db.insert_measurements([first])
+    assert len(db.insert_measurements([rebooted])) == 1
+
+def test_readings_without_sequence_are_not_deduplicated(db):
+    m = readings(1)[0]
+    del m['seq']
+    db.insert_measurements([m])
+    assert len(db.insert_measurements([dict(m)])) == 1
+    assert stored_count(db) == 2
+
+def test_failed_batch_is_rolled_back(db):
+    data = readings(20)
+    db.get_connection().execute('''
+        CREATE TRIGGER reject_reading BEFORE INSERT ON raw_measurements
+        WHEN NEW.seq = 5 BEGIN SELECT RAISE(ABORT, 'rejected'); END
+    ''')
+    assert db.insert_measurements(data) is None
+    assert stored_count(db) == 0
+    assert aggregate_rows(db, 'hourly_aggregates') == []
+    
+    db.get_connection().execute('DROP TRIGGER reject_reading')
+    assert len(db.insert_measurements(data)) == 20
+
+def test_maintenance_rebuilds_bad_days_before_pruning(db):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    # Hourly readings from 40 days ago up to 20 days ago
+    data = readings(3 * 24 * 20, interval=3600.0, start=today - timedelta(days=40))
+    db.insert_measurements(data)
+    daily = aggregate_rows(db, 'daily_aggregates')
+    monthly = aggregate_rows(db, 'monthly_aggregates')
+    
+    # A day whose roll-up lost readings, about to have its raw rows pruned
+    bad_day = (today - timedelta(days=35)).date().isoformat()
+    conn = db.get_connection()
+    conn.execute("UPDATE daily_aggregates SET measurement_count = 1, total_rainfall_in = 0 WHERE date = ?",
+                 (bad_day,))
+    conn.commit()
+    
+    raw_cutoff = (today - timedelta(days=30)).isoformat()
+    hourly_cutoff = (today - timedelta(days=35)).isoformat()
+    expired = sum(m['timestamp'] < raw_cutoff for m in data)
+    report = db.run_maintenance(raw_retention_days=30, hourly_retention_days=35, chunk_size=100)
+    
+    assert report['days_rebuilt'] == 1
+    assert report['raw_rows_deleted'] == expired
+    assert conn.execute("SELECT COUNT(*) FROM raw_measurements WHERE timestamp < ?", (raw_cutoff,)).fetchone()[0] == 0
+    assert stored_count(db) == len(data) - expired
+    assert conn.execute("SELECT COUNT(*) FROM hourly_aggregates WHERE hour_start < ?",
+                        (hourly_cutoff,)).fetchone()[0] == 0
+    assert report['hourly_rows_deleted'] > 0
+    assert_rows_close(aggregate_rows(db, 'daily_aggregates'), daily)
+    assert_rows_close(aggregate_rows(db, 'monthly_aggregates'), monthly)
+    
+    # Nothing left to reconcile or prune on a second run
+    report = db.run_maintenance(raw_retention_days=30, hourly_retention_days=35)
+    assert (report['days_rebuilt'], report['raw_rows_deleted'], report['hourly_rows_deleted']) == (0, 0, 0)
+
+def test_hourly_retention_never_undercuts_raw(db):
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.insert_measurements(readings(3 * 24 * 5, interval=3600.0, start=today - timedelta(days=12)))
+    hourly = aggregate_rows(db, 'hourly_aggregates')
+    
+    report = db.run_maintenance(raw_retention_days=10, hourly_retention_days=2)
+    assert report['raw_rows_deleted'] > 0
+    cutoff = (today - timedelta(days=10)).isoformat()
+    assert aggregate_rows(db, 'hourly_aggregates') == [row for row in hourly if row['hour_start'] >= cutoff]
+
+@pytest.mark.parametrize('rows, chunk_size, statements', [(25, 10, 3), (20, 10, 3), (5, 10, 1), (0, 10, 1)])
+def test_delete_in_chunks(db, rows, chunk_size, statements):
+    db.insert_measurements(readings(rows, start=datetime(2020, 1, 1)) + readings(4, start=datetime(2026, 1, 1)))
+    conn = db.get_connection()
+    deletes = []
+    conn.set_trace_callback(lambda sql: deletes.append(sql) if sql.startswith('DELETE') else None)
+    try:
+        deleted = db._delete_in_chunks(
+            'DELETE FROM raw_measurements WHERE id IN '
+            '(SELECT id FROM raw_measurements WHERE timestamp < ? LIMIT ?)',
+            '2025-01-01T00:00:00', chunk_size)
+    finally:
+        conn.set_trace_callback(None)
+    
+    assert deleted == rows
+    assert len(deletes) == statements
+    assert stored_count(db) == 4
+
+def rain_totals(data, node_id, as_of):
+    """Daily and hourly rainfall of a node through as_of, straight from the readings"""
+    daily, hourly = defaultdict(float), defaultdict(float)
+    for m in data:
+        if m['node_id'] == node_id and m['timestamp'][:10] <= as_of.isoformat():
+            daily[m['timestamp'][:10]] += m['rainfall_in']
+            hourly[m['timestamp'][:13]] += m['rainfall_in']
+    return daily, hourly
+
+def brute_force_stats(data, node_id, as_of):
+    daily, hourly = rain_totals(data, node_id, as_of)
+    day = as_of.isoformat()
+    return {
+        'day_in': daily.get(day, 0.0),
+        'month_to_date_in': sum(v for d, v in daily.items() if d[:7] == day[:7]),
+        'year_to_date_in': sum(v for d, v in daily.items() if d[:4] == day[:4]),
+        'rolling_7d_in': sum(v for d, v in daily.items() if d > (as_of - timedelta(days=7)).isoformat()),
+        'rolling_30d_in': sum(v for d, v in daily.items() if d > (as_of - timedelta(days=30)).isoformat()),
+        'max_hourly_mtd_in': max(v for h, v in hourly.items() if h[:7] == day[:7]),
+        'max_hourly_ytd_in': max(v for h, v in hourly.items() if h[:4] == day[:4]),
+    }
+
+def brute_force_climatology(data, node_id, as_of):
+    daily, _ = rain_totals(data, node_id, as_of)
+    first = min(daily)
+    samples = defaultdict(lambda: ([], [], []))
+    for day, total in daily.items():
+        days, month_totals, year_totals = samples[day[5:]]
+        days.append(total)
+        # Month and year totals only count when the node was reporting from their start
+        if first <= day[:7] + '-01':
+            month_totals.append(sum(v for d, v in daily.items() if d[:7] == day[:7] and d <= day))
+        if first <= day[:4] + '-01-01':
+            year_totals.append(sum(v for d, v in daily.items() if d[:4] == day[:4] and d <= day))
+    return {day_of_year: climatology_values(*values) for day_of_year, values in samples.items()}
+
+def assert_stats_match(db, data, as_of, nodes=(1, 2)):
+    for node_id in nodes:
+        stats = db.get_rainfall_stats(node_id)
+        expected = brute_force_stats(data, node_id, as_of)
+        assert stats['as_of'] == as_of.isoformat()
+        assert {key: stats[key] for key in expected} == pytest.approx(expected)
+        _, hourly = rain_totals(data, node_id, as_of)
+        assert hourly[stats['max_hourly_mtd_at'][:13]] == pytest.approx(expected['max_hourly_mtd_in'])
+        assert hourly[stats['max_hourly_ytd_at'][:13]] == pytest.approx(expected['max_hourly_ytd_in'])
+        
+        climatology = {row['day_of_year']: tuple(row[column] for column in CLIMATOLOGY_COLUMNS)
+                       for row in db.get_climatology(node_id)}
+        expected = brute_force_climatology(data, node_id, as_of)
+        assert sorted(climatology) == sorted(expected)
+        for day_of_year, values in expected.items():
+            for got, want in zip(climatology[day_of_year], values):
+                assert got == (None if want is None else pytest.approx(want)), day_of_year
+
+@pytest.fixture(scope='module')
+def two_years():
+    # Two nodes over two winters, so the climatology has a day of year with two samples
+    return readings(2 * 6 * 440, nodes=2, interval=4 * 3600.0, start=datetime(2024, 11, 20))
+
+def test_closed_days_match_a_brute_force(db, two_years):
+    db.insert_measurements(two_years)
+    assert db.close_days(through=date(2025, 12, 31)) == 2
+    assert_stats_match(db, two_years, date(2025, 12, 31))
+    
+    # Day by day across the new year, in small chunks, on top of the stored stats
+    assert db.close_days(through=date(2026, 1, 20), chunk_days=7) == 40
+    assert_stats_match(db, two_years, date(2026, 1, 20))
+    
+    # Closing again is a no-op, and the data ends before this through date
+    assert db.close_days(through=date(2026, 1, 20)) == 0
+    assert db.close_days(through=date(2027, 1, 1)) == 2 * (date(2026, 2, 2) - date(2026, 1, 20)).days
+    assert_stats_match(db, two_years, date(2026, 2, 2))
+
+def test_late_readings_reopen_closed_days(db, two_years):
+    db.insert_measurements(two_years)
+    db.close_days(through=date(2026, 1, 20))
+    
+    # Readings that arrive after their days were closed, two of them in the previous year
+    node = [m for m in two_years if m['node_id'] == 1]
+    late = [dict(m, seq=100000 + i, rainfall_in=0.75) for i, m in enumerate(
+        [m for m in node if m['timestamp'][:10] == '2025-12-31'][:2]
+        + [m for m in node if m['timestamp'][:10] == '2026-01-05'][:1])]
+    db.insert_measurements(late)
+    data = two_years + late
+    assert db.get_rainfall_stats(1)['recompute_from'] == '2025-12-31'
+    assert db.get_rainfall_stats(2)['recompute_from'] is None
+    
+    assert db.close_days(through=date(2026, 1, 20)) == 21
+    assert_stats_match(db, data, date(2026, 1, 20))
@@ -0,0 +1,85 @@
+"""Tests for resolution choice, bucket grids and LTTB thinning"""
+
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from database_handler import DatabaseHandler
+from downsample import RESOLUTIONS, bucket_offset, choose_resolution, lttb
+
+START = datetime(2026, 3, 2)
+
+@pytest.mark.parametrize('span, max_points, expected', [
+    (timedelta(hours=24), 288, '5m'),
+    (timedelta(hours=24, seconds=1), 288, '15m'),
+    (timedelta(hours=24), 96, '15m'),
+    (timedelta(hours=24), 95, '1h'),
+    (timedelta(days=1000), 1000, '1d'),
+    (timedelta(days=7 * 1001), 1000, '1w'),
+    (timedelta(0), 3, '5m'),
+])
+def test_choose_resolution_edges(span, max_points, expected):
+    assert choose_resolution(START, START + span, max_points) == expected
+
+def test_requested_resolution_wins():
+    assert choose_resolution(START, START + timedelta(days=365), 10, '5m') == '5m'
+    with pytest.raises(ValueError):
+        choose_resolution(START, START + timedelta(days=1), 10, '2h')
+
+def test_weeks_start_on_monday():
+    assert bucket_offset(RESOLUTIONS['1w']) == 4 * 86400
+    assert bucket_offset(RESOLUTIONS['1d']) == 0
+    # 1970-01-05 was a Monday
+    assert datetime(1970, 1, 1) + timedelta(seconds=bucket_offset(RESOLUTIONS['1w'])) == datetime(1970, 1, 5)
+
+def test_range_buckets_include_their_start(tmp_path):
+    db = DatabaseHandler(str(tmp_path / 'waterlogged.db'))
+    try:
+        monday = datetime(2026, 3, 9)
+        db.insert_measurements([
+            {'timestamp': t.isoformat(), 'node_id': 1, 'seq': seq, 'weight_g': 100.0, 'rainfall_in': 0.1,
+             'temperature_f': 60.0, 'humidity_pct': 50.0, 'zero_factor': 8000}
+            for seq, t in enumerate([monday - timedelta(seconds=1), monday, monday + timedelta(minutes=4, seconds=59),
+                                     monday + timedelta(minutes=5)])
+        ])
+        
+        five = db.get_range_data(monday - timedelta(hours=1), monday + timedelta(hours=1), 1, 300)
+        assert [(row['bucket_start'], row['measurement_count']) for row in five['data']] == [
+            ('2026-03-08T23:55:00', 1), ('2026-03-09T00:00:00', 2), ('2026-03-09T00:05:00', 1)]
+        
+        week = RESOLUTIONS['1w']
+        weeks = db.get_range_data(monday - timedelta(days=7), monday + timedelta(days=7), 1, week, bucket_offset(week))
+        assert [(row['bucket_start'], row['measurement_count']) for row in weeks['data']] == [
+            ('2026-03-02T00:00:00', 1), ('2026-03-09T00:00:00', 3)]
+    finally:
+        db.close()
+
+@pytest.mark.parametrize('n, threshold', [(0, 10), (5, 5), (5, 10)])
+def test_lttb_keeps_short_series(n, threshold):
+    assert lttb(list(range(n)), [0.0] * n, threshold) == list(range(n))
+
+@pytest.mark.parametrize('threshold, expected', [(0, []), (1, [0]), (2, [0, 9])])
+def test_lttb_tiny_thresholds(threshold, expected):
+    assert lttb(list(range(10)), [0.0] * 10, threshold) == expected
+
+@pytest.mark.parametrize('n, threshold', [(10, 3), (11, 4), (100, 7), (1000, 999), (1001, 100)])
+def test_lttb_picks_one_point_per_bucket(n, threshold):
+    x = list(range(n))
+    y = [math.sin(i / 7) for i in x]
+    kept = lttb(x, y, threshold)
+    
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == n - 1
+    # Every point but the first and last falls in its own bucket of the middle range
+    every = (n - 2) / (threshold - 2)
+    for i, index in enumerate(kept[1:-1]):
+        assert int(i * every) + 1 <= index < int((i + 1) * every) + 1
+
+def test_lttb_keeps_spikes():
+    # A single storm in an otherwise dry series must survive thinning
+    y = [0.0] * 500
+    y[137] = 2.5
+    y[400] = -1.0
+    kept = lttb(list(range(500)), y, 20)
+    assert 137 in kept and 400 in kept
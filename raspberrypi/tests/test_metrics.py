@@ -0,0 +1,50 @@
+"""Tests for the metrics registry and its text exposition"""
+
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Metric, Registry
+
+def test_metric_without_samples_cannot_be_created():
+    class Incomplete(Metric):
+        pass
+    
+    with pytest.raises(TypeError):
+        Incomplete('waterlogged_incomplete', "Never renders", registry=None)
+
+def test_render_counter_gauge_and_histogram():
+    registry = Registry()
+    stored = Counter('stored_total', "Readings stored", ['node'], registry=registry)
+    depth = Gauge('queue_depth', "Queued batches", registry=registry)
+    seconds = Histogram('send_seconds', "Send time", buckets=(0.1, 1.0), registry=registry)
+    
+    stored.inc(2, ('3',))
+    stored.inc(labels=('3',))
+    depth.set_function(lambda: 7)
+    for value in (0.05, 0.5, 5.0):
+        seconds.observe(value)
+    
+    assert registry.render().splitlines() == [
+        '# HELP stored_total Readings stored',
+        '# TYPE stored_total counter',
+        'stored_total{node="3"} 3',
+        '# HELP queue_depth Queued batches',
+        '# TYPE queue_depth gauge',
+        'queue_depth 7',
+        '# HELP send_seconds Send time',
+        '# TYPE send_seconds histogram',
+        'send_seconds_bucket{le="0.1"} 1',
+        'send_seconds_bucket{le="1.0"} 2',
+        'send_seconds_bucket{le="+Inf"} 3',
+        'send_seconds_sum 5.55',
+        'send_seconds_count 3',
+    ]
+
+def test_labels_are_checked_and_escaped():
+    registry = Registry()
+    counter = Counter('lines_total', "Lines", ['port'], registry=registry)
+    with pytest.raises(ValueError):
+        counter.inc()
+    counter.inc(labels=('/dev/"tty"',))
+    assert 'lines_total{port="/dev/\\"tty\\""} 1' in registry.render()
+    with pytest.raises(ValueError):
+        Counter('lines_total', "Again", registry=registry)
@@ -0,0 +1,104 @@
+"""Tests for PayloadDecoder: per-line and batch decoding must agree"""
+
+from datetime import datetime
+
+import pytest
+
+from payload_decoder import PayloadDecoder
+
+LINES = [
+    "245.320,0.2843,73.4,65.2,8234",
+    "v2,2,17,1760000000,12.5,0.0,55.0,40.0,8100",
+    "v2,3,18,0,-12.0005,0.01234,-3.05,99.9,9000",
+    "0.0355,1.5,68.25,50.0,8000",
+    # Rejected: out of range, unparseable, not finite, wrong shape
+    "245.320,16.0,73.4,65.2,8234",
+    "245.320,abc,73.4,65.2,8234",
+    "nan,0.1,73.4,65.2,8234",
+    "245.320,inf,73.4,65.2,8234",
+    "v2,2,19,1760000000,1.0,0.1,nan,40.0,8100",
+    "1,2,3",
+]
+
+@pytest.fixture
+def decoder():
+    return PayloadDecoder()
+
+def without_time(row):
+    # Lines without a device clock are stamped at decode time, which differs between calls
+    return {key: value for key, value in row.items() if key != 'timestamp'}
+
+def test_decode_many_matches_decode(decoder):
+    single = [decoder.decode(line) for line in LINES]
+    batch = decoder.decode_many(LINES)
+    
+    assert [without_time(row) for row in batch.rows()] == [without_time(row) for row in single if row]
+    assert batch.rejected == sum(row is None for row in single)
+
+@pytest.mark.parametrize('line', ["nan,0.1,73.4,65.2,8234", "1.0,0.1,-inf,65.2,8234",
+                                  "v2,2,1,1760000000,1.0,nan,60.0,40.0,8100"])
+def test_non_finite_values_are_rejected_by_both_paths(decoder, line):
+    assert decoder.decode(line) is None
+    assert len(decoder.decode_many([line])) == 0
+
+def test_rounding_matches_per_line_decode(decoder):
+    # Values with more decimals than are kept, including exact binary ties
+    lines = [f"{w},{r},{t},50.0,8000" for w, r, t in
+             [(0.0005, 0.00005, 72.25), (-1.2345, 0.12345, 72.35), (1999.9995, 14.99995, 139.95)]]
+    assert ([without_time(row) for row in decoder.decode_many(lines).rows()]
+            == [without_time(decoder.decode(line)) for line in lines])
+
+def test_receive_times_stamp_lines_without_device_time(decoder):
+    batch = decoder.decode_many(["1.0,0.1,60.0,40.0,8100", "v2,2,1,0,1.0,0.1,60.0,40.0,8100",
+                                 "v2,2,2,1760000000,1.0,0.1,60.0,40.0,8100"],
+                                received_at=[1750000000.0, 1750000060.0, 1750000120.0])
+    assert batch.timestamps == [datetime.fromtimestamp(1750000000).isoformat(),
+                                datetime.fromtimestamp(1750000060).isoformat(),
+                                datetime.fromtimestamp(1760000000).isoformat()]
+    with pytest.raises(ValueError):
+        decoder.decode_many(["1.0,0.1,60.0,40.0,8100"], received_at=[])
+
+READINGS = [
+    {'timestamp': '2025-10-09T08:53:20', 'weight_g': 245.32, 'rainfall_in': 0.2843, 'temperature_f': 73.4,
+     'humidity_pct': 65.2, 'zero_factor': 8234, 'node_id': 2, 'seq': 17},
+    {'timestamp': '2025-10-09T09:03:20', 'weight_g': -12.001, 'rainfall_in': 0.0, 'temperature_f': -3.1,
+     'humidity_pct': 99.9, 'zero_factor': 9000, 'node_id': 3, 'seq': 4000000000},
+]
+
+def test_binary_frames_round_trip(decoder):
+    frames = [decoder.encode(m) for m in READINGS]
+    assert all(len(frame) == 25 for frame in frames)
+    
+    assert [decoder.decode(frame) for frame in frames] == READINGS
+    assert [decoder.decode(frame.hex().upper()) for frame in frames] == READINGS
+    assert decoder.decode_many([frame.hex() for frame in frames]).rows() == READINGS
+    assert decoder.decode_frames(b''.join(frames)).rows() == READINGS
+
+def test_binary_frames_mix_with_text_lines(decoder):
+    lines = [LINES[0], decoder.encode(READINGS[0]).hex(), LINES[1]]
+    assert ([without_time(row) for row in decoder.decode_many(lines).rows()]
+            == [without_time(decoder.decode(line)) for line in lines])
+
+def test_truncated_frames_are_rejected(decoder):
+    frame = decoder.encode(READINGS[0])
+    assert decoder.decode(frame[:-1]) is None
+    assert decoder.decode(frame + b'\x00') is None
+    # One byte short of a frame is no longer recognized as hex and fails as a short CSV line
+    batch = decoder.decode_many([frame[:-1].hex()])
+    assert len(batch) == 0 and batch.reject_counts == {'format': 1}
+
+def test_trailing_partial_frame_is_reported(decoder):
+    frames = b''.join(decoder.encode(m) for m in READINGS)
+    batch = decoder.decode_frames(frames + decoder.encode(READINGS[0])[:10])
+    assert batch.rows() == READINGS
+    assert batch.reject_report()['examples'] == [{'line': 2, 'reason': 'format'}]
+    
+    batch = decoder.decode_frames(frames[:10])
+    assert len(batch) == 0 and batch.reject_counts == {'format': 1}
+
+def test_misaligned_frames_are_rejected(decoder):
+    frame = decoder.encode(READINGS[0])
+    # Dropping the first byte shifts every following frame off its marker
+    batch = decoder.decode_frames(frame[1:] + frame + frame[:1])
+    assert len(batch) == 0 and batch.reject_counts == {'format': 2}
+    assert decoder.decode(b'\x00' + frame[1:]) is None
@@ -0,0 +1,108 @@
+"""Tests for RainProcessor: rain rate, zero drift and load-cell events"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from rain_processor import DRIFT_LIMIT, RETARE_STEP, WINDOW_READINGS, NodeState, RainProcessor
+
+START = datetime(2026, 3, 9, 6)
+
+def reading(minutes, rainfall=0.0, weight=0.0, zero_factor=8000, node_id=1):
+    return {'timestamp': (START + timedelta(minutes=minutes)).isoformat(), 'node_id': node_id,
+            'rainfall_in': rainfall, 'weight_g': weight, 'zero_factor': zero_factor}
+
+def run(processor, measurements):
+    rows, states = processor.derive(measurements)
+    processor.commit(states)
+    return rows
+
+@pytest.fixture
+def processor():
+    return RainProcessor()
+
+def test_rate_covers_the_trailing_window(processor):
+    rows = run(processor, [reading(minutes, rainfall=0.01) for minutes in range(0, 25, 5)]
+               + [reading(minutes) for minutes in range(25, 40, 5)])
+    rates = [row[0] for row in rows]
+    # 0.01 in every 5 minutes is 0.12 in/hr however many intervals the window holds
+    assert rates[:5] == [None, 0.12, 0.12, 0.12, 0.12]
+    # Dry readings push the rain out of the 15 minute window one interval at a time
+    assert rates[5:] == [0.08, 0.04, 0.0]
+
+def test_gaps_reset_the_rate(processor):
+    rows = run(processor, [reading(0), reading(60, rainfall=0.5), reading(121, rainfall=0.1),
+                           reading(126, rainfall=0.1)])
+    # A gap of exactly MAX_GAP still has a rate over the whole interval; a longer one has none
+    assert [row[0] for row in rows] == [None, 0.5, None, 1.2]
+
+def test_window_is_bounded(processor):
+    rows, states = processor.derive([dict(reading(0), timestamp=(START + timedelta(seconds=s)).isoformat(),
+                                          rainfall_in=0.001) for s in range(0, 1000, 5)])
+    assert len(states[1].window) == WINDOW_READINGS
+    assert rows[-1][0] == pytest.approx(0.001 * WINDOW_READINGS * 3600 / (5 * WINDOW_READINGS), abs=1e-4)
+
+def test_late_readings_leave_the_state_alone(processor):
+    run(processor, [reading(0), reading(5, rainfall=0.01)])
+    late = run(processor, [reading(3, rainfall=0.2, weight=-100, zero_factor=9000), reading(5)])
+    assert all(row[0] is None and row[3] is None for row in late)
+    
+    # The next in-order reading sees only the readings before the late ones
+    assert run(processor, [reading(10, rainfall=0.01)])[0][0] == 0.12
+
+def test_zero_factor_jump_is_a_retare(processor):
+    rows = run(processor, [reading(0, weight=10.0), reading(5, weight=10.0, zero_factor=8000 + RETARE_STEP - 1),
+                           reading(10, weight=10.0, zero_factor=8000 + 2 * RETARE_STEP),
+                           reading(15, zero_factor=8000 + 2 * RETARE_STEP)])
+    assert [row[3] for row in rows] == [None, None, 'retare', None]
+    # A re-tare starts drift and the weight offset over from the new zero
+    assert rows[1][2] == pytest.approx(0.05 * (RETARE_STEP - 1), abs=0.01)
+    assert rows[2][1:3] == (10.0, 0.0)
+
+def test_drift_event_fires_once_until_it_clears(processor):
+    step = DRIFT_LIMIT + 50
+    rows = run(processor, [reading(0)] + [reading(5 * i, zero_factor=8000 + step) for i in range(1, 40)]
+               + [reading(200 + 5 * i) for i in range(40)]
+               + [reading(400 + 5 * i, zero_factor=8000 + step) for i in range(40)])
+    events = [(index, row[3]) for index, row in enumerate(rows) if row[3]]
+    assert [event for _, event in events] == ['drift', 'drift']
+    
+    first, second = events[0][0], events[1][0]
+    assert rows[first][2] >= DRIFT_LIMIT > rows[first - 1][2]
+    # It only fires again after the drift fell back under half the limit
+    assert min(row[2] for row in rows[first:second]) < DRIFT_LIMIT / 2
+
+def test_dry_readings_track_the_weight_offset(processor):
+    rows = run(processor, [reading(0, weight=10.0), reading(5, weight=10.0), reading(10, weight=10.0, rainfall=0.1),
+                           reading(15, weight=300.0), reading(20, weight=10.0)])
+    # Only dry readings near the offset move it, by OFFSET_ALPHA of their corrected weight
+    assert [row[1] for row in rows] == [10.0, 9.0, 8.1, 298.1, 8.1]
+
+def test_weight_far_below_zero_means_emptied(processor):
+    rows = run(processor, [reading(0, weight=5.0), reading(5, weight=-60.0), reading(10, weight=-40.0),
+                           reading(15, weight=-60.0, zero_factor=9000)])
+    assert [row[3] for row in rows] == [None, 'empty', None, 'retare']
+
+def test_nodes_are_independent(processor):
+    rows = run(processor, [reading(0, node_id=1), reading(0, node_id=2, zero_factor=5000),
+                           reading(5, rainfall=0.01, node_id=1), reading(5, node_id=2, zero_factor=5000)])
+    assert [(row[0], row[3]) for row in rows] == [(None, None), (None, None), (0.12, None), (0.0, None)]
+
+def test_derive_does_not_touch_state_until_commit(processor):
+    run(processor, [reading(0)])
+    rows, states = processor.derive([reading(5, rainfall=0.01)])
+    # A rolled back batch is simply not committed
+    assert processor.derive([reading(5, rainfall=0.02)])[0][0][0] == 0.24
+    processor.commit(states)
+    assert processor.derive([reading(5, rainfall=0.02)])[0][0][0] is None
+
+def test_loaded_state_continues_the_stream(processor):
+    rows, states = processor.derive([reading(0, weight=10.0)] + [reading(5 * i, zero_factor=8050) for i in range(1, 10)])
+    restored = RainProcessor()
+    restored.load(1, NodeState(*states[1].row()))
+    later = [reading(50, weight=10.0, zero_factor=8050), reading(55, rainfall=0.01, zero_factor=8050)]
+    processor.commit(states)
+    
+    expected = run(processor, later)
+    # The rate window is not persisted, so only the first rate after a restart differs
+    assert [row[1:] for row in run(restored, later)] == [row[1:] for row in expected]
@@ -0,0 +1,67 @@
+"""Tests for reading serial devices through SerialGateway and SerialHandler"""
+
+import time
+
+import pytest
+
+pytest.importorskip('serial')
+from benchmarks.fake_serial import FakeSerialPort
+from serial_handler import SerialGateway, SerialHandler, parse_ports
+
+class RecordingSender:
+    """Stands in for ApiSender and keeps what it was handed"""
+    
+    def __init__(self):
+        self.lines = []
+    
+    def start(self):
+        pass
+    
+    def submit(self, lines):
+        self.lines.extend(lines)
+    
+    def stop(self):
+        pass
+
+def read_until(read, count, timeout=5.0):
+    lines = []
+    deadline = time.monotonic() + timeout
+    while len(lines) < count and time.monotonic() < deadline:
+        lines += read()
+    return lines
+
+def test_gateway_tags_legacy_lines_of_numbered_ports():
+    with FakeSerialPort() as first, FakeSerialPort() as second:
+        gateway = SerialGateway({first.path: 7, second.path: None}, sender=RecordingSender(), settle_time=0)
+        try:
+            for port in gateway.ports:
+                gateway.open_port(port)
+            first.write_lines(["245.320,0.2843,73.4,65.2,8234", "v2,3,1,0,1.0,0.1,60.0,40.0,8100"])
+            second.write_lines(["245.320,0.2843,73.4,65.2,8234"])
+            lines = read_until(lambda: gateway.poll(0.1), 3)
+        finally:
+            gateway.close()
+    
+    tagged = [line for line in lines if line.startswith('v2,7,')]
+    assert len(tagged) == 1
+    node, seq, device_time = tagged[0].split(',')[1:4]
+    assert (node, seq) == ('7', '1') and abs(int(device_time) - time.time()) < 5
+    assert sorted(line for line in lines if line not in tagged) == [
+        "245.320,0.2843,73.4,65.2,8234", "v2,3,1,0,1.0,0.1,60.0,40.0,8100"]
+
+def test_serial_handler_reads_one_port():
+    sender = RecordingSender()
+    with FakeSerialPort() as fake:
+        handler = SerialHandler(fake.path, sender=sender, settle_time=0)
+        try:
+            assert handler.connect()
+            fake.write_lines(["245.320,0.2843,73.4,65.2,8234", "245.330,0.2843,73.4,65.2,8234"])
+            assert read_until(handler.read_lines, 2) == ["245.320,0.2843,73.4,65.2,8234",
+                                                         "245.330,0.2843,73.4,65.2,8234"]
+            handler.send_to_api("1.0,0.1,60.0,40.0,8100")
+        finally:
+            handler.close()
+    assert sender.lines == ["1.0,0.1,60.0,40.0,8100"]
+
+def test_parse_ports():
+    assert parse_ports(['/dev/ttyUSB0=2', '/dev/ttyUSB1']) == {'/dev/ttyUSB0': 2, '/dev/ttyUSB1': None}